@@ -2,22 +2,29 @@
 
 import logging
 import queue
-from base64 import b64encode, b64decode
-from socket import socket, AF_INET, SOCK_STREAM
+from collections import deque
+from concurrent.futures import Future
+from itertools import count
+from socket import socket, AF_INET, SOCK_STREAM, SHUT_RDWR
 from threading import Thread
 
 from logs import client_log_config as log_config
 from decorators import try_except_wrapper
+from key_pool import KeyPool
 from descriptors import Port
-from jim.constants import RequestAction, RESPONSE
-from jim.codes import OK, ANSWER, SERVER_ERROR, AUTH, FILE_ANSWER
+from jim.constants import RequestAction, Feature, RESPONSE, KEY, FEATURES, \
+                          ITEMS, LAST, CHUNK
+from jim.codes import OK, ANSWER, COLLECTION, SERVER_ERROR, AUTH, FILE_ANSWER, \
+                      AVATAR_CHANGED
 from jim.classes.package import Request, Response
-from jim.classes.request_body import User, Msg
-from jim.functions import get_data, send_data
+from jim.classes.request_body import User, Msg, Presence, Collection, \
+                                     ChatRow, FileChunk, FileInfo, AvatarHash, \
+                                     raw_bytes, b64_text
+from jim.codecs import get_codec, BINARY
+from jim.functions import send_data, FrameDecoder, FrameEncoder
 from client_crypt import encrypt_rsa, decrypt_rsa, \
                          import_pub_key, gen_keys, ClientCrypt
 from client_db import ClientStorage
-from PyQt5.QtWidgets import QMessageBox
 
 
 class ClientThread(Thread):
@@ -36,9 +43,63 @@ class ClientThread(Thread):
         self.func()
 
 
+class PendingRequest:
+    """ Class of request waiting for answer of server """
+
+    __slots__ = ('future', 'kind', 'parts', 'convert')
+
+    SINGLE, COLLECTION, FILE = range(3)
+
+    def __init__(self, kind=SINGLE, convert=None):
+        self.future = Future()
+        self.kind = kind
+        self.parts = []
+        self.convert = convert
+
+    def add(self, resp):
+        """ Method adds response, returns True if answer is complete """
+
+        message = resp.message
+        if self.kind == self.COLLECTION and \
+                (resp.code == ANSWER or resp.code == COLLECTION):
+            if Collection.is_collection(message):
+                self.parts.extend(message[ITEMS])
+                if not message[LAST]:
+                    return False
+            elif message:
+                self.parts.append(message)
+                return False
+            if self.convert:
+                self.parts = [self.convert(i) for i in self.parts]
+            self.future.set_result(self.parts)
+        elif self.kind == self.COLLECTION:
+            self.future.set_result(self.parts)
+        elif self.kind == self.FILE:
+            if resp.code != FILE_ANSWER:
+                self.future.set_exception(ValueError(f'File not received: {message}'))
+            elif FileChunk.is_chunk(message):
+                self.parts.append(FileChunk.from_body(message).data)
+                return False
+            elif FileInfo.is_info(message):
+                data = b''.join(self.parts)
+                if FileInfo.from_body(message).check(data):
+                    self.future.set_result(data)
+                else:
+                    self.future.set_exception(ValueError('Checksum mismatch'))
+            elif message:
+                self.parts.append(raw_bytes(message))
+                return False
+            else:
+                self.future.set_result(b''.join(self.parts))
+        else:
+            self.future.set_result(message)
+        return True
+
+
 def show_error(mes):
     """ Function for shows message on UI """
     # TODO Obsolete
+    from PyQt5.QtWidgets import QMessageBox
 
     msb = QMessageBox()
     msb.setWindowTitle('Error')
@@ -51,25 +112,40 @@ class Client:
     """ Class client connection and data exchange """
 
     __slots__ = ('addr', '_port', 'user',
-                 'logger', 'socket', 'connected', 'get_chat_sended',
+                 'logger', 'socket', 'decoder', 'encoder',
+                 'connected', 'features', 'pending', 'request_ids', 'file_chunk',
                  'listener', 'sender', 'encryptors', 'priv_key',
-                 'storage', 'subs', 'answers', 'file_answers',
-                 'executor', 'execute_queue' )
+                 'storage', 'subs', 'answers', 'file_answers', 'avatar_hashes',
+                 'executor', 'execute_queue', 'key_pool')
 
     TCP = (AF_INET, SOCK_STREAM)
+    FEATURES = (Feature.BINARY, Feature.ZLIB, Feature.COLLECTIONS,
+                Feature.REQUEST_IDS, Feature.MESSAGES, Feature.CHAT_ROWS,
+                Feature.FILE_STREAM, Feature.AVATAR_CHECKS)
+    ANSWER_TIMEOUT = 60
+    FILE_CHUNK = 64 * 1024
+    FILE_WINDOW = 4
+    LEGACY_FILE_CHUNK = 512
+    KEY_POOL_SIZE = 2
     port = Port('_port')
 
     def __init__(self, addr, port):
         self.logger = logging.getLogger(log_config.LOGGER_NAME)
         self.addr = addr
         self.port = port
-        self.connected = self.get_chat_sended = False
+        self.connected = False
         self.subs = {}
         # self.subs = {201: [], 202: [], 203: [], 204: [], 205: []}
         self.answers = queue.Queue()
         self.file_answers = queue.Queue()
         self.execute_queue = queue.Queue()
         self.encryptors = {}
+        self.features = set()
+        self.pending = {}
+        self.request_ids = count(1)
+        self.file_chunk = None
+        self.avatar_hashes = {}
+        self.key_pool = KeyPool(gen_keys, self.KEY_POOL_SIZE)
 
     @property
     def username(self):
@@ -81,35 +157,61 @@ class Client:
     def set_encryptor(self, contact, value):
         self.encryptors[contact] = value
 
-    def set_user(self, username, password):
+    def set_user(self, username, password, storage=None):
         self.user = User(username, password)
-        self.storage = ClientStorage(username)
+        self.storage = ClientStorage(username) if storage is None else storage
 
     def start(self):
         """ Method start connection to server """
 
+        print(f'Connect to {self.addr}:{self.port} as {self.username}')
+        response = self.connect()
+        if response.code != OK:
+            show_error(str(response.message))
+            self.logger.warning(response)
+            exit()
+        print('Done')
+        self.key_pool.start()
+
+    def connect(self):
+        """ Method connects to server and authorizes user without UI,
+            returns response of authorization, listener is started on success """
+
         self.socket = socket(*self.TCP)
-        start_txt = f'Connect to {self.addr}:{self.port} as {self.username}'
-        self.logger.debug(start_txt)
-        print(start_txt)
-        self.__connect()
+        self.decoder = FrameDecoder(self.socket)
+        self.encoder = FrameEncoder()
+        self.logger.debug(f'Connect to {self.addr}:{self.port} as {self.username}')
+        response = self.__connect()
+        return Response(SERVER_ERROR) if response is None else response
 
     @try_except_wrapper
     def __connect(self):
         self.socket.connect((self.addr, self.port))
         self.connected = True
-        print('Done')
         response = self.authorization()
         if response.code != OK:
-            show_error(str(response.message))
-            self.logger.warning(response)
-            exit()
+            return response
 
         self.listener = ClientThread(self.__listen_server, self.logger)
         self.listener.start()
 
         self.executor = ClientThread(self.__execute, self.logger)
         self.executor.start()
+        return response
+
+    def close(self):
+        """ Method closes connection to server """
+
+        if not self.connected:
+            return
+        self.__send_request(Request(RequestAction.QUIT))
+        self.connected = False
+        # listener thread is blocked in recv, close alone doesn't end connection
+        try:
+            self.socket.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
 
     def __execute(self):
         self.logger.debug('EXECUTER STARTED')
@@ -118,7 +220,7 @@ class Client:
             self.logger.debug(f'{func} | {args}')
             try:
                 func(*args)
-            except Exceptiona as e:
+            except Exception as e:
                 self.logger.error(e)
 
     @try_except_wrapper
@@ -126,50 +228,123 @@ class Client:
         if not self.connected:
             return
         self.logger.debug(request)
-        send_data(self.socket, request)
+        send_data(self.socket, request, self.encoder)
+
+    def __call(self, request, kind=PendingRequest.SINGLE, convert=None):
+        """ Method sends request and returns future of answer
+            Without request ids on server answers are read in order """
+
+        pending = PendingRequest(kind, convert)
+        if Feature.REQUEST_IDS not in self.features:
+            self.__send_request(request)
+            answers = self.file_answers \
+                if kind == PendingRequest.FILE \
+                else self.answers
+            while not pending.add(answers.get(timeout=self.ANSWER_TIMEOUT)):
+                pass
+            return pending.future
+
+        request.id = next(self.request_ids)
+        self.pending[request.id] = pending
+        self.__send_request(request)
+        return pending.future
 
     @try_except_wrapper
     def __get_response(self):
         if not self.connected:
             return None
-        response = get_data(self.socket)
+        response = self.decoder.get()
         self.logger.debug(response)
         return response
 
     @try_except_wrapper
     def authorization(self):
         """ Method of authorization on server """
-        pr_req = Request(RequestAction.PRESENCE, self.user.username)
+        presence = Presence(self.user.username, self.FEATURES)
+        pr_req = Request(RequestAction.PRESENCE, presence)
         self.__send_request(pr_req)
         resp = self.__get_response()
         if resp is None:
             return Response(SERVER_ERROR)
         if resp.code != AUTH:
             return resp
+        pub_key = resp.message
+        if isinstance(pub_key, dict):
+            self.__set_features(pub_key[FEATURES])
+            if Feature.FILE_STREAM in self.features and \
+                    Feature.REQUEST_IDS in self.features and CHUNK in pub_key:
+                self.file_chunk = min(pub_key[CHUNK], self.FILE_CHUNK)
+            pub_key = pub_key[KEY]
         enc_pass = encrypt_rsa(
-            import_pub_key(resp.message.encode()),
+            import_pub_key(pub_key.encode()),
             self.user.password)
         auth_req = Request(RequestAction.AUTH, enc_pass.decode())
         self.__send_request(auth_req)
         return self.__get_response()
 
+    def __set_features(self, features):
+        """ Method applies features accepted by server """
+
+        self.features = set(features)
+        if Feature.BINARY in self.features:
+            self.encoder.codec = get_codec(BINARY)
+            self.decoder.codec = get_codec(BINARY)
+        if Feature.ZLIB in self.features:
+            self.encoder.enable_compression()
+            self.decoder.enable_compression()
+
     def get_chat_req(self, contact):
-        """ Method send request for gets all messages of chat with contact """
-        if self.get_chat_sended:
-            return
+        """ Method send request for gets all messages of chat with contact
+            Returns future of list of ChatRow """
+
         req = Request(RequestAction.COMMAND,
                       f'get_chat {self.user.username} {contact}')
-        self.__send_request(req)
+        return self.__call(req, PendingRequest.COLLECTION, ChatRow.from_body)
 
     def get_users_req(self):
-        """ Method send request for gets users online """
+        """ Method send request for gets users online
+            Returns future of list of users """
 
-        self.__send_request(Request(RequestAction.COMMAND, 'get_users'))
+        req = Request(RequestAction.COMMAND, 'get_users')
+        return self.__call(req, PendingRequest.COLLECTION)
 
     def get_contacts_req(self):
-        """ Method send request for gets list contacts """
+        """ Method send request for gets list contacts
+            Returns future of list of contacts """
+
+        req = Request(RequestAction.COMMAND, 'get_contacts')
+        return self.__call(req, PendingRequest.COLLECTION)
+
+    def check_avatar_req(self, user, av_hash):
+        """ Method send request for check of avatar hash
+            Returns future of answer (1 if avatar is actual) """
+
+        req = Request(RequestAction.COMMAND, f'check_avatar {user} {av_hash}')
+        return self.__call(req)
+
+    def check_avatars_req(self, hashes):
+        """ Method send request for check of avatars of several users,
+            hashes is dictionary {user: hash}, hash is None if avatar is missing
+            Returns future of list of users whose avatar is stale or missing """
+
+        args = ' '.join(f'{user}={av_hash or ""}' for user, av_hash in hashes.items())
+        req = Request(RequestAction.COMMAND,
+                      f'check_avatars {self.user.username} {args}')
+        return self.__call(req, PendingRequest.COLLECTION)
+
+    def get_stats_req(self):
+        """ Method send request for gets statistics of server
+            Returns future of dictionary of statistics by component """
+
+        req = Request(RequestAction.COMMAND, 'get_stats')
+        return self.__call(req)
+
+    def get_avatar_req(self, user):
+        """ Method send request for gets avatar of user
+            Returns future of avatar bytes """
 
-        self.__send_request(Request(RequestAction.COMMAND, 'get_contacts'))
+        req = Request(RequestAction.GET_IMAGE, user)
+        return self.__call(req, PendingRequest.FILE)
 
     @try_except_wrapper
     def start_chat(self, contact):
@@ -179,7 +354,7 @@ class Client:
         if key is not None:
             self.set_encryptor(contact, ClientCrypt(key))
 
-        prv, pub = gen_keys()
+        prv, pub = self.key_pool.get()
         self.priv_key = prv
         msg = Msg(pub.export_key().decode(), self.username, contact)
         start_req = Request(RequestAction.START_CHAT, msg)
@@ -189,7 +364,7 @@ class Client:
     def accepting_chat(self, resp_mes):
         """ Method of handle request to start chat """
 
-        r_msg = Msg.from_formated(resp_mes)
+        r_msg = Msg.from_body(resp_mes)
         pub = import_pub_key(r_msg.text.encode())
 
         key = self.storage.get_key(r_msg.sender)
@@ -208,7 +383,7 @@ class Client:
     def accepted_chat(self, resp_mes):
         """ Method of handle response about confirm start of chat """
 
-        msg = Msg.from_formated(resp_mes)
+        msg = Msg.from_body(resp_mes)
         encryptor = self.get_encryptor(msg.sender)
         if encryptor is not None:
             return
@@ -217,21 +392,36 @@ class Client:
         self.storage.add_chat_key(msg.sender, secret)
 
     def add_contact(self, contact):
-        """ Method add contact in contact list """
+        """ Method add contact in contact list
+            Returns future of answer or None if contact already exists """
 
         if self.storage.get_contact(contact):
-            return False
+            return None
         self.storage.add_contact(contact)
         req = Request(RequestAction.COMMAND, f'add_contact {contact}')
-        self.__send_request(req)
-        return True
+        return self.__call(req)
 
     def rem_contact(self, contact):
-        """ Method remove contact from contact list """
+        """ Method remove contact from contact list
+            Returns future of answer """
 
         self.storage.remove_contact(contact)
         req = Request(RequestAction.COMMAND, f'rem_contact {contact}')
-        self.__send_request(req)
+        return self.__call(req)
+
+    def join_room(self, room):
+        """ Method joins room, messages to '@room' are received from server
+            Returns future of answer """
+
+        req = Request(RequestAction.COMMAND, f'join_room {room}')
+        return self.__call(req)
+
+    def leave_room(self, room):
+        """ Method leaves room
+            Returns future of answer """
+
+        req = Request(RequestAction.COMMAND, f'leave_room {room}')
+        return self.__call(req)
 
     def sync_contacts(self, contacts):
         """ Method sync of list contact from server to client """
@@ -261,79 +451,148 @@ class Client:
 
     @try_except_wrapper
     def send_avatar(self, avatar_bytes):
-        avatar_part = 512
+        if self.file_chunk:
+            self.__send_file_stream(avatar_bytes)
+            return
+        avatar_part = self.LEGACY_FILE_CHUNK
         for i in range(0, len(avatar_bytes), avatar_part):
-            part = b64encode(avatar_bytes[i:i + avatar_part])
-            part_req = Request(RequestAction.IMAGE, part.decode())
-            self.__send_request(part_req)
-            self.file_answers.get()
+            part_req = Request(RequestAction.IMAGE, avatar_bytes[i:i + avatar_part])
+            self.__call(part_req, PendingRequest.FILE).result(self.ANSWER_TIMEOUT)
 
-        self.logger.debug(f'Send end part')
+        self.logger.debug('Send end part')
         end_req = Request(RequestAction.END_IMAGE, 'set_avatar')
-        self.__send_request(end_req)
-        resp = self.file_answers.get()
+        self.__call(end_req, PendingRequest.FILE).result(self.ANSWER_TIMEOUT)
+
+    def __send_file_stream(self, data):
+        """ Method sends file by chunks, up to FILE_WINDOW chunks are sent
+            without answer, server checks checksum of file in the end """
+
+        window = deque()
+        for offset in range(0, len(data), self.file_chunk):
+            if len(window) >= self.FILE_WINDOW:
+                window.popleft().result(self.ANSWER_TIMEOUT)
+            chunk = FileChunk(offset, data[offset:offset + self.file_chunk])
+            window.append(self.__call(Request(RequestAction.IMAGE, chunk)))
+
+        self.logger.debug('Send end of file')
+        info = FileInfo.of(data)
+        end_req = Request(RequestAction.END_IMAGE, info)
+        answer = self.__call(end_req).result(self.ANSWER_TIMEOUT)
+        if answer != info.checksum:
+            raise ValueError(f'File not sent: {answer}')
 
     @try_except_wrapper
     def check_self_avatar(self):
-        user = self.username
         av_hash = self.storage.get_avatar_hash(self.username)
-        ch_req = Request(RequestAction.COMMAND, f'check_avatar {user} {av_hash}')
-        self.__send_request(ch_req)
-        resp = self.answers.get()
+        resp = self.check_avatar_req(self.username, av_hash)\
+            .result(self.ANSWER_TIMEOUT)
         if not resp:
             self.send_avatar(self.avatar)
 
     @try_except_wrapper
-    def get_user_avatar(self, user):
-        avatar = self.storage.get_avatar(user)
-        if avatar:
-            ch_req = Request(RequestAction.COMMAND, f'check_avatar {user} {avatar.avatar_hash}')
-            self.__send_request(ch_req)
-            resp = self.answers.get()
-            if resp == 1:
-                return avatar.avatar
-        get_req = Request(RequestAction.GET_IMAGE, user)
-        self.__send_request(get_req)
-        avatar_bytes = b''
-
-        while True:
-            resp = self.file_answers.get()
-            if not resp:
-                break
-            avatar_bytes += b64decode(resp.encode())
+    def get_user_avatars(self, users):
+        """ Method gets avatars of users, all checks and downloads
+            are sent before waiting of answers """
+
+        if Feature.AVATAR_CHECKS in self.features:
+            return self.__get_user_avatars_bulk(users)
+
+        checks = {}
+        for user in users:
+            avatar = self.storage.get_avatar(user)
+            if avatar:
+                checks[user] = (avatar, self.check_avatar_req(user, avatar.avatar_hash))
+
+        result, downloads = {}, {}
+        for user in users:
+            if user in checks:
+                avatar, future = checks[user]
+                if future.result(self.ANSWER_TIMEOUT) == 1:
+                    result[user] = avatar.avatar
+                    continue
+            downloads[user] = self.get_avatar_req(user)
+
+        for user, future in downloads.items():
+            avatar_bytes = future.result(self.ANSWER_TIMEOUT)
+            self.storage.set_avatar(user, avatar_bytes)
+            result[user] = avatar_bytes
+        return result
+
+    def __get_user_avatars_bulk(self, users):
+        """ Method checks avatars of users by one request,
+            only stale or missing avatars are downloaded """
+
+        avatars = {user: self.storage.get_avatar(user) for user in users}
+        hashes = {user: avatar.avatar_hash if avatar else None
+                  for user, avatar in avatars.items()}
+        # hashes of server are known after check or notification of change
+        known = self.avatar_hashes
+        unknown = {user: h for user, h in hashes.items() if user not in known}
+        stale = set(self.check_avatars_req(unknown).result(self.ANSWER_TIMEOUT)) \
+            if unknown else set()
+
+        result, downloads = {}, {}
+        for user, avatar in avatars.items():
+            if user in stale or known.get(user, hashes[user]) != hashes[user]:
+                downloads[user] = self.get_avatar_req(user)
+            else:
+                known[user] = hashes[user]
+                result[user] = avatar.avatar if avatar else None
+
+        for user, future in downloads.items():
+            avatar_bytes = future.result(self.ANSWER_TIMEOUT)
+            self.storage.set_avatar(user, avatar_bytes)
+            known[user] = FileInfo.of(avatar_bytes).checksum if avatar_bytes else None
+            result[user] = avatar_bytes
+        return result
 
-        self.storage.set_avatar(user, avatar_bytes)
-        return avatar_bytes
-        pass
+    @try_except_wrapper
+    def get_user_avatar(self, user):
+        return self.get_user_avatars([user])[user]
 
     @try_except_wrapper
     def send_msg(self, text, to):
-        """ Method send messge to server """
+        """ Method send messge to server, messages to '@room' aren't encrypted """
 
-        if to != '@ALL':
-            encryptor = self.get_encryptor(to)
-            text = encryptor.encript_msg(text.encode()).decode()
+        room = to.startswith('@')
+        if room:
+            text = text.encode()
         else:
-            text = b64encode(text.encode()).decode()
+            encryptor = self.get_encryptor(to)
+            text = encryptor.encrypt(text.encode())
         msg = Msg(text, self.user, to)
-        if to != '@ALL':
-            self.storage.add_message(msg.to, msg.text)
+        if not room:
+            self.storage.add_message(msg.to, b64_text(msg.text))
         request = Request(RequestAction.MESSAGE, msg)
         self.__send_request(request)
 
     def __listen_server(self):
         """ Method listen responses from server """
 
-        while self.connected:
-            resp = get_data(self.socket)
+        try:
+            self.__receive_responses()
+        finally:
+            for pending in self.pending.values():
+                pending.future.set_exception(ConnectionError('Connection closed'))
+            self.pending.clear()
+
+    def __receive_responses(self):
+        for resp in self.decoder:
+            if not self.connected:
+                break
             self.logger.debug(resp)
             if resp.type != RESPONSE:
                 self.logger.warning(f'Received not RESPONSE:\n {resp}')
                 continue
-            if resp.code == ANSWER:
-                self.answers.put(resp.message)
+            if resp.id is not None and resp.id in self.pending:
+                if self.pending[resp.id].add(resp):
+                    self.pending.pop(resp.id)
+            elif resp.code == ANSWER or resp.code == COLLECTION:
+                self.answers.put(resp)
             elif resp.code == FILE_ANSWER:
-                self.file_answers.put(resp.message)
+                self.file_answers.put(resp)
+            elif resp.code == AVATAR_CHANGED:
+                self.__avatar_changed(resp.message)
             elif resp.code in self.subs.keys():
                 for sub in self.subs[resp.code]:
                     # sub(resp.message)
@@ -341,15 +600,14 @@ class Client:
             # else:
             #     self.logger.debug(resp.message)
 
-    @try_except_wrapper
-    def get_collection_response(self):
-        result = []
-        while True:
-            resp = self.answers.get(timeout=60)
-            if not resp:
-                break
-            result.append(resp)
-        return result
+    def __avatar_changed(self, body):
+        """ Method remembers new hash of avatar of user, avatar is downloaded
+            when it is requested next time, subscribers get username """
+
+        changed = AvatarHash.from_body(body)
+        self.avatar_hashes[changed.username] = changed.checksum
+        for sub in self.subs.get(int(AVATAR_CHANGED), []):
+            self.execute_queue.put((sub, changed.username))
 
     def subscribe(self, code, func):
         """ Method subscribe of function to response code """
@@ -359,13 +617,17 @@ class Client:
         else:
             self.subs[code] = [func]
 
-    def parse_recv_message(self, msg):
-        """ Method parse/decrypt message """
+    def parse_recv_message(self, body):
+        """ Method parse/decrypt message, returns Msg with text """
 
-        msg = Msg.from_formated(msg)
-        if msg.to != '@ALL':
-            encryptor = self.get_encryptor(msg.sender)
-            msg.text = encryptor.decrypt_msg(msg.text.encode()).decode()
-        else:
-            msg.text = b64decode(msg.text).decode()
-        return msg.sender, msg.text, msg.to
+        msg = Msg.from_body(body)
+        contact = msg.to if msg.to.startswith('@') else msg.sender
+        msg.text = self.decrypt_text(contact, msg.text)
+        return msg
+
+    def decrypt_text(self, contact, text):
+        """ Method decrypts text of message of chat with contact """
+
+        if not contact.startswith('@'):
+            return self.get_encryptor(contact).decrypt(raw_bytes(text)).decode()
+        return raw_bytes(text).decode()
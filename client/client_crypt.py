@@ -65,16 +65,24 @@ class ClientCrypt:
     def __padding(text):
         return text + b" " * (16 - len(text) % 16)
 
+    def encrypt(self, message):
+        """ Method of AES encrypt, returns raw bytes (iv + data) """
+
+        aes_encryptor = AES.new(self.secret, self.CRYPT_MODE)
+        return aes_encryptor.iv + aes_encryptor.encrypt(self.__padding(message))
+
+    def decrypt(self, message):
+        """ Method of AES decrypt of raw bytes (iv + data) """
+
+        aes_encryptor = AES.new(self.secret, self.CRYPT_MODE, iv=message[:16])
+        return aes_encryptor.decrypt(message[16:]).strip()
+
     def encript_msg(self, message):
         """ Method of AES encrypt """
 
-        aes_encryptor = AES.new(self.secret, self.CRYPT_MODE)
-        return b64encode(aes_encryptor.iv +
-                         aes_encryptor.encrypt(self.__padding(message)))
+        return b64encode(self.encrypt(message))
 
     def decrypt_msg(self, message):
         """ Method of AES decrypt """
 
-        message = b64decode(message)
-        aes_encryptor = AES.new(self.secret, self.CRYPT_MODE, iv=message[:16])
-        return aes_encryptor.decrypt(message[16:]).strip()
+        return self.decrypt(b64decode(message))
@@ -0,0 +1,236 @@
+""" Module of codecs of jim packages
+    Encode functions are generated once per package class """
+
+import json
+from base64 import b64encode
+from operator import attrgetter
+from time import perf_counter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from jim.constants import REQUEST, RESPONSE, TYPE, ACTION, BODY, CODE, \
+                          MESSAGE, TIME, ID
+from jim.classes.package import Request, Response
+from jim.classes.request_body import BaseBody
+from jim.binary import PACKAGE_HEADER, REQUEST_KIND, RESPONSE_KIND, TRUNCATED, \
+                       pack_value, unpack_value
+
+ENCODING = 'utf-8'
+
+JSON = 'json'
+ORJSON = 'orjson'
+BINARY = 'binary'
+
+PACKAGES = {REQUEST: Request, RESPONSE: Response}
+
+
+def body_value(value):
+    """ Function returns serializable value of package body """
+
+    if isinstance(value, BaseBody):
+        return value.get_dict()
+    return value
+
+
+def json_default(value):
+    """ Function serializes raw bytes fields as base64 text """
+
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return b64encode(value).decode()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def compile_to_dict(cls):
+    """ Function generates function returns dictionary of package class """
+
+    items = []
+    for field in cls.__slots__:
+        value = f'package.{field}'
+        if field in cls.BODY_FIELDS:
+            value = f'body_value({value})'
+        items.append(f'{field!r}: {value}')
+    source = f'def to_dict(package):\n    return {{{", ".join(items)}}}\n'
+    namespace = {'body_value': body_value}
+    exec(source, namespace)
+    return namespace['to_dict']
+
+
+def package_from_dict(js_data):
+    """ Function returns package by dictionary """
+
+    cls = PACKAGES.get(js_data[TYPE])
+    if cls is None:
+        raise ValueError('Unknown package')
+    return cls.from_dict(js_data)
+
+
+class Codec:
+    """ Base class of package codec """
+
+    __slots__ = ('encoders',)
+
+    name = None
+    binary = False
+
+    def __init__(self):
+        self.encoders = {}
+
+    def encode(self, package):
+        """ Method returns payload by package """
+
+        cls = package.__class__
+        encoder = self.encoders.get(cls)
+        if encoder is None:
+            encoder = self.encoders[cls] = self.compile(cls)
+        return encoder(package)
+
+    def compile(self, cls):
+        """ Method returns encode function generated for package class """
+
+        raise NotImplementedError
+
+    def decode(self, payload):
+        """ Method returns package by payload """
+
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """ Codec of stdlib json """
+
+    __slots__ = ()
+
+    name = JSON
+
+    def compile(self, cls):
+        to_dict = compile_to_dict(cls)
+        dumps = json.dumps
+        return lambda package: \
+            dumps(to_dict(package), default=json_default).encode(ENCODING)
+
+    def decode(self, payload):
+        return package_from_dict(json.loads(bytes(payload)))
+
+
+class OrjsonCodec(Codec):
+    """ Codec of optional orjson backend, the same wire format as json """
+
+    __slots__ = ()
+
+    name = ORJSON
+
+    def compile(self, cls):
+        to_dict = compile_to_dict(cls)
+        dumps = orjson.dumps
+        return lambda package: dumps(to_dict(package), default=json_default)
+
+    def decode(self, payload):
+        return package_from_dict(orjson.loads(payload))
+
+
+class BinaryCodec(Codec):
+    """ Codec of compact binary format (see jim.binary) """
+
+    __slots__ = ()
+
+    name = BINARY
+    binary = True
+
+    KINDS = {
+        Request: (REQUEST_KIND, (ACTION, BODY, ID)),
+        Response: (RESPONSE_KIND, (CODE, MESSAGE, ID)),
+    }
+    PACKAGES = {kind: (cls, fields) for cls, (kind, fields) in KINDS.items()}
+
+    def compile(self, cls):
+        kind, fields = self.KINDS[cls]
+        values = attrgetter(*fields)
+        header = PACKAGE_HEADER.pack
+
+        def encode(package):
+            out = bytearray(header(kind, package.time))
+            for value in values(package):
+                pack_value(value, out)
+            return out
+        return encode
+
+    def decode(self, payload):
+        if len(payload) < PACKAGE_HEADER.size:
+            raise ValueError(TRUNCATED)
+        kind, time = PACKAGE_HEADER.unpack_from(payload, 0)
+        if kind not in self.PACKAGES:
+            raise ValueError('Unknown package')
+        cls, fields = self.PACKAGES[kind]
+
+        js_data = {TIME: time}
+        offset = PACKAGE_HEADER.size
+        for field in fields:
+            js_data[field], offset = unpack_value(payload, offset)
+        if offset != len(payload):
+            raise ValueError('Incorrect binary package')
+        return cls.from_dict(js_data)
+
+
+CODECS = {}
+
+
+def register_codec(codec):
+    """ Function adds codec in registry """
+
+    CODECS[codec.name] = codec
+    return codec
+
+
+def get_codec(name):
+    """ Function returns codec from registry by name """
+
+    return CODECS[name]
+
+
+register_codec(JsonCodec())
+if orjson:
+    register_codec(OrjsonCodec())
+register_codec(BinaryCodec())
+
+TEXT_CODEC = CODECS.get(ORJSON) or CODECS[JSON]
+
+
+def main():
+    """ Microbenchmark of encode/decode throughput for each codec """
+
+    from jim.codes import ANSWER, FILE_ANSWER
+    from jim.constants import RequestAction
+    from jim.classes.request_body import Msg
+
+    count = 20000
+    samples = {
+        'message': Request(RequestAction.MESSAGE,
+                           Msg(b'Hello, world!' * 8, 'sender', '@ALL')),
+        'answer': Response(ANSWER, [f'user_{i}' for i in range(50)]),
+        'file': Response(FILE_ANSWER, bytes(range(256)) * 16),
+    }
+
+    print(f'{"codec":8} {"package":8} {"bytes":>6} {"encode/s":>10} {"decode/s":>10}')
+    for codec in CODECS.values():
+        for name, package in samples.items():
+            payload = codec.encode(package)
+
+            start = perf_counter()
+            for _ in range(count):
+                codec.encode(package)
+            encode_time = perf_counter() - start
+
+            start = perf_counter()
+            for _ in range(count):
+                codec.decode(payload)
+            decode_time = perf_counter() - start
+
+            print(f'{codec.name:8} {name:8} {len(payload):6} '
+                  f'{count / encode_time:10.0f} {count / decode_time:10.0f}')
+
+
+if __name__ == '__main__':
+    main()
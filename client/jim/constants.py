@@ -6,6 +6,7 @@ RESPONSE = 'response'
 
 ACTION = 'action'
 TIME = 'time'
+ID = 'id'
 BODY = 'body'
 CODE = 'code'
 MESSAGE = 'message'
@@ -14,6 +15,15 @@ PASSWORD = 'password'
 SENDER = 'sender'
 TO = 'to'
 TEXT = 'text'
+KEY = 'key'
+FEATURES = 'features'
+ITEMS = 'items'
+LAST = 'last'
+OFFSET = 'offset'
+DATA = 'data'
+SIZE = 'size'
+CHECKSUM = 'checksum'
+CHUNK = 'chunk'
 
 
 class RequestAction:
@@ -29,3 +39,16 @@ class RequestAction:
     IMAGE = 'image'
     END_IMAGE = 'end_image'
     GET_IMAGE = 'get_image'
+
+
+class Feature:
+    """ Class the storage of protocol features negotiated on presence """
+
+    BINARY = 'binary'
+    ZLIB = 'zlib'
+    COLLECTIONS = 'collections'
+    REQUEST_IDS = 'request_ids'
+    MESSAGES = 'messages'
+    CHAT_ROWS = 'chat_rows'
+    FILE_STREAM = 'file_stream'
+    AVATAR_CHECKS = 'avatar_checks'
@@ -0,0 +1,56 @@
+""" Module implements pool of keys generated in background """
+
+from queue import Queue, Empty
+from threading import Thread, Lock
+
+POOL_SIZE = 4
+
+
+class KeyPool:
+    """ Class of pool of pre-generated keys
+        Generate is function returns new keys, worker thread keeps
+        size keys ready, if pool is empty keys are generated inline """
+
+    __slots__ = ('generate', 'keys', 'thread', 'hits', 'misses', 'lock')
+
+    def __init__(self, generate, size=POOL_SIZE):
+        self.generate = generate
+        self.keys = Queue(maxsize=size)
+        self.thread = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def start(self):
+        """ Method starts worker fills pool """
+
+        with self.lock:
+            if self.thread is None and self.keys.maxsize > 0:
+                self.thread = Thread(target=self.__fill, name='key_pool',
+                                     daemon=True)
+                self.thread.start()
+        return self
+
+    def __fill(self):
+        while True:
+            self.keys.put(self.generate())
+
+    def get(self):
+        """ Method returns ready keys or generates them if pool is empty """
+
+        self.start()
+        try:
+            keys = self.keys.get_nowait()
+        except Empty:
+            self.misses += 1
+            return self.generate()
+        self.hits += 1
+        return keys
+
+    def get_stats(self):
+        """ Method returns statistics of pool """
+
+        return {'ready': len(self), 'hits': self.hits, 'misses': self.misses}
+
+    def __len__(self):
+        return self.keys.qsize()
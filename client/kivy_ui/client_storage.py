@@ -1,5 +1,4 @@
 import logging
-from base64 import b64decode
 
 from client_core import Client
 from decorators import try_except_wrapper
@@ -44,6 +43,7 @@ class ClientAppStorage(metaclass=Singleton):
     got_message = Event(str)
     starting_chat_ev = Event(str)
     accepted_chat_ev = Event(str)
+    user_avatar_changed = Event(str)
 
     image_selected = Event(str)
     # endregion
@@ -64,34 +64,49 @@ class ClientAppStorage(metaclass=Singleton):
         self.client.subscribe(203, self.got_message.emit)
         self.client.subscribe(204, self.starting_chat_ev.emit)
         self.client.subscribe(205, self.accepted_chat_ev.emit)
+        self.client.subscribe(206, self.user_avatar_changed.emit)
 
         self.starting_chat_ev += self.client.accepting_chat
         self.accepted_chat_ev += self.accepted_chat
+        self.user_avatar_changed += self.forget_user_avatar
 
     def start_client(self):
         if self.client:
             self.client.start()
 
     def load_user_data(self):
+        users = self.client.get_users_req()
+        contacts = self.client.get_contacts_req()
         self.load_avatar()
-        self.load_users()
-        self.load_contacts()
+        self.load_users(users)
+        self.load_contacts(contacts)
 
     def load_avatar(self):
         avatar = self.client.avatar
         self.avatar_changed.emit(avatar)
 
-    def load_users(self):
-        self.client.get_users_req()
-        users = self.client.get_collection_response()
-        users.remove(self.client.username)
+    def load_users(self, users=None):
+        users = (users or self.client.get_users_req()) \
+            .result(self.client.ANSWER_TIMEOUT)
+        users = [u for u in users if u != self.client.username]
+        self.load_user_avatars(users)
         self.users_loaded.emit(users)
 
-    def load_contacts(self):
-        self.client.get_contacts_req()
-        contacts = self.client.get_collection_response()
+    def load_contacts(self, contacts=None):
+        contacts = (contacts or self.client.get_contacts_req()) \
+            .result(self.client.ANSWER_TIMEOUT)
+        self.load_user_avatars(contacts)
         self.contacts_loaded.emit(contacts)
 
+    @try_except_wrapper
+    def load_user_avatars(self, users):
+        users = [u for u in users if u not in self.avatars.keys()]
+        if users:
+            self.avatars.update(self.client.get_user_avatars(users) or {})
+
+    def forget_user_avatar(self, user):
+        self.avatars.pop(user, None)
+
     @try_except_wrapper
     def get_user_avatar(self, user):
         if user not in self.avatars.keys():
@@ -111,18 +126,11 @@ class ClientAppStorage(metaclass=Singleton):
 
     @try_except_wrapper
     def load_chat(self, *args):
-        self.client.get_chat_req(self.curr_chat_user)
-        self.client.get_chat_sended = True
-        chat = self.client.get_collection_response()
-        self.client.get_chat_sended = False
+        chat = self.client.get_chat_req(self.curr_chat_user)\
+            .result(self.client.ANSWER_TIMEOUT)
         if chat:
             self.messages_loaded.emit(chat)
 
     @try_except_wrapper
     def decrypt_message(self, message):
-        if self.curr_chat_user != '@ALL':
-            message = self.client.get_encryptor(self.curr_chat_user)\
-                             .decrypt_msg(message).decode()
-        else:
-            message = b64decode(message).decode()
-        return message
\ No newline at end of file
+        return self.client.decrypt_text(self.curr_chat_user, message)
\ No newline at end of file
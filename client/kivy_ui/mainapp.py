@@ -100,15 +100,17 @@ class ProfileScreen(Screen):
 
     @try_except_wrapper
     def add_contact(self, username):
-        self.storage.client.add_contact(username)
-        self.storage.client.answers.get()
+        future = self.storage.client.add_contact(username)
+        if not future:
+            return
+        future.result(self.storage.client.ANSWER_TIMEOUT)
         self.add_user_in_list(self.contacts_list, username,
                               'DEL', self.remove_contact)
 
     @try_except_wrapper
     def remove_contact(self, username):
-        self.storage.client.rem_contact(username)
-        self.storage.client.answers.get()
+        self.storage.client.rem_contact(username)\
+            .result(self.storage.client.ANSWER_TIMEOUT)
         self.remove_user_from_list(self.contacts_list, username)
 
     @try_except_wrapper
@@ -177,7 +179,6 @@ class MessageBox(BoxLayout):
 
 
 class MessengerScreen(Screen):
-    TIME_FMT = '%Y-%m-%d %H:%M:%S.%f'
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -220,17 +221,16 @@ class MessengerScreen(Screen):
         # print(ui_list.height)
 
     def recieve_message(self, msg):
-        sender, msg, recipient = self.client.parse_recv_message(msg)
-        if (recipient == '@ALL' and self.curr_chat_user == '@ALL') or \
-                (recipient != '@ALL' and sender == self.curr_chat_user):
-            time = datetime.now().strftime('%H:%M')
-            self.add_message_in_chat(sender, msg, time)
-
-    def parse_message(self, msg):
-        sender, time, message, *_ = msg.split('__')
-        time = datetime.strptime(time, self.TIME_FMT).strftime('%H:%M')
-        message = self.storage.decrypt_message(message)
-        self.add_message_in_chat(sender, message, time)
+        msg = self.storage.client.parse_recv_message(msg)
+        if (msg.to == '@ALL' and self.storage.curr_chat_user == '@ALL') or \
+                (msg.to != '@ALL' and msg.sender == self.storage.curr_chat_user):
+            time = datetime.fromtimestamp(msg.time) if msg.time else datetime.now()
+            self.add_message_in_chat(msg.sender, msg.text, time.strftime('%H:%M'))
+
+    def parse_message(self, row):
+        time = datetime.fromtimestamp(row.time).strftime('%H:%M')
+        message = self.storage.decrypt_message(row.text)
+        self.add_message_in_chat(row.sender, message, time)
 
     def send_message(self):
         user = self.storage.curr_chat_user
@@ -1,6 +1,6 @@
 """ Module implements main window logic """
 
-from base64 import b64encode, b64decode
+from base64 import b64encode
 from datetime import datetime
 import os
 
@@ -23,9 +23,11 @@ class SignalStorage(QObject):
     contact_added = pyqtSignal(str)
     contact_removed = pyqtSignal(str)
 
-    starting_chat = pyqtSignal(str)
-    accepted_chat = pyqtSignal(str)
-    got_message = pyqtSignal(str)
+    # bodies of messages are dicts since client advertises messages feature
+    starting_chat = pyqtSignal(object)
+    accepted_chat = pyqtSignal(object)
+    got_message = pyqtSignal(object)
+    avatar_changed = pyqtSignal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -55,11 +57,14 @@ class MainWindow(QMainWindow):
         self.storage = SignalStorage()
         # self.set_chat_active(False)
         self.curr_chat_user = '@ALL'
-        self.load_chat()
+        chat = self.client.get_chat_req(self.curr_chat_user)
+        users = self.client.get_users_req()
+        contacts = self.client.get_contacts_req()
+        self.load_chat(chat)
 
         self.load_avatar()
-        self.load_users()
-        self.load_contacts()
+        self.load_users(users)
+        self.load_contacts(contacts)
 
         self.ui.addContactTbx.textChanged.connect(
             lambda x: self.ui.addContactBtn.setEnabled(len(x) > 2))
@@ -85,12 +90,14 @@ class MainWindow(QMainWindow):
 
         self.storage.starting_chat.connect(self.starting_chat)
         self.storage.accepted_chat.connect(self.accepted_chat)
+        self.storage.avatar_changed.connect(self.forget_user_avatar)
 
         self.client.subscribe(201, self.storage.user_connected.emit)
         self.client.subscribe(202, self.storage.user_disconnected.emit)
         self.client.subscribe(203, self.storage.got_message.emit)
         self.client.subscribe(204, self.storage.starting_chat.emit)
         self.client.subscribe(205, self.storage.accepted_chat.emit)
+        self.client.subscribe(206, self.storage.avatar_changed.emit)
 
     @property
     def message(self):
@@ -159,15 +166,6 @@ class MainWindow(QMainWindow):
         if len(item) > 0:
             list_view.takeItem(list_view.row(item[0]))
 
-    def __get_collection_response(self):
-        result = []
-        while True:
-            resp = self.client.answers.get()
-            if not resp:
-                break
-            result.append(resp)
-        return result
-
     def __get_user_avatar(self, user):
         if user not in self.avatars.keys():
             avatar = self.client.get_user_avatar(user)
@@ -176,17 +174,27 @@ class MainWindow(QMainWindow):
             avatar = self.avatars[user]
         return avatar
 
-    def load_users(self):
+    def forget_user_avatar(self, user):
+        """ Method removes changed avatar of user, it is loaded on next showing """
+
+        self.avatars.pop(user, None)
+
+    def __load_user_avatars(self, users):
+        """ Method requests avatars of several users at once """
+
+        users = [u for u in users if u not in self.avatars.keys()]
+        if users:
+            self.avatars.update(self.client.get_user_avatars(users) or {})
+
+    def load_users(self, users=None):
         """ Method loads users in online list """
 
-        self.client.get_users_req()
-        users = self.client.get_collection_response()
-        # users = self.client.answers.get()
-        # users = self.__get_collection_response()
+        users = (users or self.client.get_users_req()) \
+            .result(self.client.ANSWER_TIMEOUT)
+        users = [u for u in users if u != self.client.username]
+        self.__load_user_avatars(users)
 
         for user in users:
-            if user == self.client.username:
-                continue
             self.add_online_user(user)
 
     def add_online_user(self, user):
@@ -201,15 +209,14 @@ class MainWindow(QMainWindow):
 
         self.__rem_user_from_list(self.ui.usersList, user)
 
-    def load_contacts(self):
+    def load_contacts(self, contacts=None):
         """ Method loads users in contact list """
 
-        self.client.get_contacts_req()
-        contacts = self.client.get_collection_response()
-        # contacts = self.client.answers.get()
-        # contacts = self.__get_collection_response()
+        contacts = (contacts or self.client.get_contacts_req()) \
+            .result(self.client.ANSWER_TIMEOUT)
 
         self.client.sync_contacts(contacts)
+        self.__load_user_avatars(contacts)
         for contact in contacts:
             self.__add_user_in_list(self.ui.contactsList, contact,
                                     'Del', self.remove_contact,
@@ -222,21 +229,15 @@ class MainWindow(QMainWindow):
         widget = sender.parent()
         username = widget.username
         self.add_contact_by_name(username)
-        # if not self.client.add_contact(username):
-        #     return
-        # self.client.answers.get()
-        # self.__add_user_in_list(self.ui.contactsList, username,
-        #                         'Del', self.remove_contact,
-        #                         self.__get_user_avatar(username))
 
     def add_contact_by_name(self, username):
         self.ui.addContactTbx.clear()
-        if not self.client.add_contact(username):
+        future = self.client.add_contact(username)
+        if not future:
             return
 
-        # TODO temp
         try:
-            self.client.answers.get(timeout=2)
+            future.result(self.client.ANSWER_TIMEOUT)
         except Exception as e:
             self.client.logger.error(e)
         else:
@@ -250,8 +251,7 @@ class MainWindow(QMainWindow):
         sender = self.sender()
         widget = sender.parent()
         username = widget.username
-        self.client.rem_contact(username)
-        self.client.answers.get()
+        self.client.rem_contact(username).result(self.client.ANSWER_TIMEOUT)
         self.__rem_user_from_list(self.ui.contactsList, username)
 
     def start_chat(self):
@@ -280,48 +280,38 @@ class MainWindow(QMainWindow):
         self.client.accepted_chat(resp)
         self.load_chat()
 
-    def load_chat(self):
+    def load_chat(self, chat=None):
         """ Method the load chat messages on ui """
 
         self.ui.chatList.clear()
         self.set_chat_active(True)
-        self.client.get_chat_req(self.curr_chat_user)
-        chat = self.client.get_collection_response()
-        # chat = self.client.answers.get()
-        # chat = self.__get_collection_response()
+        chat = (chat or self.client.get_chat_req(self.curr_chat_user)) \
+            .result(self.client.ANSWER_TIMEOUT)
         if chat:
             for msg in chat:
                 self.parse_message(msg)
 
-    TIME_FMT = '%Y-%m-%d %H:%M:%S.%f'
-
     def recieve_message(self, msg):
         """ Method of handle of received message """
 
-        sender, msg, recipient = self.client.parse_recv_message(msg)
-        if (recipient == '@ALL' and self.curr_chat_user == '@ALL') or \
-                (recipient != '@ALL' and sender == self.curr_chat_user):
-            # TODO get from resp
-            time = datetime.now().strftime('%H:%M')
-            self.add_message_in_chat(self.OTHER_SIDE, sender, msg, time)
+        msg = self.client.parse_recv_message(msg)
+        if (msg.to.startswith('@') and msg.to == self.curr_chat_user) or \
+                (not msg.to.startswith('@') and msg.sender == self.curr_chat_user):
+            time = datetime.fromtimestamp(msg.time) if msg.time else datetime.now()
+            self.add_message_in_chat(self.OTHER_SIDE, msg.sender, msg.text,
+                                     time.strftime('%H:%M'))
         else:
             pass  # TODO add in cache
 
-    def parse_message(self, msg):
-        """ Method the parse chat messages gotten from server """
-        # TODO not UI logic
+    def parse_message(self, row):
+        """ Method shows chat row gotten from server """
 
-        sender, time, message, *_ = msg.split('__')
-        time = datetime.strptime(time, self.TIME_FMT).strftime('%H:%M')
+        time = datetime.fromtimestamp(row.time).strftime('%H:%M')
         side = self.SELF_SIDE \
-            if sender == self.client.username \
+            if row.sender == self.client.username \
             else self.OTHER_SIDE
-        if self.curr_chat_user != '@ALL':
-            message = self.client.get_encryptor(self.curr_chat_user)\
-                             .decrypt_msg(message).decode()
-        else:
-            message = b64decode(message).decode()
-        self.add_message_in_chat(side, sender, message, time)
+        message = self.client.decrypt_text(self.curr_chat_user, row.text)
+        self.add_message_in_chat(side, row.sender, message, time)
 
     def send_message(self):
         """ Method the send message in chat """
@@ -337,7 +327,7 @@ class MainWindow(QMainWindow):
     def add_message_in_chat(self, side, user, msg, time):
         """ Method the add message in chat """
 
-        if self.curr_chat_user != '@ALL' and \
+        if not self.curr_chat_user.startswith('@') and \
                 user not in [self.client.username, self.curr_chat_user]:
             return
         item = QListWidgetItem()
@@ -42,3 +42,11 @@ def transaction(func):
             session.commit()
             return res
     return wrapper
+
+
+def blocking(func):
+    """ Decorator marks request handler as blocking
+        Blocking handlers are run by pool of workers instead of network loop """
+
+    func.blocking = True
+    return func
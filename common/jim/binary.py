@@ -0,0 +1,149 @@
+""" Module of compact binary encoding of jim packages
+    Frame: header (payload length, flags) + payload
+    Payload: kind, time and tagged values of package fields,
+    bytes values are transferred as is (without base64) """
+
+import struct
+
+from jim.classes.request_body import BaseBody
+
+ENCODING = 'utf-8'
+
+FRAME_HEADER = struct.Struct('!IB')
+PACKAGE_HEADER = struct.Struct('!cd')
+
+REQUEST_KIND = b'q'
+RESPONSE_KIND = b'r'
+
+INT = struct.Struct('!cq')
+FLOAT = struct.Struct('!cd')
+SIZE = struct.Struct('!cI')
+
+NONE_TAG, TRUE_TAG, FALSE_TAG = b'N', b'T', b'F'
+INT_TAG, FLOAT_TAG, STR_TAG, BYTES_TAG = b'i', b'f', b's', b'b'
+LIST_TAG, DICT_TAG = b'l', b'd'
+NONE_CODE, TRUE_CODE, FALSE_CODE, INT_CODE, FLOAT_CODE, STR_CODE, BYTES_CODE, \
+    LIST_CODE, DICT_CODE = b'NTFifsbld'
+
+LENGTH = struct.Struct('!I')
+INT_VALUE = struct.Struct('!q').unpack_from
+FLOAT_VALUE = struct.Struct('!d').unpack_from
+MAX_DEPTH = 32
+TRUNCATED = 'truncated binary value'
+
+
+def pack_value(value, out):
+    """ Function appends tagged value to output bytearray
+        Exact types of values are checked first, they are the most frequent """
+
+    cls = type(value)
+    if cls is str:
+        data = value.encode(ENCODING)
+        out += SIZE.pack(STR_TAG, len(data))
+        out += data
+    elif cls is list or cls is tuple:
+        out += SIZE.pack(LIST_TAG, len(value))
+        for v in value:
+            if type(v) is str:
+                data = v.encode(ENCODING)
+                out += SIZE.pack(STR_TAG, len(data))
+                out += data
+            else:
+                pack_value(v, out)
+    elif cls is dict:
+        out += SIZE.pack(DICT_TAG, len(value))
+        for k, v in value.items():
+            pack_value(k, out)
+            pack_value(v, out)
+    elif value is None:
+        out += NONE_TAG
+    elif value is True:
+        out += TRUE_TAG
+    elif value is False:
+        out += FALSE_TAG
+    elif cls is int:
+        out += INT.pack(INT_TAG, value)
+    elif cls is float:
+        out += FLOAT.pack(FLOAT_TAG, value)
+    elif isinstance(value, str):
+        pack_value(str(value), out)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out += SIZE.pack(BYTES_TAG, len(value))
+        out += value
+    elif isinstance(value, int):
+        out += INT.pack(INT_TAG, value)
+    elif isinstance(value, float):
+        out += FLOAT.pack(FLOAT_TAG, value)
+    elif isinstance(value, (list, tuple)):
+        pack_value(list(value), out)
+    elif isinstance(value, dict):
+        pack_value(dict(value), out)
+    elif isinstance(value, BaseBody):
+        pack_value(value.get_dict(), out)
+    else:
+        pack_value(str(value), out)
+
+
+def unpack_value(buffer, offset, depth=0):
+    """ Function returns tagged value and offset after it,
+        raises ValueError if value is truncated or incorrect """
+
+    end = len(buffer)
+    if offset >= end:
+        raise ValueError(TRUNCATED)
+    tag = buffer[offset]
+    offset += 1
+    if tag == NONE_CODE:
+        return None, offset
+    if tag == TRUE_CODE:
+        return True, offset
+    if tag == FALSE_CODE:
+        return False, offset
+    if tag == INT_CODE or tag == FLOAT_CODE:
+        if offset + 8 > end:
+            raise ValueError(TRUNCATED)
+        unpack = INT_VALUE if tag == INT_CODE else FLOAT_VALUE
+        return unpack(buffer, offset)[0], offset + 8
+
+    if offset + LENGTH.size > end:
+        raise ValueError(TRUNCATED)
+    size = LENGTH.unpack_from(buffer, offset)[0]
+    offset += LENGTH.size
+    if tag == STR_CODE or tag == BYTES_CODE:
+        stop = offset + size
+        if stop > end:
+            raise ValueError(TRUNCATED)
+        if tag == STR_CODE:
+            return str(buffer[offset:stop], ENCODING), stop
+        return bytes(buffer[offset:stop]), stop
+    if tag != LIST_CODE and tag != DICT_CODE:
+        raise ValueError(f'Unknown value tag {tag}')
+    size_of = LENGTH.size
+
+    # every item takes one byte at least
+    if offset + size > end:
+        raise ValueError(TRUNCATED)
+    if depth >= MAX_DEPTH:
+        raise ValueError('Too deep binary value')
+    depth += 1
+    if tag == LIST_CODE:
+        result = []
+        append = result.append
+        for _ in range(size):
+            # strings of list are read inline, it is the most frequent item
+            if offset + 1 + size_of <= end and buffer[offset] == STR_CODE:
+                start = offset + 1 + size_of
+                stop = start + LENGTH.unpack_from(buffer, offset + 1)[0]
+                if stop > end:
+                    raise ValueError(TRUNCATED)
+                append(str(buffer[start:stop], ENCODING))
+                offset = stop
+            else:
+                value, offset = unpack_value(buffer, offset, depth)
+                append(value)
+        return result, offset
+    result = {}
+    for _ in range(size):
+        key, offset = unpack_value(buffer, offset, depth)
+        result[key], offset = unpack_value(buffer, offset, depth)
+    return result, offset
@@ -26,6 +26,7 @@ class Code:
 BASIC = Code(100, 'Basic message')
 ANSWER = Code(101, '')
 FILE_ANSWER = Code(102, '')
+COLLECTION = Code(103, '')
 AUTH = Code(110, 'pub key')
 
 # 2xx
@@ -35,6 +36,7 @@ DISCONNECTED = Code(202, 'User disconnected')
 LETTER = Code(203, '')
 START_CHAT = Code(204, '')
 ACCEPT_CHAT = Code(205, '')
+AVATAR_CHANGED = Code(206, 'Avatar changed')
 
 # 4xx
 INCORRECT_REQUEST = Code(400, 'Incorrect request / json')
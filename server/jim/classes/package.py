@@ -3,8 +3,7 @@
 from datetime import datetime as dt
 
 from jim.constants import REQUEST, RESPONSE, \
-                          ACTION, BODY, TIME, TYPE, CODE, MESSAGE
-from jim.codes import Code
+                          ACTION, BODY, TIME, TYPE, CODE, MESSAGE, ID
 from jim.classes.request_body import BaseBody
 
 
@@ -12,6 +11,7 @@ class BasePackage:
     """ Base class of request and response """
 
     __slots__ = (TIME, TYPE)
+    BODY_FIELDS = ()
 
     def __init__(self):
         super().__init__()
@@ -26,21 +26,26 @@ class BasePackage:
 class Request(BasePackage):
     """ Class of request package """
 
-    __slots__ = (ACTION, BODY, TIME, TYPE)
+    __slots__ = (ACTION, BODY, ID, TIME, TYPE)
+    BODY_FIELDS = (BODY,)
 
-    def __init__(self, action, body=''):
+    def __init__(self, action, body='', req_id=None):
         super().__init__()
         self.type = REQUEST
         self.action = action
         self.body = body
+        self.id = req_id
 
     @classmethod
     def from_dict(cls, json_obj):
         """ Returns instance of class by dictionary """
 
-        ins = cls(json_obj[ACTION], json_obj[BODY])
-        if TIME in json_obj:
-            ins.time = json_obj[TIME]
+        ins = cls.__new__(cls)
+        ins.type = REQUEST
+        ins.action = json_obj[ACTION]
+        ins.body = json_obj[BODY]
+        ins.id = json_obj.get(ID)
+        ins.time = json_obj[TIME] if TIME in json_obj else dt.timestamp(dt.now())
         return ins
 
     def get_dict(self):
@@ -70,9 +75,10 @@ class Request(BasePackage):
 class Response(BasePackage):
     """ Class of response package """
 
-    __slots__ = (CODE, MESSAGE, TIME, TYPE)
+    __slots__ = (CODE, MESSAGE, ID, TIME, TYPE)
+    BODY_FIELDS = (MESSAGE,)
 
-    def __init__(self, code, message=None):
+    def __init__(self, code, message=None, req_id=None):
         super().__init__()
         self.type = RESPONSE
         self.code = code.code
@@ -80,14 +86,18 @@ class Response(BasePackage):
             self.message = message
         else:
             self.message = code.message
+        self.id = req_id
 
     @classmethod
     def from_dict(cls, json_obj):
         """ Returns instance of class by dictionary """
 
-        ins = cls(Code(json_obj[CODE], json_obj[MESSAGE]))
-        if TIME in json_obj:
-            ins.time = json_obj[TIME]
+        ins = cls.__new__(cls)
+        ins.type = RESPONSE
+        ins.code = json_obj[CODE]
+        ins.message = json_obj[MESSAGE]
+        ins.id = json_obj.get(ID)
+        ins.time = json_obj[TIME] if TIME in json_obj else dt.timestamp(dt.now())
         return ins
 
     def __str__(self):
@@ -1,8 +1,29 @@
 """ Module of transport package body """
 
 import re
+from base64 import b64encode, b64decode
+from datetime import datetime
+from hashlib import md5
 
-from jim.constants import USERNAME, PASSWORD, SENDER, TO, TEXT, MESSAGE
+from jim.constants import USERNAME, PASSWORD, SENDER, TO, TEXT, MESSAGE, \
+                          FEATURES, ITEMS, LAST, TIME, ID, \
+                          OFFSET, DATA, SIZE, CHECKSUM
+
+
+def raw_bytes(value):
+    """ Function returns bytes of field received as raw bytes or base64 """
+
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return b64decode(value)
+
+
+def b64_text(value):
+    """ Function returns base64 text of field received as raw bytes or base64 """
+
+    if isinstance(value, (bytes, bytearray)):
+        return b64encode(value).decode()
+    return value
 
 
 class BaseBody:
@@ -39,26 +60,226 @@ class User(BaseBody):
         return self.username
 
 
+class Presence(BaseBody):
+    """ Class of presence data with features supported by client """
+
+    __slots__ = (USERNAME, FEATURES)
+
+    def __init__(self, username, features=()):
+        self.username = username
+        self.features = list(features)
+
+    @classmethod
+    def from_body(cls, body):
+        """ Returns instance of class by request body
+            Old clients send only username """
+
+        if isinstance(body, dict):
+            return cls(body[USERNAME], body.get(FEATURES, ()))
+        return cls(body)
+
+    def get_dict(self):
+        """ Override of base get_dict method """
+
+        return {USERNAME: self.username, FEATURES: self.features}
+
+    def __str__(self):
+        return self.username
+
+
+class Collection(BaseBody):
+    """ Class of collection answer, carries list of items in one frame """
+
+    __slots__ = (ITEMS, LAST)
+
+    ITEM_TYPES = (str, int, float, bool, list, dict, bytes)
+
+    def __init__(self, items, last=True):
+        self.items = [self.item(i) for i in items]
+        self.last = last
+
+    @classmethod
+    def item(cls, value):
+        """ Returns typed value of item """
+
+        if value is None or isinstance(value, cls.ITEM_TYPES):
+            return value
+        if isinstance(value, BaseBody):
+            return value.get_dict()
+        return str(value)
+
+    @classmethod
+    def chunks(cls, items, size):
+        """ Returns list of collections with size items at most """
+
+        if not items:
+            return [cls([])]
+        count = len(items)
+        return [cls(items[i:i + size], i + size >= count)
+                for i in range(0, count, size)]
+
+    @staticmethod
+    def is_collection(value):
+        """ Checks that value is dictionary of collection """
+
+        return isinstance(value, dict) and ITEMS in value
+
+    def get_dict(self):
+        """ Override of base get_dict method """
+
+        return {ITEMS: self.items, LAST: self.last}
+
+
+class ChatRow(BaseBody):
+    """ Class of row of chat history, time is integer epoch timestamp
+        Transferred as list of values in order of slots """
+
+    __slots__ = (ID, TIME, SENDER, TO, TEXT)
+
+    def __init__(self, row_id, time, sender, to, text):
+        self.id = row_id
+        self.time = time
+        self.sender = sender
+        self.to = to
+        self.text = text
+
+    @classmethod
+    def from_body(cls, body):
+        """ Returns instance of class by item of collection
+            Old servers send formatted string 'sender__time__text[__to]' """
+
+        if isinstance(body, str):
+            sender, time, text, *to = body.split('__')
+            time = int(datetime.fromisoformat(time).timestamp())
+            return cls(None, time, sender, to[0] if to else None, text)
+        return cls(*body)
+
+    def get_dict(self):
+        """ Override of base get_dict method """
+
+        return [self.id, self.time, self.sender, self.to, self.text]
+
+
+class FileChunk(BaseBody):
+    """ Class of chunk of file transfer, data is raw bytes from offset
+        Transferred as list of values in order of slots """
+
+    __slots__ = (OFFSET, DATA)
+
+    def __init__(self, offset, data):
+        self.offset = offset
+        self.data = data
+
+    @classmethod
+    def from_body(cls, body):
+        """ Returns instance of class by body, data can be base64 """
+
+        return cls(body[0], raw_bytes(body[1]))
+
+    @staticmethod
+    def is_chunk(value):
+        """ Checks that value is body of chunk """
+
+        return isinstance(value, list) and len(value) == 2
+
+    @property
+    def end(self):
+        return self.offset + len(self.data)
+
+    def get_dict(self):
+        """ Override of base get_dict method """
+
+        return [self.offset, self.data]
+
+
+class FileInfo(BaseBody):
+    """ Class of end of file transfer with size and md5 checksum of file """
+
+    __slots__ = (SIZE, CHECKSUM)
+
+    def __init__(self, size, checksum):
+        self.size = size
+        self.checksum = checksum
+
+    @classmethod
+    def of(cls, data):
+        """ Returns instance of class by content of file """
+
+        return cls(len(data), md5(data).hexdigest())
+
+    @classmethod
+    def from_body(cls, body):
+        return cls(body[SIZE], body[CHECKSUM])
+
+    @staticmethod
+    def is_info(value):
+        """ Checks that value is body of end of file transfer """
+
+        return isinstance(value, dict) and CHECKSUM in value
+
+    def check(self, data):
+        """ Checks that data is content of file """
+
+        return len(data) == self.size and md5(data).hexdigest() == self.checksum
+
+    def get_dict(self):
+        """ Override of base get_dict method """
+
+        return {SIZE: self.size, CHECKSUM: self.checksum}
+
+
+class AvatarHash(BaseBody):
+    """ Class of notification of changed avatar of user
+        Transferred as list [username, hash] """
+
+    __slots__ = (USERNAME, CHECKSUM)
+
+    def __init__(self, username, checksum):
+        self.username = username
+        self.checksum = checksum
+
+    @classmethod
+    def from_body(cls, body):
+        return cls(body[0], body[1])
+
+    def get_dict(self):
+        """ Override of base get_dict method """
+
+        return [self.username, self.checksum]
+
+
 class Msg(BaseBody):
-    """ Class of message """
+    """ Class of message, time and id are set by server """
 
-    __slots__ = (SENDER, TO, TEXT)
+    __slots__ = (SENDER, TO, TEXT, TIME, ID)
 
     PATTERN = r'@(?P<to>[\w\d]*)?(?P<message>.*)'
     RECV_PAT = rf'^(?P<{SENDER}>[\w\d]*) to @(?P<{TO}>[@\w\d]*): (?P<{TEXT}>(.|\n)*)'
 
-    def __init__(self, text, sender, to='ALL'):
+    def __init__(self, text, sender, to='ALL', time=None, msg_id=None):
         self.text = text
         self.sender = sender
         self.to = to
+        self.time = time
+        self.id = msg_id
 
     @classmethod
     def from_dict(cls, json_obj):
         """ Returns instance of class by dictionary """
 
-        ins = cls(json_obj[TEXT], json_obj[SENDER], json_obj[TO])
+        ins = cls(json_obj[TEXT], json_obj[SENDER], json_obj[TO],
+                  json_obj.get(TIME), json_obj.get(ID))
         return ins
 
+    @classmethod
+    def from_body(cls, body):
+        """ Returns instance of class by response body
+            Old servers send formatted string """
+
+        if isinstance(body, dict):
+            return cls.from_dict(body)
+        return cls.from_formated(body)
+
     @classmethod
     def from_formated(cls, formated_text):
         """ Returns instance of class by formatted string """
@@ -69,6 +290,12 @@ class Msg(BaseBody):
         msg = match.group(TEXT)
         return cls(msg, sender, to)
 
+    def get_dict(self):
+        """ Override of base get_dict method, text can be raw bytes """
+
+        return {SENDER: str(self.sender), TO: str(self.to), TEXT: self.text,
+                TIME: self.time, ID: self.id}
+
     def parse_msg(self):
         """ Method to parse text of message """
 
@@ -84,4 +311,4 @@ class Msg(BaseBody):
         self.text = msg.strip()
 
     def __str__(self):
-        return f'{self.sender} to @{self.to}: {self.text}'
+        return f'{self.sender} to @{self.to}: {b64_text(self.text)}'
@@ -1,21 +1,107 @@
 """ Module of transport functions jim protocol """
 
-from base64 import b64encode, b64decode
-import json
-from jim.classes.package import *
+import zlib
+from base64 import b64encode
+from binascii import a2b_base64
+from threading import Lock
+from jim.binary import FRAME_HEADER
+from jim.codecs import TEXT_CODEC
 
 ENCODING = 'utf-8'
 BUFFER = 1024
+FRAME_BUFFER = 64 * 1024
+MIN_RECV = 4 * 1024
+LEN_SEPARATOR = b'.'
+MAX_LEN_DIGITS = 10
+MAX_FRAME = 16 * 1024 * 1024
+MAX_IOV = 64
+COMPRESS_THRESHOLD = 1024
+COMPRESS_LEVEL = 6
+FLAG_COMPRESSED = 0x01
 
 
-def send_data(socket, data):
+def encode_package(data, codec=TEXT_CODEC):
+    """ Function returns payload of frame by package """
+
+    return b64encode(codec.encode(data))
+
+
+def decode_package(payload, codec=TEXT_CODEC):
+    """ Function returns package by payload of frame """
+
+    data = a2b_base64(payload)
+    if len(data) == 0:
+        raise ValueError
+    return codec.decode(data)
+
+
+def frame_payload(payload, codec=TEXT_CODEC):
+    """ Function returns buffers of frame by package encoded by codec """
+
+    if codec.binary:
+        return [FRAME_HEADER.pack(len(payload), 0), payload]
+    package = b64encode(payload)
+    return [f'{len(package)}.'.encode(), package]
+
+
+def frame_package(data, codec=TEXT_CODEC):
+    """ Function returns buffers of frame (header and payload) by package """
+
+    return frame_payload(codec.encode(data), codec)
+
+
+def send_buffers(socket, buffers):
+    """ Function writes buffers to socket by one syscall if it is possible """
+
+    if not hasattr(socket, 'sendmsg') or len(buffers) > MAX_IOV:
+        socket.sendall(b''.join(buffers))
+        return
+
+    views = [memoryview(b) for b in buffers]
+    while views:
+        sent = socket.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        if sent:
+            views[0] = views[0][sent:]
+
+
+def send_data(socket, data, encoder=None):
     """ Function to send data """
 
-    data_dict = data.get_dict()
-    js_str = json.dumps(data_dict)
-    package = b64encode(js_str.encode(ENCODING))
-    socket.send(f'{len(package)}.'.encode())
-    socket.send(package)
+    encoder = encoder or TEXT_ENCODER
+    with encoder.lock:
+        send_buffers(socket, encoder.frame(data))
+
+
+def send_many(socket, packages, encoder=None):
+    """ Function to send several packages by one write """
+
+    encoder = encoder or TEXT_ENCODER
+    with encoder.lock:
+        socket.sendall(encoder.frame_many(packages))
+
+
+def check_frame_size(size):
+    """ Function raises ValueError if declared size of frame is incorrect """
+
+    if not 0 <= size <= MAX_FRAME:
+        raise ValueError(f'Incorrect frame size {size}')
+    return size
+
+
+def recv_exactly(socket, size):
+    """ Function receives exactly size bytes from socket """
+
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = socket.recv_into(view[received:])
+        if not count:
+            raise ConnectionResetError('Connection closed')
+        received += count
+    return data
 
 
 def get_data(socket):
@@ -23,18 +109,201 @@ def get_data(socket):
 
     data = socket.recv(1)
     pack_len = b''
-    while data != b'.':
+    while data != LEN_SEPARATOR:
+        if not data or len(pack_len) > MAX_LEN_DIGITS:
+            raise ValueError
         pack_len += data
         data = socket.recv(1)
 
-    data = b64decode(socket.recv(int(pack_len)))
-    # data = b64decode(socket.recv(BUFFER))
-    if not isinstance(data, bytes) or len(data) == 0:
-        raise ValueError
-    js_data = json.loads(data.decode(ENCODING))
+    return decode_package(recv_exactly(socket, check_frame_size(int(pack_len))))
+
+
+class FrameEncoder:
+    """ Class of encoder of jim frames for one connection
+        Uses base64 json frames or binary frames if it is negotiated,
+        compressed connection uses binary frame headers with payload of any codec """
+
+    __slots__ = ('codec', 'compressor', 'threshold', 'lock')
+
+    def __init__(self, codec=TEXT_CODEC):
+        self.codec = codec
+        self.compressor = None
+        self.threshold = COMPRESS_THRESHOLD
+        self.lock = Lock()
+
+    @property
+    def shared(self):
+        """ Frames of encoder without stream state can be shared """
+
+        return self.compressor is None
+
+    def enable_compression(self, threshold=COMPRESS_THRESHOLD,
+                           level=COMPRESS_LEVEL):
+        """ Method starts zlib stream for frames above threshold """
+
+        self.compressor = zlib.compressobj(level)
+        self.threshold = threshold
+
+    def frame(self, package):
+        """ Method returns buffers of frame by package """
+
+        return self.frame_payload(self.codec.encode(package))
+
+    def frame_payload(self, payload):
+        """ Method returns buffers of frame by package encoded by codec of encoder,
+            payload can be shared by encoders with the same codec """
+
+        if self.compressor is None:
+            return frame_payload(payload, self.codec)
+        if len(payload) < self.threshold:
+            return [FRAME_HEADER.pack(len(payload), 0), payload]
+        data = self.compressor.compress(payload) + \
+            self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return [FRAME_HEADER.pack(len(data), FLAG_COMPRESSED), data]
+
+    def frame_many(self, packages):
+        """ Method returns one buffer with frames of all packages """
+
+        buffers = []
+        for package in packages:
+            buffers.extend(self.frame(package))
+        return b''.join(buffers)
+
+
+TEXT_ENCODER = FrameEncoder()
+
+
+class FrameDecoder:
+    """ Class of buffered decoder of jim frames for one connection
+        Reads socket by large chunks and keeps partial frames,
+        frames above MAX_FRAME are rejected before they are buffered """
+
+    __slots__ = ('socket', 'buffer', 'start', 'end', 'codec', 'decompressor')
+
+    def __init__(self, socket=None, size=FRAME_BUFFER, codec=TEXT_CODEC):
+        self.socket = socket
+        self.buffer = bytearray(size)
+        self.start = 0
+        self.end = 0
+        self.codec = codec
+        self.decompressor = None
+
+    def enable_compression(self):
+        """ Method starts zlib stream for compressed frames,
+            frames of any codec have binary headers since then """
+
+        self.decompressor = zlib.decompressobj()
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        """ Blocking iteration over received packages """
+
+        while True:
+            yield from self.packages()
+            self.fill()
+
+    def fill(self):
+        """ Method reads available data from socket into buffer """
+
+        self.__reserve(MIN_RECV)
+        with memoryview(self.buffer) as view:
+            count = self.socket.recv_into(view[self.end:])
+        if not count:
+            raise ConnectionResetError('Connection closed')
+        self.end += count
+        return count
+
+    def feed(self, data):
+        """ Method appends data received outside of decoder """
+
+        size = len(data)
+        self.__reserve(size)
+        self.buffer[self.end:self.end + size] = data
+        self.end += size
+
+    def get(self):
+        """ Method returns next package, blocks until it is received """
+
+        return next(iter(self))
+
+    def packages(self):
+        """ Generator of complete packages contained in buffer """
+
+        while True:
+            package = self.__next_package()
+            if package is None:
+                return
+            yield package
+
+    def __next_package(self):
+        if self.codec.binary or self.decompressor is not None:
+            return self.__next_binary_package()
+
+        buffer = self.buffer
+        start, end = self.start, self.end
+        sep = buffer.find(LEN_SEPARATOR, start, end)
+        if sep < 0:
+            if end - start > MAX_LEN_DIGITS:
+                raise ValueError('Incorrect frame header')
+            return None
+        if sep - start > MAX_LEN_DIGITS:
+            raise ValueError('Incorrect frame header')
+
+        frame_end = sep + 1 + check_frame_size(int(buffer[start:sep]))
+        if frame_end > end:
+            return None
+        with memoryview(buffer) as view:
+            payload = view[sep + 1:frame_end]
+            self.start = frame_end
+            try:
+                return decode_package(payload, self.codec)
+            finally:
+                payload.release()
+
+    def __next_binary_package(self):
+        start, end = self.start, self.end
+        if end - start < FRAME_HEADER.size:
+            return None
+        size, flags = FRAME_HEADER.unpack_from(self.buffer, start)
+        check_frame_size(size)
+        payload_start = start + FRAME_HEADER.size
+        frame_end = payload_start + size
+        if frame_end > end:
+            return None
+        with memoryview(self.buffer) as view:
+            payload = view[payload_start:frame_end]
+            self.start = frame_end
+            try:
+                if flags & FLAG_COMPRESSED:
+                    return self.codec.decode(self.__decompress(payload))
+                return self.codec.decode(payload)
+            finally:
+                payload.release()
+
+    def __decompress(self, payload):
+        """ Method returns decompressed payload, output is limited by MAX_FRAME """
+
+        if self.decompressor is None:
+            raise ValueError('Compression is not negotiated')
+        data = self.decompressor.decompress(payload, MAX_FRAME)
+        if self.decompressor.unconsumed_tail:
+            raise ValueError('Decompressed frame is too large')
+        return data
+
+    def __reserve(self, size):
+        """ Method provides free space at the end of buffer """
+
+        if self.start == self.end:
+            self.start = self.end = 0
+        if len(self.buffer) - self.end >= size:
+            return
 
-    if js_data[TYPE] == REQUEST:
-        return Request.from_dict(js_data)
-    if js_data[TYPE] == RESPONSE:
-        return Response.from_dict(js_data)
-    raise ValueError
+        length = self.end - self.start
+        if self.start:
+            self.buffer[:length] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, length
+        free = len(self.buffer) - length
+        if free < size:
+            self.buffer.extend(bytes(max(size - free, len(self.buffer))))
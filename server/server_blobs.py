@@ -0,0 +1,66 @@
+""" Module implements content-addressed store of files (avatars)
+    File is kept once by md5 of content, reads are memory-mapped """
+
+import mmap
+import os
+from hashlib import md5
+from string import hexdigits
+from tempfile import mkstemp
+
+BLOBS_DIR = 'blobs'
+
+
+class BlobStore:
+    """ Class of store of files in directory by hash of content
+        File of hash 'abcd...' is kept as root/ab/abcd... """
+
+    __slots__ = ('root',)
+
+    def __init__(self, root=BLOBS_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def hash(data):
+        return md5(data).hexdigest()
+
+    def path(self, key):
+        """ Method returns path of file by hash """
+
+        if not key or not all(c in hexdigits for c in key):
+            raise ValueError(f'Incorrect hash of blob: {key}')
+        return os.path.join(self.root, key[:2], key)
+
+    def __contains__(self, key):
+        return os.path.isfile(self.path(key))
+
+    def put(self, data):
+        """ Method saves data if it isn't stored yet, returns hash of data """
+
+        key = self.hash(data)
+        path = self.path(key)
+        if os.path.isfile(path):
+            return key
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = mkstemp(dir=folder)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return key
+
+    def get(self, key):
+        """ Method returns read-only memory map of file, None if not found
+            Pages of file are read by OS when they are accessed """
+
+        try:
+            with open(self.path(key), 'rb') as file:
+                if not os.fstat(file.fileno()).st_size:
+                    return b''
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
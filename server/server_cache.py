@@ -0,0 +1,97 @@
+""" Module implements cache of avatars of users in front of database
+    Cache is limited by size of avatars in bytes, least recently used
+    avatars are removed first """
+
+from collections import OrderedDict
+from threading import Lock
+
+CACHE_SIZE = 32 * 1024 * 1024
+ENTRY_SIZE = 128
+
+
+class AvatarCache:
+    """ Class of LRU cache of avatars by username
+        Entry is tuple (hash, bytes), (None, None) if user hasn't avatar,
+        bytes is None if avatar is kept in blob store (it is read by mmap)
+        Entry loaded during invalidation isn't cached, it can be stale """
+
+    __slots__ = ('entries', 'size', 'max_size', 'hits', 'misses', 'version', 'lock')
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def __entry_size(entry):
+        return ENTRY_SIZE + len(entry[1] or b'')
+
+    def load(self, username, loader):
+        """ Method returns entry of user, on miss it is loaded by
+            loader(username), loader returns None if user not found """
+
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry is not None:
+                self.entries.move_to_end(username)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            version = self.version
+        entry = loader(username)
+        if entry is not None:
+            self.put(username, entry, version)
+        return entry
+
+    def put(self, username, entry, version=None):
+        """ Method adds entry, removes old entries over size limit
+            Entry isn't added if cache is invalidated after version """
+
+        size = self.__entry_size(entry)
+        if size > self.max_size:
+            return
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            old = self.entries.pop(username, None)
+            if old is not None:
+                self.size -= self.__entry_size(old)
+            self.entries[username] = entry
+            self.size += size
+            while self.size > self.max_size:
+                _, old = self.entries.popitem(last=False)
+                self.size -= self.__entry_size(old)
+
+    def invalidate(self, username):
+        """ Method removes entry of user """
+
+        with self.lock:
+            self.version += 1
+            old = self.entries.pop(username, None)
+            if old is not None:
+                self.size -= self.__entry_size(old)
+
+    def get_stats(self):
+        """ Method returns statistics of cache """
+
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / requests if requests else 0.0,
+            }
+
+    def __str__(self):
+        stats = self.get_stats()
+        return f'Avatar cache: {stats["entries"]} avatars, {stats["bytes"]} bytes, ' \
+               f'{stats["hits"]} hits, {stats["misses"]} misses'
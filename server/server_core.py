@@ -1,24 +1,33 @@
 """ Module implements server logic of chat application """
 
 import logging
-from base64 import b64decode, b64encode
-from socket import socket, AF_INET, SOCK_STREAM
+from datetime import datetime
+from socket import socket, socketpair, AF_INET, SOCK_STREAM, SOMAXCONN
 from select import select
-from time import sleep
-from threading import Thread
+from threading import Thread, current_thread
+from time import monotonic
 
 from logs import server_log_config as log_config
-from decorators import try_except_wrapper
+from decorators import try_except_wrapper, blocking
+from key_pool import KeyPool
 from descriptors import Port
 from jim.classes.package import Response
-from jim.codes import ANSWER, AUTH, START_CHAT, ACCEPT_CHAT, FILE_ANSWER, \
-                      OK, CONNECTED, DISCONNECTED, LETTER, \
-                      CONFLICT, UNAUTHORIZED, SERVER_ERROR, INCORRECT_REQUEST
-from jim.constants import RequestAction
-from jim.classes.request_body import Msg
-from jim.functions import send_data, get_data
-from server_crypt import gen_keys, decrypt_password, get_hash_password
+from jim.codes import ANSWER, COLLECTION, AUTH, START_CHAT, ACCEPT_CHAT, FILE_ANSWER, \
+                      OK, CONNECTED, DISCONNECTED, LETTER, AVATAR_CHANGED, \
+                      CONFLICT, UNAUTHORIZED, SERVER_ERROR, SERVER_UNAVAILABLE, \
+                      INCORRECT_REQUEST
+from jim.constants import RequestAction, Feature, KEY, FEATURES, CHUNK
+from jim.classes.request_body import Msg, Presence, Collection, \
+                                     FileChunk, FileInfo, AvatarHash, raw_bytes, b64_text
+from jim.codecs import get_codec, BINARY
+from jim.functions import send_data, FrameDecoder, FrameEncoder
+from server_crypt import gen_keys, decrypt_password, PasswordHasher
 from server_db import ServerStorage
+from server_fanout import FanOut
+from server_outbound import OutboundBuffer, MAX_PENDING
+from server_session import Session, SessionRegistry, RoomIndex
+from server_upload import UploadSpool, MAX_UPLOAD
+from server_workers import WorkerPool
 
 
 class ServerThread(Thread):
@@ -40,25 +49,45 @@ class ServerThread(Thread):
 class Server:
     """ Class implement receive, handle, response to client request """
 
-    __slots__ = ('bind_addr', '_port', 'logger', 'socket', 'blacklist',
-                 'clients', 'users', 'client_keys', 'listener',
-                 'storage', 'commands', 'request_handlers', 'images')
+    __slots__ = ('bind_addr', '_port', 'logger', 'socket', 'wakeup', 'blacklist',
+                 'sessions', 'rooms', 'fanout', 'workers', 'hasher', 'key_pool',
+                 'listener', 'storage', 'commands', 'legacy_commands', 'max_upload',
+                 'request_handlers', 'requests')
 
     TCP = (AF_INET, SOCK_STREAM)
     TIMEOUT = 5
+    THREAD_ENGINE = 'thread'
+    ASYNC_ENGINE = 'async'
+    ENGINES = (THREAD_ENGINE, ASYNC_ENGINE)
     SPAM = ['cheat']
+    ALL_ROOM = 'ALL'
+    FEATURES = (Feature.BINARY, Feature.ZLIB, Feature.COLLECTIONS,
+                Feature.REQUEST_IDS, Feature.MESSAGES, Feature.CHAT_ROWS,
+                Feature.FILE_STREAM, Feature.AVATAR_CHECKS)
+    COLLECTION_CHUNK = 500
+    FILE_CHUNK = 64 * 1024
+    FILE_WINDOW = 4
+    LEGACY_FILE_CHUNK = 512
+    KEY_POOL_SIZE = 8
+    STATS_INTERVAL = 60
 
     port = Port('_port')
 
-    def __init__(self, bind_addr, port):
+    def __init__(self, bind_addr, port, key_pool_size=KEY_POOL_SIZE,
+                 max_upload=MAX_UPLOAD):
         self.logger = logging.getLogger(log_config.LOGGER_NAME)
         self.bind_addr = bind_addr
         self.port = port
-        self.clients = []
+        self.sessions = SessionRegistry()
+        self.rooms = RoomIndex()
+        self.fanout = FanOut(self.__write, self.__client_disconnect, self.logger)
+        self.workers = WorkerPool(self.logger)
+        self.key_pool = KeyPool(gen_keys, key_pool_size)
+        self.hasher = PasswordHasher()
+        self.max_upload = max_upload
+        self.requests = 0
+        self.wakeup = None
         self.blacklist = []
-        self.client_keys = {}
-        self.users = {}
-        self.images = {}
         self.storage = None
         # self.storage = ServerStorage()
         # self.__init_commands()
@@ -79,8 +108,15 @@ class Server:
             'add_contact': self.storage.add_contact,
             'rem_contact': self.storage.remove_contact,
             'get_contacts': self.storage.get_contacts,
+            'get_chat': self.storage.get_chat_rows,
+            'check_avatar': self.storage.check_avatar_hash,
+            'check_avatars': self.storage.check_avatar_hashes,
+            'join_room': self.__join_room,
+            'leave_room': self.__leave_room,
+            'get_stats': lambda *args: self.get_stats(),
+        }
+        self.legacy_commands = {
             'get_chat': self.storage.get_chat_str,
-            'check_avatar': self.storage.check_avatar_hash
         }
 
     def __init_req_handlers(self):
@@ -89,7 +125,7 @@ class Server:
         self.request_handlers = {
             RequestAction.PRESENCE: self.__req_presence_handler,
             RequestAction.AUTH: self.__req_auth_handler,
-            RequestAction.QUIT: lambda r, c, *a: self.__client_disconnect(c),
+            RequestAction.QUIT: lambda r, s: self.__client_disconnect(s),
             RequestAction.START_CHAT: self.__req_start_chat_handler,
             RequestAction.ACCEPT_CHAT: self.__req_accept_chat_handler,
             RequestAction.MESSAGE: self.__req_message_handler,
@@ -99,20 +135,32 @@ class Server:
             RequestAction.GET_IMAGE: self.__req_send_image_handler,
         }
 
-    def start(self, request_count=5):
-        """ Method the start configuration server """
+    def start(self, request_count=SOMAXCONN, engine=THREAD_ENGINE):
+        """ Method the start configuration server
+            Engine 'thread' - select loop in thread, 'async' - asyncio loop """
 
         if not self.storage:
             self.set_db_storage()
+        self.key_pool.start()
+        self.hasher.start()
 
-        self.socket = socket(*self.TCP)
-        self.socket.settimeout(0.5)
-        self.socket.bind((self.bind_addr, self.port))
         start_msg = f'Config server port - {self.port}| ' \
-                    f'Bind address - {self.bind_addr}'
+                    f'Bind address - {self.bind_addr}| ' \
+                    f'Engine - {engine}'
         self.logger.info(start_msg)
 
+        if engine == self.ASYNC_ENGINE:
+            from server_socket_async import ServerAsync
+            self.listener = ServerAsync(self)
+            self.listener.start_background(request_count)
+            return
+
+        self.socket = socket(*self.TCP)
+        self.socket.bind((self.bind_addr, self.port))
         self.socket.listen(request_count)
+        self.wakeup = socketpair()
+        for sock in self.wakeup:
+            sock.setblocking(False)
         self.listener = ServerThread(self.__listen, self.logger)
         self.listener.start()
 
@@ -120,253 +168,555 @@ class Server:
         """ Method the listener client connections """
 
         self.logger.info('Start listen')
+        listener, wakeup = self.socket.fileno(), self.wakeup[0]
+        stats_time = monotonic() + self.STATS_INTERVAL
         while True:
+            if monotonic() >= stats_time:
+                stats_time = monotonic() + self.STATS_INTERVAL
+                self.log_stats()
+            readers = [listener, wakeup.fileno()]
+            writers = []
+            for session in self.sessions:
+                if not session.outbound.paused:
+                    readers.append(session.fd)
+                if session.outbound.size:
+                    writers.append(session.fd)
             try:
-                client, addr = self.socket.accept()
+                i_fds, o_fds, _ = select(readers, writers, [], self.TIMEOUT)
             except OSError:
-                pass
-            except Exception as ex:
-                self.logger.error(ex)
-            else:
-                if addr in self.blacklist:
-                    self.logger.warning(f'{addr} in blacklist')
-                else:
-                    self.logger.info(f'Connection from {addr}')
-                    self.clients.append(client)
-
-            i_clients, o_clients = [], []
-            try:
-                i_clients, o_clients, ex = select(self.clients, self.clients,
-                                                  [], self.TIMEOUT)
-            except OSError:
-                pass
+                continue
             except Exception as exc:
                 self.logger.error(exc)
+                continue
+
+            for fd in o_fds:
+                self.__flush(self.sessions.get_fd(fd))
+            for fd in i_fds:
+                if fd == listener:
+                    self.__accept()
+                elif fd == wakeup.fileno():
+                    wakeup.recv(1024)
+                else:
+                    self.__receive(self.sessions.get_fd(fd))
 
-            requests = self.__get_requests(i_clients)
-            if requests:
-                self.__send_responses(requests, o_clients)
+    def get_stats(self):
+        """ Method returns statistics of components of server by name """
+
+        stats = {
+            'server': {'sessions': len(self.sessions), 'requests': self.requests},
+            'fanout': self.fanout.get_stats(),
+            'hasher': self.hasher.get_stats(),
+            'key_pool': self.key_pool.get_stats(),
+        }
+        avatars = getattr(self.storage, 'avatars', None)
+        if avatars is not None:
+            stats['avatars'] = avatars.get_stats()
+        return stats
 
     @try_except_wrapper
-    def __get_requests(self, i_clients):
-        """ Method the handler of client requests """
+    def log_stats(self):
+        """ Method logs statistics of server, it is called by network loop """
 
-        requests = {}
-        for client in i_clients:
-            try:
-                request = get_data(client)
-                requests[client] = request
-
-                if request.action == RequestAction.PRESENCE:
-                    if request.body in self.users:
-                        requests.pop(client)
-                        send_data(client, Response(CONFLICT))
-                        self.clients.remove(client)
-                    else:
-                        self.users[request.body] = client
-                elif request.action == RequestAction.QUIT:
-                    self.__client_disconnect(client)
-            except (ConnectionError, ValueError):
-                self.__client_disconnect(client)
-            except Exception as e:
-                raise e
-        return requests
+        for name, stats in self.get_stats().items():
+            values = ', '.join(f'{k} {v:.3f}' if isinstance(v, float) else f'{k} {v}'
+                               for k, v in stats.items())
+            self.logger.info(f'Stats of {name}: {values}')
 
     @try_except_wrapper
-    def __send_responses(self, requests, o_clients):
-        """ Method the sender of responses to clients """
-
-        for client, i_req in requests.items():
-            other_clients = [c for c in o_clients if c != client]
-            self.logger.info(client)
-            self.logger.info(i_req)
-            action = i_req.action
-            if action in self.request_handlers:
-                self.request_handlers[action](i_req, client, other_clients)
-            else:
-                self.__send_to_client(client, Response(INCORRECT_REQUEST))
-                self.logger.error(f'Incorrect request:\n {i_req}')
+    def __accept(self):
+        client, addr = self.socket.accept()
+        client.setblocking(False)
+        if not self.connect(client, addr):
+            client.close()
+
+    def __receive(self, session):
+        """ Method reads and handles requests of client """
+
+        if session is None:
+            return
+        try:
+            session.decoder.fill()
+            for request in session.decoder.packages():
+                self.handle(session.client, request)
+                if session not in self.sessions:
+                    break
+        except BlockingIOError:
+            pass
+        except (ConnectionError, ValueError):
+            self.__client_disconnect(session)
+        except Exception as exc:
+            # malformed frame must not stop listener of other clients
+            self.logger.error(f'Incorrect frame from {session.addr}: {exc!r}')
+            self.__client_disconnect(session)
+
+    def __flush(self, session):
+        """ Method sends pending data of client """
+
+        if session is None:
+            return
+        try:
+            session.outbound.flush()
+        except ConnectionError:
+            self.__client_disconnect(session)
+
+    def connect(self, client, addr, decoder=None, outbound=None):
+        """ Method registers connection of client, returns False if it is rejected
+            Client is socket or object with the same interface,
+            outbound is object with write(buffers) returns size of pending data """
+
+        if addr in self.blacklist:
+            self.logger.warning(f'{addr} in blacklist')
+            return False
+        self.logger.info(f'Connection from {addr}')
+        session = Session(client, addr,
+                          FrameDecoder(client) if decoder is None else decoder,
+                          FrameEncoder(),
+                          OutboundBuffer(client) if outbound is None else outbound)
+        self.sessions.add(session)
+        return True
 
     @try_except_wrapper
-    def __send_to_client(self, client, resp):
+    def handle(self, client, i_req):
+        """ Method the handler of client request """
+
+        session = self.sessions.get(client)
+        if session is None:
+            return
+        self.logger.info(session)
+        self.logger.info(i_req)
+        session.stats['requests'] += 1
+        self.requests += 1
+        if i_req.action == RequestAction.PRESENCE:
+            username = Presence.from_body(i_req.body).username
+            if not self.sessions.bind_user(session, username):
+                send_data(client, Response(CONFLICT))
+                self.__drop(session)
+                return
+
+        action = i_req.action
+        if action not in self.request_handlers:
+            self.__reply(session, i_req, Response(INCORRECT_REQUEST))
+            self.logger.error(f'Incorrect request:\n {i_req}')
+            return
+
+        handler = self.request_handlers[action]
+        if getattr(handler, 'blocking', False) or self.workers.busy(session):
+            if not self.workers.submit(session, self.__run_handler,
+                                       handler, i_req, session):
+                self.logger.warning('Workers are overloaded')
+                self.__reply(session, i_req, Response(SERVER_UNAVAILABLE))
+        else:
+            handler(i_req, session)
+
+    def __run_handler(self, handler, i_req, session):
+        """ Method runs handler in worker if client is still connected """
+
+        if session in self.sessions:
+            return handler(i_req, session)
+
+    def disconnect(self, client):
+        """ Method unregisters connection of client """
+
+        session = self.sessions.get(client)
+        if session is not None:
+            self.__client_disconnect(session)
+
+    def __write(self, session, buffers):
+        """ Method writes frames to outbound buffer of client under lock of encoder,
+            returns False if client must be dropped (it doesn't read data) """
+
+        if session not in self.sessions:
+            return True
         try:
-            self.logger.debug(resp)
-            send_data(client, resp)
-            sleep(0.1)
+            pending = session.outbound.write(buffers)
         except ConnectionError:
-            self.__client_disconnect(client)
-        except Exception as e:
-            raise e
+            return False
+        if pending > MAX_PENDING:
+            self.logger.warning(f'Slow client dropped: {session.addr}')
+            return False
+        if pending and self.wakeup and current_thread() is not self.listener:
+            try:
+                self.wakeup[1].send(b'\0')
+            except BlockingIOError:
+                pass
+        return True
+
+    @try_except_wrapper
+    def __send_to_client(self, session, resp):
+        self.logger.debug(resp)
+        encoder = session.encoder
+        with encoder.lock:
+            if isinstance(resp, list):
+                buffers = [encoder.frame_many(resp)]
+            else:
+                buffers = encoder.frame(resp)
+            written = self.__write(session, buffers)
+        # disconnect notifies other clients, it takes locks of their encoders
+        if not written:
+            self.__client_disconnect(session)
+
+    def __reply(self, session, i_req, resp):
+        """ Method sends response(s) with id of request """
 
-    def __send_to_all(self, clients, resp):
-        for cl in clients:
-            self.__send_to_client(cl, resp)
+        for r in resp if isinstance(resp, list) else (resp,):
+            r.id = i_req.id
+        self.__send_to_client(session, resp)
 
     @try_except_wrapper
-    def __client_disconnect(self, client):
-        self.clients.remove(client)
-        user = next(iter([u for u, c in self.users.items() if c == client]), None)
-        if not user:
-            self.blacklist.append(client.getpeername()[0])
+    def __send_to_all(self, sessions, resp):
+        self.logger.debug(resp)
+        self.fanout.send(sessions, resp)
+
+    def __msg_response(self, session, code, msg):
+        """ Method returns response with message in format of client """
+
+        if Feature.MESSAGES in session.features:
+            return Response(code, msg)
+        return Response(code, str(msg))
+
+    def __send_msg_to_all(self, sessions, code, msg):
+        """ Method sends message to clients, structured or formatted """
+
+        structured, formatted = [], []
+        for session in sessions:
+            if Feature.MESSAGES in session.features:
+                structured.append(session)
+            else:
+                formatted.append(session)
+        if structured:
+            self.__send_to_all(structured, Response(code, msg))
+        if formatted:
+            self.__send_to_all(formatted, Response(code, str(msg)))
+
+    def __drop(self, session):
+        """ Method removes connection of client without notifications,
+            returns False if it is already removed """
+
+        if not self.sessions.remove(session):
+            return False
+        self.rooms.leave_all(session)
+        self.__close_upload(session)
+        session.client.close()
+        if session.outbound is not session.client:
+            # worker waiting for outbound buffer is woken up
+            session.outbound.close()
+        return True
+
+    @try_except_wrapper
+    def __client_disconnect(self, session):
+        if not self.__drop(session):
+            return
+        if not session.username:
+            self.blacklist.append(session.addr[0])
             return
-        self.users.pop(user)
-        self.storage.logout_user(user)
-        disconnection_response = Response(DISCONNECTED, user)
-        self.logger.debug(disconnection_response)
-        for cl in self.clients:
-            send_data(cl, disconnection_response)
-
-    def __execute_command(self, command, *args):
-        if command in self.commands:
+        if not session.authorized:
+            return
+        # logout commits to db, it is run after queued requests of client
+        if not self.workers.submit(session, self.__logout, session):
+            self.logger.warning('Workers are overloaded')
+            self.__logout(session)
+
+    @try_except_wrapper
+    def __logout(self, session):
+        self.storage.logout_user(session.username)
+        self.__send_to_all(self.sessions.others(session),
+                           Response(DISCONNECTED, session.username))
+
+    def __execute_command(self, session, command, *args):
+        if command in self.legacy_commands and \
+                Feature.CHAT_ROWS not in session.features:
+            answer = self.legacy_commands[command](*args)
+        elif command in self.commands:
             answer = self.commands[command](*args)
-            if answer is False:
-                return Response(SERVER_ERROR, 'Command error')
-            elif isinstance(answer, list):
-                answer = [Response(ANSWER, str(a)) for a in answer]
-                answer.append(Response(ANSWER, None))
-                return answer
-                # answer = [str(a) for a in answer]
-                # return Response(ANSWER, answer)
-            elif answer is None:
-                return Response(ANSWER, 'Done')
-            return Response(ANSWER, answer)
         else:
             return Response(INCORRECT_REQUEST, 'Command not found')
 
+        if answer is False:
+            return Response(SERVER_ERROR, 'Command error')
+        elif isinstance(answer, list) and \
+                Feature.COLLECTIONS in session.features:
+            return [Response(COLLECTION, c) for c in
+                    Collection.chunks(answer, self.COLLECTION_CHUNK)]
+        elif isinstance(answer, list):
+            answer = [Response(ANSWER, str(a)) for a in answer]
+            answer.append(Response(ANSWER, None))
+            return answer
+        elif answer is None:
+            return Response(ANSWER, 'Done')
+        return Response(ANSWER, answer)
+
+    def __join_room(self, user, room):
+        """ Method adds user in members of room, room ALL includes all users """
+
+        session = self.sessions.get_user(user)
+        if session is None or self.rooms.room_name(room) == self.ALL_ROOM:
+            return False
+        self.rooms.join(session, room)
+
+    def __leave_room(self, user, room):
+        """ Method removes user from members of room """
+
+        session = self.sessions.get_user(user)
+        if session is None or not self.rooms.leave(session, room):
+            return False
+
     # region Request handlers
 
+    @blocking
     @try_except_wrapper
-    def __req_presence_handler(self, i_req, client, *args):
+    def __req_presence_handler(self, i_req, session):
         """ Mathod the handler presence request """
 
-        prv, pub = gen_keys()
-        self.client_keys[i_req.body] = (client, prv)
-        self.__send_to_client(client, Response(AUTH,
-                                               pub.export_key().decode()))
+        presence = Presence.from_body(i_req.body)
+        prv, pub = self.key_pool.get()
+        session.key = prv
+        pub_key = pub.export_key().decode()
+        if not presence.features:
+            self.__reply(session, i_req, Response(AUTH, pub_key))
+            return
 
+        features = [f for f in presence.features if f in self.FEATURES]
+        session.features = set(features)
+        # decoder is switched before answer, next request of client can be read
+        # by network loop while handler is finished by worker
+        encoder, decoder = session.encoder, session.decoder
+        if Feature.BINARY in features:
+            decoder.codec = get_codec(BINARY)
+        if Feature.ZLIB in features:
+            decoder.enable_compression()
+        answer = {KEY: pub_key, FEATURES: features}
+        if Feature.FILE_STREAM in features:
+            answer[CHUNK] = self.FILE_CHUNK
+        self.__reply(session, i_req, Response(AUTH, answer))
+        if Feature.BINARY in features:
+            encoder.codec = get_codec(BINARY)
+        if Feature.ZLIB in features:
+            encoder.enable_compression()
+
+    @blocking
     @try_except_wrapper
-    def __req_auth_handler(self, i_req, client, *args):
+    def __req_auth_handler(self, i_req, session):
         """ Mathod the handler authorization request """
 
-        other_clients = args[0]
-        user = [u for u, c in self.users.items() if c == client]
-        if len(user) == 0:
+        user = session.username
+        if not user:
             self.logger.warning(f'AUTH: user not found')
             return
-        user = user[0]
-        cl, key = self.client_keys[user]
-        if cl != client:
-            self.logger.warning('AUTH: connection sockets not equals')
-            return
-        password = decrypt_password(key, i_req.body)
+        password = decrypt_password(session.key, i_req.body)
         if password is None:
             self.logger.warning('AUTH: decrypt error')
             return
-        password_hash = get_hash_password(password, user.encode())
+        future = self.hasher.submit(password, user.encode())
+        if future is None:
+            self.logger.warning('AUTH: password hasher is overloaded')
+            self.__reply(session, i_req, Response(SERVER_UNAVAILABLE))
+            return
+        # next request of client waits for end of authorization
+        return self.workers.then(future, self.__auth_complete, i_req, session)
+
+    @try_except_wrapper
+    def __auth_complete(self, future, i_req, session):
+        """ Method finishes authorization by future of password hash """
+
+        if session not in self.sessions:
+            return
+        try:
+            password_hash = future.result()
+        except Exception as exc:
+            self.logger.error(f'AUTH: hash error {exc}')
+            self.__reply(session, i_req, Response(SERVER_ERROR))
+            return
+        user = session.username
         if not self.storage.authorization_user(user, password_hash):
-            self.__send_to_client(client, Response(UNAUTHORIZED))
-            self.clients.remove(client)
-            self.users.pop(user)
+            self.__reply(session, i_req, Response(UNAUTHORIZED))
+            self.__drop(session)
             return
-        self.storage.login_user(user, client.getpeername()[0])
-        self.__send_to_client(client, Response(OK))
-        self.__send_to_all(other_clients, Response(CONNECTED, user))
+        self.storage.login_user(user, session.addr[0])
+        session.authorized = True
+        self.__reply(session, i_req, Response(OK))
+        self.__send_to_all(self.sessions.others(session), Response(CONNECTED, user))
 
     @try_except_wrapper
-    def __req_start_chat_handler(self, i_req, client, *args):
+    def __req_start_chat_handler(self, i_req, session):
         """ Mathod the handler start chat request """
 
         msg = Msg.from_dict(i_req.body)
-        if msg.to not in self.users:
+        recipient = self.sessions.get_user(msg.to)
+        if recipient is None:
             self.logger.warning(f'{msg.to} not found')
             return
-        self.__send_to_client(self.users[msg.to],
-                              Response(START_CHAT, str(msg)))
+        self.__send_to_client(recipient,
+                              self.__msg_response(recipient, START_CHAT, msg))
 
     @try_except_wrapper
-    def __req_accept_chat_handler(self, i_req, client, *args):
+    def __req_accept_chat_handler(self, i_req, session):
         """ Mathod the handler accept chat request """
 
         msg = Msg.from_dict(i_req.body)
-        if msg.to not in self.users:
+        recipient = self.sessions.get_user(msg.to)
+        if recipient is None:
             self.logger.warning(f'{msg.to} not found')
             return
-        self.__send_to_client(self.users[msg.to],
-                              Response(ACCEPT_CHAT, str(msg)))
+        self.__send_to_client(recipient,
+                              self.__msg_response(recipient, ACCEPT_CHAT, msg))
 
+    @blocking
     @try_except_wrapper
-    def __req_message_handler(self, i_req, client, *args):
+    def __req_message_handler(self, i_req, session):
         """ Mathod the handler message request """
 
-        other_clients = args[0]
         msg = Msg.from_dict(i_req.body)
+        now = datetime.now()
+        msg.time = now.timestamp()
+        session.stats['messages'] += 1
         self.storage.user_stat_update(msg.sender, ch_sent=1)
-        if msg.to.upper() != '@ALL' and msg.to in self.users:
+        if not msg.to.startswith('@'):
             self.storage.user_stat_update(msg.to, ch_recv=1)
-            self.storage.add_message(msg.sender, msg.to, msg.text)
-            self.__send_to_client(self.users[msg.to],
-                                  Response(LETTER, str(msg)))
-        else:
-            text = b64decode(msg.text).decode().lower()
-            spam_filter = [s for s in self.SPAM if s in text]
-            if len(spam_filter) > 0:
-                self.logger.warning('SPAM DETECT')
-                return
-            self.storage.add_message_to_room(msg.to.upper()[1:], msg.text, msg.sender)
+            msg.id = self.storage.add_message(msg.sender, msg.to,
+                                              b64_text(msg.text), now)
+            recipient = self.sessions.get_user(msg.to)
+            if recipient is not None:
+                self.__send_to_client(recipient,
+                                      self.__msg_response(recipient, LETTER, msg))
+            return
 
-            self.__send_to_all(other_clients, Response(LETTER, str(msg)))
+        text = raw_bytes(msg.text).decode().lower()
+        spam_filter = [s for s in self.SPAM if s in text]
+        if len(spam_filter) > 0:
+            self.logger.warning('SPAM DETECT')
+            return
+        room = self.rooms.room_name(msg.to)
+        msg.id = self.storage.add_message_to_room(
+            room, b64_text(msg.text), msg.sender, now)
 
+        if room == self.ALL_ROOM:
+            members = self.sessions.others(session)
+        else:
+            members = [s for s in self.rooms.members(room) if s is not session]
+        self.__send_msg_to_all(members, LETTER, msg)
+
+    @blocking
     @try_except_wrapper
-    def __req_command_handler(self, i_req, client, *args):
+    def __req_command_handler(self, i_req, session):
         """ Mathod the handler command request """
 
         command, *args = i_req.body.split()
-        user = [u for u, c in self.users.items() if c == client].pop()
+        user = session.username
         if len(args) < 1 or args[0] != user:
             args.insert(0, user)
-        o_resp = self.__execute_command(command, *args)
-        if isinstance(o_resp, list):
-            [self.__send_to_client(client, r) for r in o_resp]
-        else:
-            self.__send_to_client(client, o_resp)
+        o_resp = self.__execute_command(session, command, *args)
+        self.__reply(session, i_req, o_resp)
 
+    @blocking
     @try_except_wrapper
-    def __req_recv_image_handler(self, i_req, client, *args):
-        user = [u for u, c in self.users.items() if c == client].pop()
-        body = b64decode(i_req.body.encode())
-        if user in self.images.keys():
-            self.images[user] += body
-        else:
-            self.images[user] = body
-        self.__send_to_client(client, Response(FILE_ANSWER))
+    def __req_recv_image_handler(self, i_req, session):
+        if FileChunk.is_chunk(i_req.body):
+            self.__recv_file_chunk(session, i_req, FileChunk.from_body(i_req.body))
+            return
+        if not self.__get_upload(session).write(raw_bytes(i_req.body)):
+            self.logger.warning(f'Image of {session.username} is too large')
+            self.__close_upload(session)
+            self.__reply(session, i_req, Response(INCORRECT_REQUEST, 'Image is too large'))
+            return
+        self.__reply(session, i_req, Response(FILE_ANSWER))
 
+    def __recv_file_chunk(self, session, i_req, chunk):
+        """ Method appends chunk of streamed file, answer is offset of end
+            of received data, client doesn't wait it before next chunk """
+
+        upload = self.__get_upload(session)
+        if chunk.offset != len(upload) or len(chunk.data) > self.FILE_CHUNK:
+            self.logger.warning(f'Unexpected chunk {chunk.offset} of file')
+            self.__close_upload(session)
+            self.__reply(session, i_req, Response(INCORRECT_REQUEST, 'Unexpected chunk'))
+            return
+        if not upload.write(chunk.data):
+            self.logger.warning(f'Image of {session.username} is too large')
+            self.__close_upload(session)
+            self.__reply(session, i_req, Response(INCORRECT_REQUEST, 'Image is too large'))
+            return
+        self.__reply(session, i_req, Response(FILE_ANSWER, chunk.end))
+
+    def __get_upload(self, session):
+        """ Method returns spool of upload of session, creates it if needed """
+
+        if session.upload is None:
+            session.upload = UploadSpool(self.max_upload)
+        return session.upload
+
+    @staticmethod
+    def __close_upload(session):
+        upload, session.upload = session.upload, None
+        if upload is not None:
+            upload.close()
+
+    @blocking
     @try_except_wrapper
-    def __req_end_recv_image_handler(self, i_req, client, *args):
-        user = [u for u, c in self.users.items() if c == client].pop()
-        if user not in self.images.keys():
+    def __req_end_recv_image_handler(self, i_req, session):
+        info = FileInfo.from_body(i_req.body) if FileInfo.is_info(i_req.body) else None
+        if session.upload is None:
             self.logger.warning('Image is empty')
+            if info is not None:
+                self.__reply(session, i_req, Response(INCORRECT_REQUEST, 'Image is empty'))
             return
-        user_avatar = self.images.pop(user)
-        self.storage.set_avatar(user, user_avatar)
-        self.__send_to_client(client, Response(FILE_ANSWER))
-        # TODO send to all users updated avatar
-
+        user_avatar = session.upload.getvalue()
+        self.__close_upload(session)
+        if info is not None and not info.check(user_avatar):
+            self.logger.warning('Checksum of image mismatch')
+            self.__reply(session, i_req, Response(INCORRECT_REQUEST, 'Checksum mismatch'))
+            return
+        if self.storage.set_avatar(session.username, user_avatar) is False:
+            self.__reply(session, i_req, Response(SERVER_ERROR))
+            return
+        self.__reply(session, i_req,
+                     Response(FILE_ANSWER, info.checksum if info else None))
+        # online users (contacts too) update avatar when it is shown next time,
+        # offline contacts check it by check_avatars after login
+        changed = AvatarHash(session.username, FileInfo.of(user_avatar).checksum)
+        self.__send_to_all(self.sessions.others(session), Response(AVATAR_CHANGED, changed))
+
+    @blocking
     @try_except_wrapper
-    def __req_send_image_handler(self, i_req, client, *args):
+    def __req_send_image_handler(self, i_req, session):
         avatar = self.storage.get_avatar(i_req.body)
         if avatar:
-            sender_thread = ServerThread(lambda: self.__send_image_bytes(client, avatar), self.logger)
-            sender_thread.start()
+            self.__send_image_bytes(session, i_req, avatar)
         else:
-            self.__send_to_client(client, Response(FILE_ANSWER))
+            self.__reply(session, i_req, Response(FILE_ANSWER))
 
     @try_except_wrapper
-    def __send_image_bytes(self, client, img_bytes):
-        avatar_part = 512
-        for i in range(0, len(img_bytes), avatar_part):
-            part = b64encode(img_bytes[i:i + avatar_part])
-            part_resp = Response(FILE_ANSWER, part.decode())
-            self.__send_to_client(client, part_resp)
-        self.__send_to_client(client, Response(FILE_ANSWER))
+    def __send_image_bytes(self, session, i_req, img_bytes):
+        """ Method sends file by windows of chunks, next window is written
+            when client reads previous one, so pending data of connection
+            doesn't depend on size of file """
+
+        # chunks are views of file, data is copied only by encoding of frames
+        with memoryview(img_bytes) as view:
+            if Feature.FILE_STREAM in session.features:
+                size = self.FILE_CHUNK
+                parts = [Response(FILE_ANSWER, FileChunk(i, view[i:i + size]))
+                         for i in range(0, len(view), size)]
+                parts.append(Response(FILE_ANSWER, FileInfo.of(view)))
+            else:
+                size = self.LEGACY_FILE_CHUNK
+                parts = [Response(FILE_ANSWER, view[i:i + size])
+                         for i in range(0, len(view), size)]
+                parts.append(Response(FILE_ANSWER))
+            window = self.FILE_WINDOW * self.FILE_CHUNK // size
+            for i in range(0, len(parts), window):
+                if i and not self.__wait_outbound(session):
+                    return
+                self.__reply(session, i_req, parts[i:i + window])
+
+    def __wait_outbound(self, session):
+        """ Method waits until client reads pending data,
+            returns False if client is disconnected or dropped as slow """
+
+        if session.outbound.wait(self.TIMEOUT):
+            return session in self.sessions
+        if session in self.sessions:
+            self.logger.warning(f'Slow client dropped: {session.addr}')
+            self.__client_disconnect(session)
+        return False
 
     # endregion
@@ -2,7 +2,13 @@
 
 import binascii
 import hashlib
+import multiprocessing
+import os
 from base64 import b64decode
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from time import perf_counter
 
 from Crypto.PublicKey import RSA
 from Crypto.Cipher import PKCS1_OAEP
@@ -10,6 +16,7 @@ from Crypto.Cipher import PKCS1_OAEP
 
 LENGTH = 1024
 HASH_METHOD = 'sha256'
+HASH_QUEUE = 10000
 
 
 def gen_keys():
@@ -32,3 +39,72 @@ def get_hash_password(password: bytes, username: bytes):
     """ Function returns password hash """
 
     return binascii.hexlify(hashlib.pbkdf2_hmac(HASH_METHOD, password, username, 100000))
+
+
+class PasswordHasher:
+    """ Class of pool of processes hashes passwords, one process per core
+        Count of queued passwords is bounded, submit returns None above limit """
+
+    __slots__ = ('executor', 'workers', 'max_queue', 'queued', 'done',
+                 'rejected', 'total', 'max', 'lock')
+
+    def __init__(self, workers=None, max_queue=HASH_QUEUE):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = self.__create_executor()
+        self.max_queue = max_queue
+        self.queued = 0
+        self.done = 0
+        self.rejected = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = Lock()
+
+    def __create_executor(self):
+        return ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def start(self):
+        """ Method starts processes of pool before first login """
+
+        for _ in range(self.workers):
+            self.executor.submit(os.getpid)
+
+    def submit(self, password: bytes, username: bytes):
+        """ Method returns future of password hash or None if queue is full """
+
+        with self.lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                return None
+            self.queued += 1
+        start = perf_counter()
+        try:
+            future = self.executor.submit(get_hash_password, password, username)
+        except BrokenProcessPool:
+            self.executor = self.__create_executor()
+            future = self.executor.submit(get_hash_password, password, username)
+        future.add_done_callback(lambda f: self.__done(perf_counter() - start))
+        return future
+
+    def __done(self, latency):
+        with self.lock:
+            self.queued -= 1
+            self.done += 1
+            self.total += latency
+            self.max = max(self.max, latency)
+
+    def get_stats(self):
+        """ Method returns metrics of pool """
+
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'queued': self.queued,
+                'done': self.done,
+                'rejected': self.rejected,
+                'avg_ms': self.total / self.done * 1000 if self.done else 0.0,
+                'max_ms': self.max * 1000,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
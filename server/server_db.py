@@ -1,18 +1,21 @@
 """ Module implements server database models """
 
 import logging
+import os
 import threading
 from datetime import datetime
-from hashlib import md5
 
 from sqlalchemy import create_engine, or_, and_, Column, ForeignKey, \
                        Integer, String, DateTime, Binary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session, aliased
+from sqlalchemy.orm import sessionmaker, scoped_session, aliased, deferred
 
 from logs import server_log_config as log_config
 from decorators import transaction
 from metaclasses import Singleton
+from server_blobs import BlobStore, BLOBS_DIR
+from server_cache import AvatarCache
+from jim.classes.request_body import ChatRow
 
 Base = declarative_base()
 
@@ -108,20 +111,23 @@ class UserMessage(Base):
 
 
 class UserAvatar(Base):
+    """ Class model of Avatars table
+        Content of avatar is kept in blob store by hash,
+        column avatar is filled only in rows of old versions """
+
     __tablename__ = 'user_avatars'
 
     user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
-    avatar = Column(Binary)
+    avatar = deferred(Column(Binary))
     avatar_hash = Column(String)
 
-    def __init__(self, user_id, avatar_bytes):
+    def __init__(self, user_id, avatar_hash):
         self.user_id = user_id
-        self.set_avatar(avatar_bytes)
+        self.set_avatar(avatar_hash)
 
-    def set_avatar(self, avatar_bytes):
-        self.avatar = avatar_bytes
-        self.avatar_hash = md5(avatar_bytes).hexdigest()
-        # self.avatar_hash = hash(avatar_bytes)
+    def set_avatar(self, avatar_hash):
+        self.avatar = None
+        self.avatar_hash = avatar_hash
 
 
 class Room(Base):
@@ -160,6 +166,9 @@ class ServerStorage(metaclass=Singleton):
     sessions = {}
 
     def __init__(self, db_file=None):
+        self.avatars = AvatarCache()
+        self.blobs = BlobStore(os.path.join(os.path.dirname(db_file), BLOBS_DIR)
+                               if db_file else BLOBS_DIR)
         self.set_database(db_file)
 
     def set_database(self, db_file):
@@ -299,8 +308,8 @@ class ServerStorage(metaclass=Singleton):
             .join(UserStat, User.id == UserStat.user_id).all()
 
     @transaction
-    def add_message(self, sender_name, recipient_name, text):
-        """ Method adds message in db """
+    def add_message(self, sender_name, recipient_name, text, time=None):
+        """ Method adds message in db, returns id of message """
 
         sender = self.session.query(User).filter_by(name=sender_name).first()
         recp = self.session.query(User).filter_by(name=recipient_name).first()
@@ -309,8 +318,10 @@ class ServerStorage(metaclass=Singleton):
             self.logger.error('DB.add_message: user not found')
             return False
 
-        msg = UserMessage(sender.id, recp.id, text, datetime.now())
+        msg = UserMessage(sender.id, recp.id, text, time or datetime.now())
         self.session.add(msg)
+        self.session.flush()
+        return msg.id
 
     def get_user_messages(self):
         """ Method gets users messages from db """
@@ -359,48 +370,107 @@ class ServerStorage(metaclass=Singleton):
         msgs = self.get_chat(username_1, username_2)
         return list(['__'.join(tuple(str(m) for m in msg)) for msg in msgs])
 
-    @transaction
+    def get_chat_rows(self, username_1, username_2):
+        """ Method gets users chat messages from db as typed rows """
+
+        if username_1.startswith('@'):
+            return self.get_room_rows(username_1[1:])
+        if username_2.startswith('@'):
+            return self.get_room_rows(username_2[1:])
+
+        user_1 = self.session.query(User.id).filter_by(name=username_1).first()
+        user_2 = self.session.query(User.id).filter_by(name=username_2).first()
+
+        if not user_1 or not user_2:
+            self.logger.error('DB.get_chat_rows: user not found')
+            return False
+
+        senders = aliased(User)
+        recipients = aliased(User)
+
+        rows = self.session.query(UserMessage.id, UserMessage.time, senders.name,
+                                  recipients.name, UserMessage.text)\
+            .join(senders, UserMessage.sender_id == senders.id) \
+            .join(recipients, UserMessage.recipient_id == recipients.id) \
+            .filter(or_(
+                and_(UserMessage.sender_id == user_1.id,
+                     UserMessage.recipient_id == user_2.id),
+                and_(UserMessage.sender_id == user_2.id,
+                     UserMessage.recipient_id == user_1.id)
+            )).order_by(UserMessage.id)
+        return [ChatRow(i, int(time.timestamp()), sender, recp, text)
+                for i, time, sender, recp, text in rows]
+
     def set_avatar(self, username, avatar_bytes):
+        result = self.__save_avatar(username, avatar_bytes)
+        self.avatars.invalidate(username)
+        return result
+
+    @transaction
+    def __save_avatar(self, username, avatar_bytes):
         user = self.session.query(User).filter_by(name=username).first()
         if not user:
             self.logger.error('DB.set_avatar: user not found')
             return False
+        avatar_hash = self.blobs.put(avatar_bytes)
         u_avatar = self.session.query(UserAvatar).filter_by(user_id=user.id).first()
         if not u_avatar:
-            u_avatar = UserAvatar(user.id, avatar_bytes)
+            u_avatar = UserAvatar(user.id, avatar_hash)
             self.session.add(u_avatar)
         else:
-            u_avatar.set_avatar(avatar_bytes)
+            u_avatar.set_avatar(avatar_hash)
+
+    def __load_avatar(self, username):
+        """ Method loads entry of avatar cache from db,
+            content is loaded only from rows of old versions """
 
-    def get_avatar_hash(self, username):
         user = self.session.query(User).filter_by(name=username).first()
         if not user:
+            return None
+        a = self.session.query(UserAvatar).filter_by(user_id=user.id).first()
+        if not a or not a.avatar_hash:
+            return None, None
+        return a.avatar_hash, a.avatar if a.avatar_hash not in self.blobs else None
+
+    def get_avatar_hash(self, username):
+        entry = self.avatars.load(username, self.__load_avatar)
+        if not entry:
             self.logger.error('DB.get_avatar_hash: user not found')
             return False
-        a = self.session.query(UserAvatar).filter_by(user_id=user.id).first()
-        return a.avatar_hash if a else None
+        return entry[0]
 
     def get_avatar(self, username):
-        user = self.session.query(User).filter_by(name=username).first()
-        if not user:
+        entry = self.avatars.load(username, self.__load_avatar)
+        if not entry:
             self.logger.error('DB.get_avatar: user not found')
             return False
-        a = self.session.query(UserAvatar).filter_by(user_id=user.id).first()
-        return a.avatar if a else None
+        avatar_hash, avatar = entry
+        if avatar is None and avatar_hash:
+            avatar = self.blobs.get(avatar_hash)
+        return avatar
 
     def check_avatar_hash(self, *args):
         username = args[-2]
         av_hash = args[-1]
 
-        user = self.session.query(User).filter_by(name=username).first()
-        if not user:
+        entry = self.avatars.load(username, self.__load_avatar)
+        if not entry:
             self.logger.error('DB.check_avatar_hash: user not found')
             return False
-        answer = self.session.query(UserAvatar).filter(and_(
-                UserAvatar.user_id == user.id,
-                UserAvatar.avatar_hash == av_hash
-            )).first()
-        return 1 if answer else 0
+        return 1 if entry[0] is not None and entry[0] == av_hash else 0
+
+    def check_avatar_hashes(self, *args):
+        """ Method checks avatars of several users by one query,
+            args are 'user=hash' (empty hash if client hasn't avatar),
+            returns users whose avatar of client is stale or missing """
+
+        hashes = dict(a.split('=', 1) for a in args if '=' in a)
+        if not hashes:
+            return []
+        rows = self.session.query(User.name, UserAvatar.avatar_hash)\
+            .outerjoin(UserAvatar, UserAvatar.user_id == User.id)\
+            .filter(User.name.in_(hashes.keys())).all()
+        return [name for name, av_hash in rows if (av_hash or '') != hashes[name]]
 
     def get_users_avatar(self):
         return self.session.query(User, UserAvatar)\
@@ -420,7 +490,7 @@ class ServerStorage(metaclass=Singleton):
         return self.session.query(Room).all()
 
     @transaction
-    def add_message_to_room(self, room_name, message, username):
+    def add_message_to_room(self, room_name, message, username, time=None):
         user = self.session.query(User).filter_by(name=username).first()
         if not user:
             self.logger.error('DB.add_message_to_room: user not found')
@@ -428,8 +498,10 @@ class ServerStorage(metaclass=Singleton):
         room = self.session.query(Room).filter_by(name=room_name).first()
         if not room:
             room = self.create_room(room_name)
-        room_msg = RoomMessage(room.id, message, user.id, datetime.now())
+        room_msg = RoomMessage(room.id, message, user.id, time or datetime.now())
         self.session.add(room_msg)
+        self.session.flush()
+        return room_msg.id
 
     def get_room_messages(self, room_name):
         room = self.session.query(Room).filter_by(name=room_name).first()
@@ -447,6 +519,23 @@ class ServerStorage(metaclass=Singleton):
         msgs = self.get_room_messages(room_name)
         return list(['__'.join(tuple(str(m) for m in msg)) for msg in msgs])
 
+    def get_room_rows(self, room_name):
+        """ Method gets room messages from db as typed rows """
+
+        room = self.session.query(Room.id).filter_by(name=room_name).first()
+        if not room:
+            self.logger.error('DB.get_room_rows: room not found')
+            return False
+
+        to = f'@{room_name}'
+        rows = self.session.query(RoomMessage.id, RoomMessage.time,
+                                  User.name, RoomMessage.message)\
+            .join(User, RoomMessage.sender_id == User.id)\
+            .filter(RoomMessage.room_id == room.id)\
+            .order_by(RoomMessage.id)
+        return [ChatRow(i, int(time.timestamp()), sender, to, text)
+                for i, time, sender, text in rows]
+
 
 def main():
     import random
@@ -1,12 +1,14 @@
 import logging
 from datetime import datetime
-from hashlib import md5
 
 from mongoengine import *
 from mongoengine.queryset.visitor import Q
 
 from logs import server_log_config as log_config
 from metaclasses import Singleton
+from server_blobs import BlobStore
+from server_cache import AvatarCache
+from jim.classes.request_body import ChatRow
 
 
 class History(EmbeddedDocument):
@@ -54,6 +56,8 @@ class ServerStorageMongo(metaclass=Singleton):
     def __init__(self, host=None):
         self.cursor = connect(host=host if host else self.DB)
         self.logger = logging.getLogger(log_config.LOGGER_NAME)
+        self.avatars = AvatarCache()
+        self.blobs = BlobStore()
         User.objects(is_online=True).update(set__is_online=False)
 
     # region Transaction
@@ -96,7 +100,7 @@ class ServerStorageMongo(metaclass=Singleton):
             return False
         user.update(pull__contacts=contact)
 
-    def add_message(self, sender_name, recipient_name, text):
+    def add_message(self, sender_name, recipient_name, text, time=None):
         sender = User.objects(name=sender_name).only('id').first()
         recp = User.objects(name=recipient_name).only('id').first()
 
@@ -104,16 +108,19 @@ class ServerStorageMongo(metaclass=Singleton):
             self.logger.error('DB.add_message: user not found')
             return False
 
-        msg = Message(sender=sender, recipient=recp, text=text, time=datetime.now())
+        msg = Message(sender=sender, recipient=recp, text=text,
+                      time=time or datetime.now())
         msg.save()
+        return str(msg.id)
 
     def set_avatar(self, username, avatar_bytes):
         user = User.objects(name=username).only('avatar', 'avatar_hash').first()
         if not user:
             self.logger.error('DB.set_avatar: user not found')
             return False
-        user.update(set__avatar=avatar_bytes,
-                    set__avatar_hash=md5(avatar_bytes).hexdigest())
+        user.update(unset__avatar=True,
+                    set__avatar_hash=self.blobs.put(avatar_bytes))
+        self.avatars.invalidate(username)
 
     def create_room(self, room_name):
         room = Room.objects(name=room_name).first()
@@ -124,7 +131,7 @@ class ServerStorageMongo(metaclass=Singleton):
         room.save()
         return room
 
-    def add_message_to_room(self, room_name, message, username):
+    def add_message_to_room(self, room_name, message, username, time=None):
         user = User.objects(name=username).only('id').first()
         if not user:
             self.logger.error('DB.add_message_to_room: user not found')
@@ -133,8 +140,10 @@ class ServerStorageMongo(metaclass=Singleton):
         if not room:
             room = self.create_room(room_name)
 
-        msg = Message(sender=user, room=room, text=message, time=datetime.now())
+        msg = Message(sender=user, room=room, text=message,
+                      time=time or datetime.now())
         msg.save()
+        return str(msg.id)
 
     # endregion
     # region With return
@@ -176,31 +185,64 @@ class ServerStorageMongo(metaclass=Singleton):
         msgs = self.get_chat(username_1, username_2)
         return [m.get_chat_str() for m in msgs]
 
-    def get_avatar(self, username):
-        user = User.objects(name=username).only('avatar').first()
+    def get_chat_rows(self, username_1, username_2):
+        if username_1.startswith('@'):
+            return self.get_room_rows(username_1[1:])
+        if username_2.startswith('@'):
+            return self.get_room_rows(username_2[1:])
+
+        msgs = self.get_chat(username_1, username_2)
+        if msgs is False:
+            return False
+        return [ChatRow(str(m.id), int(m.time.timestamp()), m.sender.name,
+                        m.recipient.name, m.text)
+                for m in msgs.select_related()]
+
+    def __load_avatar(self, username):
+        user = User.objects(name=username).only('avatar_hash').first()
         if not user:
+            return None
+        if not user.avatar_hash:
+            return None, None
+        if user.avatar_hash in self.blobs:
+            return user.avatar_hash, None
+        # avatar of old version is kept in document
+        user = User.objects(name=username).only('avatar').first()
+        return user.avatar_hash, user.avatar or None
+
+    def get_avatar(self, username):
+        entry = self.avatars.load(username, self.__load_avatar)
+        if not entry:
             self.logger.error('DB.get_avatar: user not found')
             return False
-        return user.avatar if user.avatar else None
+        avatar_hash, avatar = entry
+        if avatar is None and avatar_hash:
+            avatar = self.blobs.get(avatar_hash)
+        return avatar
 
     def get_avatar_hash(self, username):
-        user = User.objects(name=username).only('avatar_hash').first()
-        if not user:
+        entry = self.avatars.load(username, self.__load_avatar)
+        if not entry:
             self.logger.error('DB.get_avatar_hash: user not found')
             return False
-        return user.avatar_hash if user.avatar_hash else None
+        return entry[0]
 
     def check_avatar_hash(self, *args):
         username = args[-2]
         av_hash = args[-1]
 
-        user = User.objects(name=username).only('avatar_hash').first()
-        if not user:
+        entry = self.avatars.load(username, self.__load_avatar)
+        if not entry:
             self.logger.error('DB.check_avatar_hash: user not found')
             return False
-        if user.avatar_hash:
-            return 1 if user.avatar_hash == av_hash else 0
-        return 0
+        return 1 if entry[0] and entry[0] == av_hash else 0
+
+    def check_avatar_hashes(self, *args):
+        hashes = dict(a.split('=', 1) for a in args if '=' in a)
+        if not hashes:
+            return []
+        users = User.objects(name__in=list(hashes.keys())).only('name', 'avatar_hash')
+        return [u.name for u in users if (u.avatar_hash or '') != hashes[u.name]]
 
     def get_room_messages(self, room_name):
         room = Room.objects(name=room_name).only('id').first()
@@ -213,6 +255,14 @@ class ServerStorageMongo(metaclass=Singleton):
         msgs = self.get_room_messages(room_name)
         return [m.get_room_messages_str() for m in msgs]
 
+    def get_room_rows(self, room_name):
+        msgs = self.get_room_messages(room_name)
+        if msgs is False:
+            return False
+        to = f'@{room_name}'
+        return [ChatRow(str(m.id), int(m.time.timestamp()), m.sender.name, to, m.text)
+                for m in msgs.select_related()]
+
     # endregion
     # region Server UI
 
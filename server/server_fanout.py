@@ -0,0 +1,73 @@
+""" Module implements broadcast of packages to many client connections
+    Package is encoded once per codec, frames are shared by connections """
+
+from time import perf_counter
+
+
+class FanOut:
+    """ Class of broadcast of packages
+        Write is function(session, buffers) queues frame to connection, returns
+        False if connection must be dropped by drop(session) after locks of
+        encoders are released,
+        frames of compressed streams are framed per connection from shared payload """
+
+    __slots__ = ('write', 'drop', 'logger', 'count', 'recipients', 'total', 'max')
+
+    def __init__(self, write, drop, logger):
+        self.write = write
+        self.drop = drop
+        self.logger = logger
+        self.count = 0
+        self.recipients = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def send(self, sessions, package):
+        """ Method queues package to sessions, returns latency of fan-out in seconds """
+
+        start = perf_counter()
+        payloads, frames = {}, {}
+        recipients = 0
+        dropped = []
+        for session in sessions:
+            encoder = session.encoder
+            name = encoder.codec.name
+            with encoder.lock:
+                buffers = frames.get(name) if encoder.shared else None
+                if buffers is None:
+                    payload = payloads.get(name)
+                    if payload is None:
+                        payload = payloads[name] = encoder.codec.encode(package)
+                    buffers = encoder.frame_payload(payload)
+                    if encoder.shared:
+                        frames[name] = buffers
+                if not self.write(session, buffers):
+                    dropped.append(session)
+            recipients += 1
+
+        latency = perf_counter() - start
+        self.count += 1
+        self.recipients += recipients
+        self.total += latency
+        self.max = max(self.max, latency)
+        self.logger.debug(f'Fan-out to {recipients} clients: '
+                          f'{latency * 1000:.3f} ms, {len(payloads)} encodes')
+        for session in dropped:
+            self.drop(session)
+        return latency
+
+    def get_stats(self):
+        """ Method returns statistics of broadcasts """
+
+        return {
+            'broadcasts': self.count,
+            'recipients': self.recipients,
+            'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'max_ms': self.max * 1000,
+        }
+
+    def __str__(self):
+        stats = self.get_stats()
+        return f'Fan-out: {stats["broadcasts"]} broadcasts to ' \
+               f'{stats["recipients"]} clients, avg {stats["avg_ms"]:.3f} ms, ' \
+               f'max {stats["max_ms"]:.3f} ms'
@@ -0,0 +1,89 @@
+""" Module implements outbound buffers of client connections
+    Data is written without blocking, the rest is flushed when socket is writable """
+
+from collections import deque
+from itertools import islice
+from threading import Lock, Condition
+
+MAX_IOV = 64
+HIGH_WATER = 256 * 1024
+LOW_WATER = 64 * 1024
+MAX_PENDING = 4 * 1024 * 1024
+
+
+def send_some(socket, buffers):
+    """ Function sends buffers by one non-blocking call, returns count of sent bytes """
+
+    if hasattr(socket, 'sendmsg'):
+        return socket.sendmsg(buffers)
+    return socket.send(b''.join(buffers))
+
+
+class OutboundBuffer:
+    """ Class of outbound buffer of non-blocking socket
+        Reading of client is paused above high water mark until buffer
+        is flushed below low water mark """
+
+    __slots__ = ('socket', 'buffers', 'size', 'paused', 'lock', 'resumed')
+
+    def __init__(self, socket):
+        self.socket = socket
+        self.buffers = deque()
+        self.size = 0
+        self.paused = False
+        self.lock = Lock()
+        self.resumed = Condition(self.lock)
+
+    def write(self, buffers):
+        """ Method queues buffers and sends as much as possible,
+            returns size of pending data """
+
+        with self.lock:
+            for buffer in buffers:
+                if len(buffer):
+                    self.buffers.append(memoryview(buffer))
+                    self.size += len(buffer)
+            return self.__flush()
+
+    def flush(self):
+        """ Method sends pending data, returns size of pending data """
+
+        with self.lock:
+            return self.__flush()
+
+    def close(self):
+        """ Method drops pending data of closed connection, wakes up writers """
+
+        with self.lock:
+            self.buffers.clear()
+            self.size = 0
+            self.paused = False
+            self.resumed.notify_all()
+
+    def wait(self, timeout=None):
+        """ Method waits until buffer isn't paused, returns False by timeout """
+
+        with self.lock:
+            return self.resumed.wait_for(lambda: not self.paused, timeout)
+
+    def __flush(self):
+        buffers = self.buffers
+        while buffers:
+            try:
+                sent = send_some(self.socket, list(islice(buffers, MAX_IOV)))
+            except (BlockingIOError, InterruptedError):
+                break
+            self.size -= sent
+            while sent:
+                if sent >= len(buffers[0]):
+                    sent -= len(buffers.popleft())
+                else:
+                    buffers[0] = buffers[0][sent:]
+                    sent = 0
+
+        if self.size > HIGH_WATER:
+            self.paused = True
+        elif self.size < LOW_WATER:
+            self.paused = False
+            self.resumed.notify_all()
+        return self.size
@@ -0,0 +1,156 @@
+""" Module implements registry of client sessions and rooms of server """
+
+from collections import Counter
+from threading import Lock
+
+
+class Session:
+    """ Class of state of client connection """
+
+    __slots__ = ('client', 'fd', 'addr', 'username', 'authorized', 'decoder',
+                 'encoder', 'outbound', 'features', 'key', 'upload', 'rooms',
+                 'stats')
+
+    def __init__(self, client, addr, decoder, encoder, outbound):
+        self.client = client
+        self.fd = client.fileno()
+        self.addr = addr
+        self.username = None
+        self.authorized = False
+        self.decoder = decoder
+        self.encoder = encoder
+        self.outbound = outbound
+        self.features = set()
+        self.key = None
+        self.upload = None
+        self.rooms = set()
+        self.stats = Counter()
+
+    def __repr__(self):
+        return f'<Session {self.username} {self.addr}>'
+
+
+class SessionRegistry:
+    """ Class of registry of sessions indexed by client, username and fd """
+
+    __slots__ = ('clients', 'users', 'fds', 'lock')
+
+    def __init__(self):
+        self.clients = {}
+        self.users = {}
+        self.fds = {}
+        self.lock = Lock()
+
+    def add(self, session):
+        """ Method registers session """
+
+        with self.lock:
+            self.clients[session.client] = session
+            self.fds[session.fd] = session
+
+    def remove(self, session):
+        """ Method unregisters session, returns False if it isn't registered """
+
+        with self.lock:
+            if self.clients.pop(session.client, None) is None:
+                return False
+            self.fds.pop(session.fd, None)
+            if self.users.get(session.username) is session:
+                self.users.pop(session.username)
+            return True
+
+    def bind_user(self, session, username):
+        """ Method binds username to session, returns False if it is busy """
+
+        with self.lock:
+            if username in self.users:
+                return False
+            session.username = username
+            self.users[username] = session
+            return True
+
+    def get(self, client):
+        return self.clients.get(client)
+
+    def get_user(self, username):
+        return self.users.get(username)
+
+    def get_fd(self, fd):
+        return self.fds.get(fd)
+
+    def others(self, session):
+        """ Method returns authorized sessions except session """
+
+        return [s for s in self if s.authorized and s is not session]
+
+    def __contains__(self, session):
+        return self.clients.get(session.client) is session
+
+    def __iter__(self):
+        return iter(list(self.clients.values()))
+
+    def __len__(self):
+        return len(self.clients)
+
+
+class RoomIndex:
+    """ Class of index of members of rooms by room name
+        Name of room is upper case without '@' as it is stored in db """
+
+    __slots__ = ('rooms', 'lock')
+
+    def __init__(self):
+        self.rooms = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def room_name(name):
+        return name.lstrip('@').upper()
+
+    def join(self, session, name):
+        """ Method adds session in members of room, returns name of room """
+
+        name = self.room_name(name)
+        with self.lock:
+            self.rooms.setdefault(name, set()).add(session)
+            session.rooms.add(name)
+        return name
+
+    def leave(self, session, name):
+        """ Method removes session from members of room,
+            returns False if session isn't member """
+
+        name = self.room_name(name)
+        with self.lock:
+            members = self.rooms.get(name)
+            if members is None or session not in members:
+                return False
+            members.discard(session)
+            session.rooms.discard(name)
+            if not members:
+                self.rooms.pop(name)
+            return True
+
+    def leave_all(self, session):
+        """ Method removes session from all rooms """
+
+        with self.lock:
+            for name in session.rooms:
+                members = self.rooms.get(name)
+                if members is not None:
+                    members.discard(session)
+                    if not members:
+                        self.rooms.pop(name)
+            session.rooms.clear()
+
+    def members(self, name):
+        """ Method returns list of members of room """
+
+        with self.lock:
+            return list(self.rooms.get(self.room_name(name), ()))
+
+    def __contains__(self, name):
+        return self.room_name(name) in self.rooms
+
+    def __len__(self):
+        return len(self.rooms)
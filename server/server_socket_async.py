@@ -1,88 +1,188 @@
+""" Module implements asyncio engine of server
+    Connections are served by one event loop, requests are handled by Server """
+
 import asyncio
 import threading
-from base64 import b64encode, b64decode
-
-from descriptors import Port
-
 
-class ServerAsync:
+from jim.functions import FrameDecoder
+from server_outbound import HIGH_WATER, LOW_WATER
 
-    BUFFER = 1024
-    port = Port('_port')
 
-    def __init__(self, loop, bind_addr, port, request_handler):
-        self.loop = loop
-        self.addr = bind_addr
-        self.port = port
-        self.request_handler = request_handler
-        self.request_decoder = lambda x: x.decode()
-        self.response_encoder = lambda x: x.encode()
+def in_loop(loop):
+    """ Function checks that it is called in thread of loop """
 
-    def set_request_decoder(self, value):
-        self.request_decoder = value
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
 
-    def set_response_encoder(self, value):
-        self.response_encoder = value
 
-    async def start(self):
-        self.server_cor = \
-            asyncio.start_server(self.connection_handler, self.addr, self.port, loop=self.loop)
-        self.server = await self.server_cor
+class AsyncConnection(asyncio.Protocol):
+    """ Class of client connection of asyncio engine
+        Provides socket-like interface and outbound buffer used by Server,
+        reading is paused while transport buffer is above high water mark.
+        Writes of other threads are queued and flushed by loop in order,
+        writes of loop go after them """
 
-    def start_background(self):
-        back_lamd = lambda: self.loop.run_until_complete(self.__setup_back())
-        self.back_thread = threading.Thread(target=back_lamd, daemon=True)
-        self.back_thread.start()
+    __slots__ = ('server', 'loop', 'transport', 'decoder', 'peername',
+                 'lock', 'queue', 'queued', 'scheduled', 'paused', 'resumed')
 
-    async def __setup_back(self):
-        asyncio.set_event_loop(self.loop)
-        await self.start()
-        await self.server.wait_closed()
-
-    async def connection_handler(self, reader, writer):
-        while True:
-            try:
-                data = await reader.read(self.BUFFER)
-                addr = writer.get_extra_info('peername')
-
-                data = self.request_decoder(data)
-                print(f'{addr} REQUEST: {data}')
-                resp = self.request_handler(data)
-
-                print(f'RESPONCE: {resp}')
-                resp = self.response_encoder(resp)
-                writer.write(resp)
-                await writer.drain()
-            except Exception as e:
-                print(e)
-                return
+    def __init__(self, server, loop):
+        self.server = server
+        self.loop = loop
+        self.transport = None
+        self.decoder = FrameDecoder()
+        self.peername = None
+        # transport calls pause_writing while queue is flushed under lock
+        self.lock = threading.RLock()
+        self.queue = []
+        self.queued = 0
+        self.scheduled = False
+        self.paused = False
+        self.resumed = threading.Condition(self.lock)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peername = transport.get_extra_info('peername')
+        transport.set_write_buffer_limits(HIGH_WATER, LOW_WATER)
+        if not self.server.connect(self, self.peername, self.decoder, self):
+            transport.close()
+
+    def data_received(self, data):
+        self.decoder.feed(data)
+        try:
+            for request in self.decoder.packages():
+                self.server.handle(self, request)
+                if self.transport.is_closing():
+                    break
+        except ValueError:
+            self.server.disconnect(self)
+        except Exception as exc:
+            self.server.logger.error(f'Incorrect frame from {self.peername}: {exc!r}')
+            self.server.disconnect(self)
+
+    def connection_lost(self, exc):
+        self.server.disconnect(self)
+        with self.lock:
+            self.paused = False
+            self.resumed.notify_all()
+
+    def pause_writing(self):
+        self.paused = True
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+        with self.lock:
+            self.paused = False
+            self.resumed.notify_all()
+
+    def write(self, buffers):
+        """ Method writes buffers to transport, can be called from any thread,
+            returns size of pending data including queued buffers """
+
+        with self.lock:
+            if not self.scheduled and in_loop(self.loop):
+                self.transport.writelines(buffers)
+            else:
+                self.queue.extend(buffers)
+                self.queued += sum(len(b) for b in buffers)
+                if not self.scheduled:
+                    self.scheduled = True
+                    self.loop.call_soon_threadsafe(self.__flush)
+            return self.transport.get_write_buffer_size() + self.queued
+
+    def sendall(self, data):
+        """ Method writes data to transport, can be called from any thread """
+
+        self.write([data])
+
+    def wait(self, timeout=None):
+        """ Method waits until queue is flushed and writing isn't paused,
+            returns False by timeout, can't be called in loop """
+
+        with self.lock:
+            return self.resumed.wait_for(
+                lambda: not self.scheduled and not self.paused, timeout)
+
+    def __flush(self):
+        """ Method writes queued buffers to transport in loop """
+
+        with self.lock:
+            if self.queue and not self.transport.is_closing():
+                self.transport.writelines(self.queue)
+            self.queue = []
+            self.queued = 0
+            self.scheduled = False
+            self.resumed.notify_all()
+
+    def getpeername(self):
+        return self.peername
+
+    def fileno(self):
+        return self.transport.get_extra_info('socket').fileno()
+
+    def close(self):
+        """ Method closes transport after queued data,
+            pending data of slow client is dropped """
+
+        if in_loop(self.loop):
+            self.__close()
+        else:
+            self.loop.call_soon_threadsafe(self.__close)
+
+    def __close(self):
+        if self.transport.get_write_buffer_size() + self.queued > HIGH_WATER:
+            self.transport.abort()
+            return
+        self.__flush()
+        self.transport.close()
+
+    def __repr__(self):
+        return f'<AsyncConnection {self.peername}>'
 
-    def stop(self):
-        self.server.close()
 
+class ServerAsync:
+    """ Class of asyncio engine of Server, runs event loop in thread """
 
-ENCODING = 'utf-8'
+    __slots__ = ('server', 'loop', 'listener', 'thread')
 
+    def __init__(self, server, loop=None):
+        self.server = server
+        self.loop = loop or asyncio.new_event_loop()
+        self.listener = None
+        self.thread = None
 
-def client_handler(req):
-    print(f'<<< {req}')
-    return f'RESP {req}'
+    async def start(self, backlog=100):
+        self.listener = await self.loop.create_server(
+            lambda: AsyncConnection(self.server, self.loop),
+            self.server.bind_addr or None, self.server.port, backlog=backlog)
+        self.server.logger.info('Start listen')
+        self.loop.call_later(self.server.STATS_INTERVAL, self.__log_stats)
 
+    def __log_stats(self):
+        self.server.log_stats()
+        self.loop.call_later(self.server.STATS_INTERVAL, self.__log_stats)
 
-def encoder(data):
-    return b64encode(data.encode(ENCODING))
+    def start_background(self, backlog=100):
+        self.thread = threading.Thread(target=self.__run, args=(backlog,),
+                                       daemon=True)
+        self.thread.start()
 
+    def __run(self, backlog):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.start(backlog))
+        self.loop.run_forever()
 
-def decoder(data):
-    return b64decode(data).decode(ENCODING)
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.listener.close)
 
 
 def main():
-    loop = asyncio.get_event_loop()
-    server = ServerAsync(loop, '', 7878, client_handler)
-    server.set_response_encoder(encoder)
-    server.set_request_decoder(decoder)
-    server.start_background()
+    from server_core import Server
+
+    server = Server('', 7777)
+    server.start(engine=Server.ASYNC_ENGINE)
     while True:
         msg = input()
         if msg == 'q':
@@ -0,0 +1,65 @@
+""" Module implements spool of file uploaded by client
+    Data is kept in memory up to threshold, then it is moved to temp file """
+
+from tempfile import TemporaryFile
+from threading import Lock
+
+SPOOL_MEMORY = 256 * 1024
+MAX_UPLOAD = 8 * 1024 * 1024
+
+
+class UploadSpool:
+    """ Class of buffer of upload with limit of size
+        Spool can be closed by network loop while worker writes to it """
+
+    __slots__ = ('buffer', 'file', 'size', 'max_size', 'memory', 'lock')
+
+    def __init__(self, max_size=MAX_UPLOAD, memory=SPOOL_MEMORY):
+        self.buffer = bytearray()
+        self.file = None
+        self.size = 0
+        self.max_size = max_size
+        self.memory = memory
+        self.lock = Lock()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def spilled(self):
+        return self.file is not None
+
+    def write(self, data):
+        """ Method appends data, returns False if size limit is exceeded """
+
+        with self.lock:
+            if self.buffer is None or self.size + len(data) > self.max_size:
+                return False
+            if self.file is None and self.size + len(data) > self.memory:
+                self.file = TemporaryFile()
+                self.file.write(self.buffer)
+                self.buffer = bytearray()
+            if self.file is not None:
+                self.file.write(data)
+            else:
+                self.buffer += data
+            self.size += len(data)
+            return True
+
+    def getvalue(self):
+        """ Method returns all uploaded data """
+
+        with self.lock:
+            if self.file is None:
+                return bytes(self.buffer)
+            self.file.seek(0)
+            return self.file.read()
+
+    def close(self):
+        """ Method frees memory and removes temp file of spool """
+
+        with self.lock:
+            self.buffer = None
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,85 @@
+""" Module implements pool of workers for blocking request handlers
+    Tasks of one connection are run one by one in order of receipt,
+    task can return future, next task of connection waits for it """
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+
+WORKERS = 4
+MAX_PENDING_TASKS = 1024
+
+
+class WorkerPool:
+    """ Class of bounded pool of threads runs tasks serially per key
+        Next task of key is started by worker after previous task of key """
+
+    __slots__ = ('executor', 'logger', 'queues', 'pending', 'max_pending', 'lock')
+
+    def __init__(self, logger, workers=WORKERS, max_pending=MAX_PENDING_TASKS):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='worker')
+        self.logger = logger
+        self.queues = {}
+        self.pending = 0
+        self.max_pending = max_pending
+        self.lock = Lock()
+
+    def busy(self, key):
+        """ Method checks that key has queued or running tasks """
+
+        return key in self.queues
+
+    def submit(self, key, func, *args):
+        """ Method queues task of key, returns False if pool is overloaded """
+
+        with self.lock:
+            if self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+            queue = self.queues.get(key)
+            if queue is not None:
+                queue.append((func, args))
+                return True
+            self.queues[key] = deque()
+        self.executor.submit(self.__run, key, func, args)
+        return True
+
+    def then(self, future, func, *args):
+        """ Method runs func(future, *args) by worker when future is done,
+            returns future of func """
+
+        done = Future()
+
+        def run(f):
+            try:
+                done.set_result(func(f, *args))
+            except Exception as exc:
+                self.logger.error(exc)
+                done.set_exception(exc)
+        future.add_done_callback(lambda f: self.executor.submit(run, f))
+        return done
+
+    def __run(self, key, func, args):
+        try:
+            result = func(*args)
+        except Exception as exc:
+            self.logger.error(exc)
+            result = None
+
+        if isinstance(result, Future):
+            result.add_done_callback(lambda f: self.__next(key))
+        else:
+            self.__next(key)
+
+    def __next(self, key):
+        with self.lock:
+            self.pending -= 1
+            queue = self.queues[key]
+            if not queue:
+                self.queues.pop(key)
+                return
+            func, args = queue.popleft()
+        self.executor.submit(self.__run, key, func, args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
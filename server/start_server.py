@@ -1,6 +1,7 @@
 """ Module start server application """
 
 import argparse
+import multiprocessing
 import os
 import sys
 
@@ -10,6 +11,7 @@ from PyQt5.QtWidgets import QApplication
 from server_core import Server
 from server_db import ServerStorage
 from server_db_mongo import ServerStorageMongo
+from server_upload import MAX_UPLOAD
 from ui.server_ui_logic import ConfigWindow, MainWindow
 
 
@@ -24,10 +26,20 @@ def load_config():
 
 def main():
 
+    multiprocessing.freeze_support()
     config = load_config()
 
     port = config['port'] if config and 'port' in config else 7777
     bind = config['bind'] if config and 'bind' in config else ''
+    engine = config['engine'] \
+        if config and 'engine' in config \
+        else Server.THREAD_ENGINE
+    key_pool = config['key_pool'] \
+        if config and 'key_pool' in config \
+        else Server.KEY_POOL_SIZE
+    max_upload = config['max_upload'] \
+        if config and 'max_upload' in config \
+        else MAX_UPLOAD
     db_file = config['database'] \
         if config and 'database' in config \
         else 'server_db.db'
@@ -44,14 +56,22 @@ def main():
                         help='Port [default=7777]')
     parser.add_argument('-a', '--addr', default=bind, type=str, nargs='?',
                         help='Bind address')
+    parser.add_argument('-e', '--engine', default=engine, type=str,
+                        choices=Server.ENGINES,
+                        help='Network engine [default=thread]')
+    parser.add_argument('-k', '--key-pool', default=key_pool, type=int,
+                        help='Count of pre-generated RSA keys '
+                             f'[default={Server.KEY_POOL_SIZE}]')
+    parser.add_argument('-u', '--max-upload', default=max_upload, type=int,
+                        help=f'Max size of uploaded file in bytes [default={MAX_UPLOAD}]')
 
     args = parser.parse_args()
     addr = args.addr
     port = args.port
 
-    server = Server(addr, port)
+    server = Server(addr, port, args.key_pool, args.max_upload)
     server.set_db_storage(storage)
-    server.start()
+    server.start(engine=args.engine)
 
     application = QApplication(sys.argv)
     main_window = MainWindow(storage=storage)
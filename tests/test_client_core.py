@@ -0,0 +1,193 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client'))
+
+from socket import socket
+from threading import Thread, Event
+from unittest import TestCase, main, skipIf
+
+from jim.classes.package import Response
+from jim.codes import AUTH, OK, UNAUTHORIZED, SERVER_ERROR, COLLECTION, FILE_ANSWER, \
+                      AVATAR_CHANGED
+from jim.constants import RequestAction, Feature, KEY, FEATURES
+from jim.classes.request_body import Msg, Collection, FileInfo, AvatarHash
+from jim.functions import FrameDecoder, send_data
+
+try:
+    sys.modules.pop('logs', None)  # client and server have own package of logs
+    from client_core import Client
+    from client_crypt import gen_keys
+except ImportError:
+    # client needs pycryptodome and sqlalchemy
+    Client = None
+
+TIMEOUT = 5
+
+
+class Server(Thread):
+    """ Server of tests, answers to presence and authorization of one client,
+        checks and downloads of avatars, keeps actions of requests """
+
+    def __init__(self, auth_code=OK, features=(), avatars=None):
+        super().__init__(daemon=True)
+        self.socket = socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen(1)
+        self.socket.settimeout(TIMEOUT)
+        self.port = self.socket.getsockname()[1]
+        self.auth_code = auth_code
+        self.features = list(features)
+        self.avatars = avatars or {}
+        self.client = None
+        self.actions = []
+        self.requests = []
+        self.closed = Event()
+
+    def run(self):
+        client, _ = self.socket.accept()
+        client.settimeout(TIMEOUT)
+        self.client = client
+        decoder = FrameDecoder(client)
+        pub_key = gen_keys()[1].export_key().decode()
+        try:
+            while True:
+                request = decoder.get()
+                self.actions.append(request.action)
+                self.requests.append(request)
+                if request.action == RequestAction.PRESENCE:
+                    send_data(client, Response(AUTH, {KEY: pub_key, FEATURES: self.features}))
+                elif request.action == RequestAction.AUTH:
+                    send_data(client, Response(self.auth_code))
+                elif request.action == RequestAction.COMMAND:
+                    self.check_avatars(request)
+                elif request.action == RequestAction.GET_IMAGE:
+                    send_data(client, Response(FILE_ANSWER, self.avatars[request.body], request.id))
+                    send_data(client, Response(FILE_ANSWER, None, request.id))
+        except (ConnectionError, ValueError, OSError):
+            pass
+        finally:
+            client.close()
+            self.socket.close()
+            self.closed.set()
+
+    def check_avatars(self, request):
+        """ Method answers to command check_avatars by users with stale hash """
+
+        _, _, *args = request.body.split()
+        hashes = dict(a.split('=', 1) for a in args)
+        stale = [user for user, data in self.avatars.items()
+                 if hashes.get(user, '') != FileInfo.of(data).checksum]
+        send_data(self.client, Response(COLLECTION, Collection(stale), request.id))
+
+    def change_avatar(self, user, data):
+        """ Method changes avatar of user and notifies client """
+
+        self.avatars[user] = data
+        changed = AvatarHash(user, FileInfo.of(data).checksum)
+        send_data(self.client, Response(AVATAR_CHANGED, changed))
+
+
+class Avatar:
+    """ Avatar of client storage """
+
+    def __init__(self, data):
+        self.avatar = data
+        self.avatar_hash = FileInfo.of(data).checksum
+
+
+class Storage:
+    """ Client storage of tests, keeps avatars of users """
+
+    def __init__(self):
+        self.avatars = {}
+
+    def get_avatar(self, user):
+        return self.avatars.get(user)
+
+    def set_avatar(self, user, data):
+        self.avatars[user] = Avatar(data)
+
+
+@skipIf(Client is None, 'client dependencies are not installed')
+class TestClientCore(TestCase):
+
+    def connect(self, server, storage=None):
+        server.start()
+        client = Client('127.0.0.1', server.port)
+        client.set_user('user', 'password', storage=storage or object())
+        self.addCleanup(client.close)
+        return client, client.connect()
+
+    def test_connect(self):
+        server = Server()
+        client, response = self.connect(server)
+        self.assertEqual(response.code, OK)
+        self.assertTrue(client.connected)
+        self.assertEqual(server.actions, [RequestAction.PRESENCE, RequestAction.AUTH])
+
+    def test_connect_unauthorized(self):
+        # answer is returned without error dialog of UI
+        modules = set(sys.modules)
+        client, response = self.connect(Server(UNAUTHORIZED))
+        self.assertEqual(response.code, UNAUTHORIZED)
+        self.assertNotIn('PyQt5.QtWidgets', set(sys.modules) - modules)
+
+    def test_connect_refused(self):
+        with socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        client = Client('127.0.0.1', port)
+        client.set_user('user', 'password', storage=object())
+        self.assertEqual(client.connect().code, SERVER_ERROR)
+
+    def test_close(self):
+        server = Server()
+        client, _ = self.connect(server)
+        client.close()
+        self.assertFalse(client.connected)
+        self.assertTrue(server.closed.wait(TIMEOUT))
+        self.assertEqual(server.actions[-1], RequestAction.QUIT)
+        client.close()
+
+    def test_room_message(self):
+        server = Server()
+        client, _ = self.connect(server)
+        client.send_msg('hello', '@room')
+        client.close()
+        self.assertTrue(server.closed.wait(TIMEOUT))
+        request = server.requests[-2]
+        self.assertEqual(request.action, RequestAction.MESSAGE)
+
+        # messages of rooms are plain text, they are received as sent
+        msg = client.parse_recv_message(request.body)
+        self.assertEqual((msg.to, msg.text), ('@room', 'hello'))
+
+    def test_avatar_changed(self):
+        server = Server(features=[Feature.COLLECTIONS, Feature.REQUEST_IDS,
+                                  Feature.AVATAR_CHECKS],
+                        avatars={'user_2': b'old avatar'})
+        client, _ = self.connect(server, Storage())
+        changed = Event()
+        client.subscribe(int(AVATAR_CHANGED), lambda user: changed.set())
+        self.assertEqual(client.get_user_avatars(['user_2']), {'user_2': b'old avatar'})
+        # avatar is cached, hash of server is known
+        count = len(server.actions)
+        self.assertEqual(client.get_user_avatars(['user_2']), {'user_2': b'old avatar'})
+        self.assertEqual(len(server.actions), count)
+
+        server.change_avatar('user_2', b'new avatar')
+        self.assertTrue(changed.wait(TIMEOUT))
+        self.assertEqual(client.get_user_avatars(['user_2']), {'user_2': b'new avatar'})
+        self.assertEqual(server.actions[count:], [RequestAction.GET_IMAGE])
+
+    def test_executor_error(self):
+        client, _ = self.connect(Server())
+        done = Event()
+        client.execute_queue.put((lambda: 1 / 0,))
+        client.execute_queue.put((done.set,))
+        self.assertTrue(done.wait(TIMEOUT))
+
+
+if __name__ == '__main__':
+    main()
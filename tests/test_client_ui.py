@@ -0,0 +1,33 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client'))
+
+from unittest import TestCase, main, skipIf
+
+from jim.classes.request_body import Msg
+
+try:
+    sys.modules.pop('ui', None)  # client and server have own package of ui
+    from ui.client_ui_logic import SignalStorage
+except ImportError:
+    # ui needs PyQt5 and Pillow
+    SignalStorage = None
+
+
+@skipIf(SignalStorage is None, 'ui dependencies are not installed')
+class TestSignalStorage(TestCase):
+
+    def test_dict_body(self):
+        storage = SignalStorage()
+        body = Msg('text', 'user_1', 'user_2').get_dict()
+        for signal in (storage.got_message, storage.starting_chat, storage.accepted_chat):
+            received = []
+            signal.connect(received.append)
+            signal.emit(body)
+            self.assertEqual(received, [body])
+            self.assertEqual(Msg.from_body(received[0]).text, 'text')
+
+
+if __name__ == '__main__':
+    main()
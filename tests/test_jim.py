@@ -5,62 +5,229 @@ sys.path.append(os.path.join(os.getcwd(), '..'))
 from unittest import TestCase, main
 
 from jim.classes import *
+from jim.classes.package import Request, Response
+from jim.codes import *
 from jim.constants import *
 from jim.functions import *
+from jim.classes.request_body import Msg, ChatRow, Collection, FileChunk, FileInfo
+from jim.codecs import get_codec, BINARY, TEXT_CODEC
+from jim.binary import FRAME_HEADER, unpack_value
 
 
 class TestJimClasses(TestCase):
 
     def test_request_dict(self):
         body = 'test'
-        time = dt.timestamp(dt.now())
 
         request = Request(RequestAction.PRESENCE, body)
-        self.assertEqual(request.get_dict(), {ACTION: RequestAction.PRESENCE, TIME: time, BODY: body})
+        time = request.time
+        self.assertEqual(request.get_dict(), {ACTION: RequestAction.PRESENCE, BODY: body,
+                                              ID: None, TIME: time, TYPE: REQUEST})
 
-        request = Request(RequestAction.QUIT)
-        self.assertEqual(request.get_dict(), {ACTION: RequestAction.QUIT, TIME: time, BODY: ''})
+        request = Request(RequestAction.QUIT, req_id=1)
+        request.time = time
+        self.assertEqual(request.get_dict(), {ACTION: RequestAction.QUIT, BODY: '',
+                                              ID: 1, TIME: time, TYPE: REQUEST})
 
         self.assertRaises(TypeError, Request)
 
     def test_response_dict(self):
-        time = dt.timestamp(dt.now())
-
         response = Response(OK)
-        self.assertEqual(response.get_dict(), {CODE: 200, TIME: time, MESSAGE: 'OK'})
+        self.assertEqual(response.get_dict(), {CODE: 200, MESSAGE: 'OK', ID: None,
+                                               TIME: response.time, TYPE: RESPONSE})
 
         self.assertRaises(TypeError, Response)
 
+    def test_msg_body(self):
+        msg = Msg(b'line 1\nline 2: @x', 'sender', 'to', 1.5, 3)
+        codec = get_codec(BINARY)
+        body = codec.decode(codec.encode(Response(LETTER, msg))).message
+        self.assertEqual(Msg.from_body(body).get_dict(), msg.get_dict())
+
+        msg = Msg.from_body('sender to @to: text')
+        self.assertEqual((msg.sender, msg.to, msg.text), ('sender', 'to', 'text'))
+
+    def test_chat_row(self):
+        row = ChatRow(1, 1546300800, 'sender', 'to', 'dGV4dA==')
+        item = Collection([row]).items[0]
+        self.assertEqual(ChatRow.from_body(item).get_dict(), row.get_dict())
+
+        row = ChatRow.from_body('sender__2019-01-01 00:00:00.5__dGV4dA==__to')
+        self.assertEqual((row.sender, row.to, row.text), ('sender', 'to', 'dGV4dA=='))
+        self.assertIsInstance(row.time, int)
+
+    def test_file_chunk(self):
+        data = bytes(range(256)) * 4
+        for name in (BINARY, TEXT_CODEC.name):
+            codec = get_codec(name)
+            responses = [Response(FILE_ANSWER, FileChunk(0, data[:512])),
+                         Response(FILE_ANSWER, FileChunk(512, data[512:])),
+                         Response(FILE_ANSWER, FileInfo.of(data))]
+            bodies = [codec.decode(codec.encode(r)).message for r in responses]
+            chunks = [FileChunk.from_body(b) for b in bodies if FileChunk.is_chunk(b)]
+            self.assertEqual([c.end for c in chunks], [512, 1024])
+            self.assertTrue(FileInfo.is_info(bodies[2]))
+            self.assertTrue(FileInfo.from_body(bodies[2]).check(b''.join(c.data for c in chunks)))
+            self.assertFalse(FileInfo.from_body(bodies[2]).check(data[1:]))
 
-class TestJimFunctions(TestCase):
-
-    class TestSocket:
-        encoded_data = None
-        request = None
 
-        def __init__(self, data):
-            self.data = data
+class TestJimFunctions(TestCase):
 
-        def send(self, request):
-            json_str = json.dumps(self.data)
-            self.encoded_data = json_str.encode(ENCODING)
-            self.request = request
+    def setUp(self):
+        from socket import socketpair
+        self.sender, self.receiver = socketpair()
 
-        def recv(self, buf):
-            json_str = json.dumps(self.data)
-            return json_str.encode(ENCODING)
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
 
     def test_send_request(self):
-        request = Request(RequestAction.MESSAGE)
-        socket = self.TestSocket(request.get_dict())
-        send_data(socket, request)
-        self.assertEqual(socket.encoded_data, socket.request)
+        request = Request(RequestAction.MESSAGE, Msg('text', 'sender', '@ALL'))
+        send_data(self.sender, request)
+        self.assertEqual(get_data(self.receiver).get_dict(), request.get_dict())
 
     def test_get_data(self):
         response = Response(BASIC)
-        socket = self.TestSocket(response.get_dict())
-        self.assertEqual(get_data(socket), response.get_dict())
-        self.assertEqual(Response.from_dict(get_data(socket)), response)
+        send_data(self.sender, response)
+        self.assertEqual(get_data(self.receiver), response)
+
+
+class TestFrameDecoder(TestCase):
+
+    def setUp(self):
+        from socket import socketpair
+        self.sender, self.receiver = socketpair()
+        self.decoder = FrameDecoder(self.receiver, size=64)
+
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
+
+    def test_several_frames(self):
+        requests = [Request(RequestAction.MESSAGE, str(i) * 100) for i in range(5)]
+        for request in requests:
+            send_data(self.sender, request)
+        received = []
+        while len(received) < len(requests):
+            self.decoder.fill()
+            received.extend(self.decoder.packages())
+        self.assertEqual(received, requests)
+
+    def test_send_many(self):
+        responses = [Response(ANSWER, str(i)) for i in range(100)]
+        send_many(self.sender, responses)
+        received = []
+        while len(received) < len(responses):
+            self.decoder.fill()
+            received.extend(self.decoder.packages())
+        self.assertEqual(received, responses)
+
+    def test_binary_frames(self):
+        self.decoder.codec = get_codec(BINARY)
+        encoder = FrameEncoder(get_codec(BINARY))
+        responses = [Response(FILE_ANSWER, bytes(range(256)) * 4),
+                     Response(ANSWER, {'users': ['a', 'b'], 'count': 2}),
+                     Response(ANSWER, ['a', 1, None, b'b', ['c', 'д'], 1.5, 'e']),
+                     Response(OK)]
+        send_many(self.sender, responses, encoder)
+        received = []
+        while len(received) < len(responses):
+            self.decoder.fill()
+            received.extend(self.decoder.packages())
+        self.assertEqual(received, responses)
+
+    def test_request_ids(self):
+        for name in (BINARY, TEXT_CODEC.name):
+            codec = get_codec(name)
+            self.decoder.codec = codec
+            send_data(self.sender, Response(ANSWER, 'ok', 7), FrameEncoder(codec))
+            self.decoder.fill()
+            self.assertEqual(next(self.decoder.packages()).id, 7)
+
+    def test_compressed_frames(self):
+        for name in (BINARY, TEXT_CODEC.name):
+            with self.subTest(codec=name):
+                decoder = FrameDecoder(self.receiver, codec=get_codec(name))
+                decoder.enable_compression()
+                encoder = FrameEncoder(get_codec(name))
+                encoder.enable_compression(threshold=100)
+                responses = [Response(ANSWER, ['user'] * 100) for _ in range(3)]
+                responses.append(Response(OK))
+                for response in responses:
+                    send_data(self.sender, response, encoder)
+                received = []
+                while len(received) < len(responses):
+                    decoder.fill()
+                    received.extend(decoder.packages())
+                self.assertEqual(received, responses)
+
+    def test_compressed_text_frame(self):
+        # compressed connection has binary headers and raw payload of text codec
+        encoder = FrameEncoder()
+        encoder.enable_compression()
+        response = Response(ANSWER, 'ok')
+        header, payload = encoder.frame(response)
+        self.assertEqual(FRAME_HEADER.unpack(header), (len(payload), 0))
+        self.assertEqual(TEXT_CODEC.decode(payload), response)
+
+    def test_compressed_size_limit(self):
+        import zlib
+        self.decoder.codec = get_codec(BINARY)
+        self.decoder.enable_compression()
+        compressor = zlib.compressobj()
+        data = compressor.compress(bytes(MAX_FRAME + 1)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.assertLess(len(data), MAX_FRAME)
+        self.decoder.feed(FRAME_HEADER.pack(len(data), FLAG_COMPRESSED) + data)
+        self.assertRaises(ValueError, list, self.decoder.packages())
+
+    def test_shared_payload(self):
+        codec = get_codec(BINARY)
+        self.decoder.codec = codec
+        self.decoder.enable_compression()
+        encoder = FrameEncoder(codec)
+        encoder.enable_compression(threshold=100)
+        response = Response(LETTER, ['user'] * 100)
+        payload = codec.encode(response)
+        self.assertEqual(FrameEncoder(codec).frame_payload(payload),
+                         frame_package(response, codec))
+        send_buffers(self.sender, encoder.frame_payload(payload))
+        self.decoder.fill()
+        self.assertEqual(list(self.decoder.packages()), [response])
+
+    def test_partial_frame(self):
+        request = Request(RequestAction.PRESENCE, 'test')
+        payload = encode_package(request)
+        frame = f'{len(payload)}.'.encode() + payload
+        self.decoder.feed(frame[:7])
+        self.assertEqual(list(self.decoder.packages()), [])
+        self.decoder.feed(frame[7:])
+        self.assertEqual(list(self.decoder.packages()), [request])
+        self.assertEqual(len(self.decoder), 0)
+
+    def test_frame_size_limit(self):
+        self.decoder.feed(f'{MAX_FRAME + 1}.'.encode())
+        self.assertRaises(ValueError, list, self.decoder.packages())
+
+        decoder = FrameDecoder(codec=get_codec(BINARY))
+        decoder.feed(FRAME_HEADER.pack(MAX_FRAME + 1, 0))
+        self.assertRaises(ValueError, list, decoder.packages())
+
+        self.sender.sendall(b'-1.')
+        self.assertRaises(ValueError, get_data, self.receiver)
+
+    def test_truncated_binary(self):
+        codec = get_codec(BINARY)
+        payload = bytes(codec.encode(Response(ANSWER, {'users': ['a', 'b'], 'text': 'x' * 10})))
+        for size in range(len(payload)):
+            self.assertRaises(ValueError, codec.decode, payload[:size])
+        # declared length of string is greater than payload
+        self.assertRaises(ValueError, unpack_value, b's\x00\x00\x00\x05abc', 0)
+        self.assertRaises(ValueError, unpack_value, b'l\xff\xff\xff\xff', 0)
+        self.assertRaises(ValueError, unpack_value, b'l\x00\x00\x00\x01' * 100 + b'N', 0)
+
+    def test_closed_connection(self):
+        self.sender.close()
+        self.assertRaises(ConnectionError, self.decoder.fill)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,66 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+
+from itertools import count
+from threading import Event
+from time import sleep
+from unittest import TestCase, main
+
+from key_pool import KeyPool
+
+TIMEOUT = 5
+
+
+class TestKeyPool(TestCase):
+
+    def setUp(self):
+        self.counter = count()
+
+    def generate(self):
+        return next(self.counter)
+
+    def wait_full(self, pool):
+        for _ in range(TIMEOUT * 100):
+            if len(pool) == pool.keys.maxsize:
+                return
+            sleep(0.01)
+        self.fail('pool is not filled')
+
+    def test_pool_hits(self):
+        pool = KeyPool(self.generate, 2).start()
+        self.wait_full(pool)
+        self.assertEqual([pool.get(), pool.get()], [0, 1])
+        self.assertEqual((pool.hits, pool.misses), (2, 0))
+        self.wait_full(pool)
+        self.assertEqual(pool.get_stats(), {'ready': 2, 'hits': 2, 'misses': 0})
+
+    def test_pool_miss(self):
+        ready = Event()
+
+        def generate():
+            # worker of pool is blocked, keys are generated inline
+            if not ready.is_set():
+                ready.set()
+                Event().wait(TIMEOUT)
+            return self.generate()
+
+        pool = KeyPool(generate, 1).start()
+        ready.wait(TIMEOUT)
+        self.assertEqual([pool.get(), pool.get()], [0, 1])
+        self.assertEqual((pool.hits, pool.misses), (0, 2))
+
+    def test_empty_pool(self):
+        pool = KeyPool(self.generate, 0)
+        self.assertEqual(pool.get(), 0)
+        self.assertIsNone(pool.thread)
+        self.assertEqual(pool.misses, 1)
+
+    def test_start_once(self):
+        pool = KeyPool(self.generate, 1)
+        thread = pool.start().thread
+        self.assertIs(pool.start().thread, thread)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from server_blobs import BlobStore
+
+
+class TestBlobStore(TestCase):
+
+    def setUp(self):
+        folder = TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.store = BlobStore(os.path.join(folder.name, 'blobs'))
+
+    def files(self):
+        return [f for _, _, files in os.walk(self.store.root) for f in files]
+
+    def test_put_get(self):
+        key = self.store.put(b'avatar')
+        self.assertEqual(key, BlobStore.hash(b'avatar'))
+        self.assertIn(key, self.store)
+        self.assertTrue(self.store.path(key).startswith(os.path.join(self.store.root, key[:2])))
+
+        blob = self.store.get(key)
+        self.assertEqual(blob[:], b'avatar')
+        blob.close()
+
+    def test_dedup(self):
+        key = self.store.put(b'avatar')
+        mtime = os.stat(self.store.path(key)).st_mtime_ns
+        self.assertEqual(self.store.put(bytearray(b'avatar')), key)
+        self.assertEqual(os.stat(self.store.path(key)).st_mtime_ns, mtime)
+        self.store.put(b'other')
+        self.assertEqual(len(self.files()), 2)
+
+    def test_empty_and_missing(self):
+        key = self.store.put(b'')
+        self.assertEqual(self.store.get(key), b'')
+        self.assertIsNone(self.store.get(BlobStore.hash(b'missing')))
+        self.assertNotIn(BlobStore.hash(b'missing'), self.store)
+
+    def test_incorrect_hash(self):
+        for key in ('', '../secret', 'abc/def'):
+            with self.subTest(key=key):
+                self.assertRaises(ValueError, self.store.path, key)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from unittest import TestCase, main
+
+from server_cache import AvatarCache, ENTRY_SIZE
+
+
+class TestAvatarCache(TestCase):
+
+    def setUp(self):
+        # cache keeps two avatars of 100 bytes
+        self.cache = AvatarCache(max_size=2 * (ENTRY_SIZE + 100))
+        self.loads = []
+
+    def loader(self, username):
+        self.loads.append(username)
+        if username == 'unknown':
+            return None
+        return f'{username}_hash', username.encode().ljust(100, b'.')
+
+    def test_load(self):
+        entry = self.cache.load('user_1', self.loader)
+        self.assertEqual(entry[0], 'user_1_hash')
+        self.assertIs(self.cache.load('user_1', self.loader), entry)
+        self.assertEqual(self.loads, ['user_1'])
+        stats = self.cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (1, 1, 0.5))
+        self.assertEqual(stats['bytes'], ENTRY_SIZE + 100)
+
+    def test_not_found(self):
+        self.assertIsNone(self.cache.load('unknown', self.loader))
+        self.assertIsNone(self.cache.load('unknown', self.loader))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.loads, ['unknown', 'unknown'])
+
+    def test_eviction(self):
+        self.cache.load('user_1', self.loader)
+        self.cache.load('user_2', self.loader)
+        # user_1 is used recently, user_2 is evicted
+        self.cache.load('user_1', self.loader)
+        self.cache.load('user_3', self.loader)
+        self.assertEqual(list(self.cache.entries), ['user_1', 'user_3'])
+        self.assertEqual(self.cache.size, 2 * (ENTRY_SIZE + 100))
+
+        self.cache.load('user_2', self.loader)
+        self.assertEqual(self.loads, ['user_1', 'user_2', 'user_3', 'user_2'])
+
+    def test_large_entry(self):
+        self.cache.put('user_1', ('hash', bytes(1000)))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.size, 0)
+
+    def test_invalidate(self):
+        self.cache.load('user_1', self.loader)
+        self.cache.invalidate('user_1')
+        self.assertEqual((len(self.cache), self.cache.size), (0, 0))
+
+        # entry loaded before invalidation can be stale, it isn't cached
+        version = self.cache.version
+        self.cache.invalidate('user_2')
+        self.cache.put('user_2', ('old_hash', b''), version)
+        self.assertNotIn('user_2', self.cache.entries)
+
+
+if __name__ == '__main__':
+    main()
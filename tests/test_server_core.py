@@ -0,0 +1,245 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from base64 import b64encode
+from socket import socket, create_connection
+from time import sleep
+from unittest import TestCase, main, skipIf
+
+from jim.classes.package import Request
+from jim.codes import *
+from jim.constants import *
+from jim.functions import send_data, send_buffers, get_data, frame_payload, \
+                          FrameEncoder, FrameDecoder
+from jim.classes.request_body import ChatRow, Presence, FileChunk, FileInfo, AvatarHash
+
+from server_cache import AvatarCache
+from server_outbound import MAX_PENDING
+
+try:
+    sys.modules.pop('logs', None)  # client and server have own package of logs
+    from Crypto.PublicKey import RSA
+    from Crypto.Cipher import PKCS1_OAEP
+    from server_core import Server
+except ImportError:
+    # server needs pycryptodome and sqlalchemy
+    Server = None
+
+CHAT = [ChatRow(1, 1600000000, 'user_1', 'user_2', 'text')]
+# avatar is larger than limit of pending data of connection
+AVATAR = bytes(range(256)) * (MAX_PENDING // 256 + 8 * 1024)
+
+
+class Storage:
+    """ Storage of tests, chat of any users is CHAT, other commands succeed """
+
+    avatars = AvatarCache()
+
+    def get_chat_rows(self, *args):
+        return CHAT
+
+    def get_chat_str(self, *args):
+        return ['user_1__2020-09-13 15:26:40__text__user_2']
+
+    def get_avatar(self, username):
+        return AVATAR if username == 'large' else None
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: True
+
+
+def free_port():
+    with socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@skipIf(Server is None, 'server dependencies are not installed')
+class TestServerCore(TestCase):
+    ENGINE = Server.THREAD_ENGINE if Server else None
+    TIMEOUT = 10
+
+    @classmethod
+    def setUpClass(cls):
+        cls.port = free_port()
+        cls.server = Server('127.0.0.1', cls.port)
+        cls.server.set_db_storage(Storage())
+        cls.server.start(engine=cls.ENGINE)
+        # asyncio engine starts listening in background
+        for _ in range(100):
+            try:
+                create_connection(('127.0.0.1', cls.port)).close()
+                break
+            except ConnectionRefusedError:
+                sleep(0.05)
+
+    def connect(self, username, features=()):
+        """ Method connects client, returns socket and answer to presence """
+
+        client = create_connection(('127.0.0.1', self.port), self.TIMEOUT)
+        self.addCleanup(client.close)
+        send_data(client, Request(RequestAction.PRESENCE,
+                                  Presence(username, features).get_dict()))
+        return client, get_data(client)
+
+    def login(self, username):
+        """ Method connects and authorizes client, returns socket """
+
+        client, answer = self.connect(username, [Feature.COLLECTIONS])
+        key = RSA.import_key(answer.message[KEY].encode())
+        password = b64encode(PKCS1_OAEP.new(key).encrypt(b'password')).decode()
+        send_data(client, Request(RequestAction.AUTH, password))
+        self.assertEqual(get_data(client).code, OK)
+        return client
+
+    @staticmethod
+    def get_answer(client):
+        """ Method returns next response, skips notifications about users """
+
+        while True:
+            answer = get_data(client)
+            if answer.code not in (CONNECTED, DISCONNECTED):
+                return answer
+
+    def test_chat_rows(self):
+        client, answer = self.connect('rows', [Feature.COLLECTIONS, Feature.CHAT_ROWS])
+        self.assertEqual(answer.code, AUTH)
+        self.assertIn(Feature.CHAT_ROWS, answer.message[FEATURES])
+
+        send_data(client, Request(RequestAction.COMMAND, 'get_chat rows user_1'))
+        answer = get_data(client)
+        self.assertEqual(answer.code, COLLECTION)
+        self.assertTrue(answer.message[LAST])
+        rows = [ChatRow.from_body(i) for i in answer.message[ITEMS]]
+        self.assertEqual([r.get_dict() for r in rows], [r.get_dict() for r in CHAT])
+
+    def test_chat_rows_legacy(self):
+        client, _ = self.connect('legacy', [Feature.COLLECTIONS])
+        send_data(client, Request(RequestAction.COMMAND, 'get_chat legacy user_1'))
+        answer = get_data(client)
+        self.assertEqual(answer.code, COLLECTION)
+        row = ChatRow.from_body(answer.message[ITEMS][0])
+        self.assertEqual((row.sender, row.to, row.text), ('user_1', 'user_2', 'text'))
+
+    def test_compression_text_codec(self):
+        client, answer = self.connect('zlib', [Feature.COLLECTIONS, Feature.ZLIB])
+        self.assertIn(Feature.ZLIB, answer.message[FEATURES])
+        encoder, decoder = FrameEncoder(), FrameDecoder(client)
+        encoder.enable_compression(threshold=0)
+        decoder.enable_compression()
+        send_data(client, Request(RequestAction.COMMAND, 'get_chat zlib user_1'), encoder)
+        answer = decoder.get()
+        self.assertEqual(answer.code, COLLECTION)
+        self.assertEqual(ChatRow.from_body(answer.message[ITEMS][0]).text, 'text')
+
+    def test_broadcast_to_authorized(self):
+        watcher = self.login('watcher')
+        guest, _ = self.connect('guest', [Feature.COLLECTIONS])
+        newcomer = self.login('newcomer')
+        answer = get_data(watcher)
+        self.assertEqual((answer.code, answer.message), (CONNECTED, 'newcomer'))
+
+        # client isn't authorized yet, broadcasts don't mix with its answers
+        send_data(guest, Request(RequestAction.COMMAND, 'get_users'))
+        self.assertEqual(get_data(guest).code, ANSWER)
+
+        newcomer.close()
+        answer = get_data(watcher)
+        self.assertEqual((answer.code, answer.message), (DISCONNECTED, 'newcomer'))
+
+    def test_upload_released(self):
+        client, _ = self.connect('uploader', [Feature.REQUEST_IDS, Feature.FILE_STREAM])
+        send_data(client, Request(RequestAction.IMAGE, FileChunk(0, b'abc'), 1))
+        answer = get_data(client)
+        self.assertEqual((answer.code, answer.message), (FILE_ANSWER, 3))
+
+        session = self.server.sessions.get_user('uploader')
+        upload = session.upload
+        client.close()
+        for _ in range(self.TIMEOUT * 100):
+            if upload.buffer is None:
+                break
+            sleep(0.01)
+        self.assertIsNone(upload.buffer)
+        self.assertIsNone(session.upload)
+        self.assertNotIn(session, self.server.sessions)
+
+    def test_download_large(self):
+        client, _ = self.connect('downloader', [Feature.REQUEST_IDS, Feature.FILE_STREAM])
+        send_data(client, Request(RequestAction.GET_IMAGE, 'large', 1))
+        # client doesn't read file for a while, the rest isn't written yet
+        sleep(0.5)
+        data = bytearray()
+        while True:
+            answer = get_data(client)
+            self.assertEqual((answer.code, answer.id), (FILE_ANSWER, 1))
+            if not FileChunk.is_chunk(answer.message):
+                break
+            data += FileChunk.from_body(answer.message).data
+        self.assertTrue(FileInfo.from_body(answer.message).check(data))
+        self.assertEqual(data, AVATAR)
+
+    def test_avatar_changed(self):
+        watchers = [self.login(f'avatar_watcher_{i}') for i in range(2)]
+        uploader = self.login('avatar_uploader')
+        avatar = b'avatar'
+        send_data(uploader, Request(RequestAction.IMAGE, avatar))
+        self.assertEqual(self.get_answer(uploader).code, FILE_ANSWER)
+        info = FileInfo.of(avatar)
+        send_data(uploader, Request(RequestAction.END_IMAGE, info))
+        answer = self.get_answer(uploader)
+        self.assertEqual((answer.code, answer.message), (FILE_ANSWER, info.checksum))
+
+        for watcher in watchers:
+            answer = self.get_answer(watcher)
+            self.assertEqual(answer.code, AVATAR_CHANGED)
+            changed = AvatarHash.from_body(answer.message)
+            self.assertEqual((changed.username, changed.checksum),
+                             ('avatar_uploader', info.checksum))
+
+        # uploader isn't notified, next response is answer to command
+        send_data(uploader, Request(RequestAction.COMMAND, 'get_users'))
+        self.assertEqual(self.get_answer(uploader).code, ANSWER)
+
+    def test_stats(self):
+        before = self.server.get_stats()['key_pool']
+        self.connect('stats', [Feature.COLLECTIONS])
+        after = self.server.get_stats()
+        self.assertEqual(after['key_pool']['hits'] + after['key_pool']['misses'],
+                         before['hits'] + before['misses'] + 1)
+        self.assertIn('hasher', after)
+        self.assertIn('fanout', after)
+        self.assertEqual(after['avatars']['entries'], 0)
+        with self.assertLogs('server', 'INFO') as logs:
+            self.server.log_stats()
+        self.assertTrue(any('Stats of key_pool' in line for line in logs.output))
+
+    def test_stats_command(self):
+        client, _ = self.connect('requests', [Feature.COLLECTIONS])
+        send_data(client, Request(RequestAction.COMMAND, 'get_stats'))
+        first = get_data(client).message['server']['requests']
+        send_data(client, Request(RequestAction.COMMAND, 'get_stats'))
+        answer = get_data(client)
+        self.assertEqual(answer.code, ANSWER)
+        self.assertEqual(answer.message['server']['requests'], first + 1)
+
+    def test_malformed_frame(self):
+        other, _ = self.connect('other')
+        for i, payload in enumerate((b'{"a": 1}', b'[1, 2]', b'null')):
+            with self.subTest(payload=payload):
+                client, _ = self.connect(f'malformed_{i}')
+                send_buffers(client, frame_payload(payload))
+                self.assertEqual(client.recv(1024), b'')
+
+                send_data(other, Request(RequestAction.COMMAND, 'get_users'))
+                self.assertEqual(get_data(other).code, ANSWER)
+
+
+class TestServerCoreAsync(TestServerCore):
+    ENGINE = Server.ASYNC_ENGINE if Server else None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main, skipIf
+
+try:
+    sys.modules.pop('logs', None)  # client and server have own package of logs
+    from server_db import ServerStorage
+except ImportError:
+    # storage needs sqlalchemy
+    ServerStorage = None
+
+
+@skipIf(ServerStorage is None, 'server dependencies are not installed')
+class TestServerStorage(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = TemporaryDirectory()
+        # storage is singleton, sessions of threads are bound to its database
+        ServerStorage.instance = None
+        ServerStorage.sessions.clear()
+        cls.storage = ServerStorage(os.path.join(cls.folder.name, 'server_db.db'))
+        for user in ('user_1', 'user_2', 'user_3', 'user_4'):
+            cls.storage.register_user(user, 'password')
+        cls.storage.set_avatar('user_1', b'avatar_1')
+        cls.storage.set_avatar('user_2', b'avatar_2')
+
+    @classmethod
+    def tearDownClass(cls):
+        for session in ServerStorage.sessions.values():
+            session.close()
+        ServerStorage.sessions.clear()
+        ServerStorage.instance = None
+        cls.storage.database_engine.dispose()
+        cls.folder.cleanup()
+
+    def test_check_avatar(self):
+        av_hash = self.storage.get_avatar_hash('user_1')
+        self.assertEqual(self.storage.check_avatar_hash('user_1', av_hash), 1)
+        self.assertEqual(self.storage.check_avatar_hash('user_1', 'stale'), 0)
+        self.assertFalse(self.storage.check_avatar_hash('unknown', av_hash))
+
+    def test_check_avatars(self):
+        hash_1 = self.storage.get_avatar_hash('user_1')
+        # first argument is user of request, it isn't checked
+        stale = self.storage.check_avatar_hashes(
+            'user_1', f'user_1={hash_1}', 'user_2=stale', 'user_3=', 'unknown=')
+        self.assertEqual(stale, ['user_2'])
+
+        # client hasn't avatars, users without avatar are up to date
+        stale = self.storage.check_avatar_hashes('user_1', 'user_1=', 'user_2=', 'user_3=')
+        self.assertEqual(sorted(stale), ['user_1', 'user_2'])
+        self.assertEqual(self.storage.check_avatar_hashes('user_1'), [])
+
+    def test_check_avatars_changed(self):
+        hash_4 = self.storage.get_avatar_hash('user_4')
+        self.storage.set_avatar('user_4', b'avatar_4')
+        self.assertEqual(self.storage.check_avatar_hashes('user_1', f'user_4={hash_4}'),
+                         ['user_4'])
+        new_hash = self.storage.get_avatar_hash('user_4')
+        self.assertEqual(self.storage.check_avatar_hashes('user_1', f'user_4={new_hash}'), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+import logging
+from threading import Timer
+from types import SimpleNamespace
+from unittest import TestCase, main
+
+from jim.classes.package import Response
+from jim.codes import OK
+from jim.functions import FrameEncoder
+from server_fanout import FanOut
+from server_outbound import OutboundBuffer, HIGH_WATER, LOW_WATER
+
+
+class Socket:
+    """ Non-blocking socket of tests, accepts up to capacity bytes """
+
+    def __init__(self, capacity=0):
+        self.capacity = capacity
+        self.data = bytearray()
+
+    def send(self, data):
+        if not self.capacity:
+            raise BlockingIOError
+        sent = min(len(data), self.capacity)
+        self.capacity -= sent
+        self.data += data[:sent]
+        return sent
+
+
+class TestOutboundBuffer(TestCase):
+
+    def test_write(self):
+        socket = Socket(5)
+        outbound = OutboundBuffer(socket)
+        self.assertEqual(outbound.write([b'abc', b'', b'defgh']), 3)
+        self.assertEqual(socket.data, b'abcde')
+
+        socket.capacity = 100
+        self.assertEqual(outbound.flush(), 0)
+        self.assertEqual(socket.data, b'abcdefgh')
+
+    def test_water_marks(self):
+        socket = Socket()
+        outbound = OutboundBuffer(socket)
+        outbound.write([bytes(HIGH_WATER)])
+        self.assertFalse(outbound.paused)
+        outbound.write([b'a'])
+        self.assertTrue(outbound.paused)
+
+        # reading is resumed only below low water mark
+        socket.capacity = HIGH_WATER + 1 - LOW_WATER
+        self.assertEqual(outbound.flush(), LOW_WATER)
+        self.assertTrue(outbound.paused)
+        socket.capacity = 1
+        self.assertEqual(outbound.flush(), LOW_WATER - 1)
+        self.assertFalse(outbound.paused)
+
+    def test_wait(self):
+        socket = Socket()
+        outbound = OutboundBuffer(socket)
+        self.assertTrue(outbound.wait(0))
+        outbound.write([bytes(HIGH_WATER + 1)])
+        self.assertFalse(outbound.wait(0.01))
+
+        # writer waits until buffer is flushed by other thread
+        timer = Timer(0.05, lambda: (setattr(socket, 'capacity', HIGH_WATER),
+                                     outbound.flush()))
+        timer.start()
+        self.assertTrue(outbound.wait(5))
+        timer.join()
+
+        # writer isn't blocked by closed connection
+        outbound.write([bytes(HIGH_WATER + 1)])
+        timer = Timer(0.05, outbound.close)
+        timer.start()
+        self.assertTrue(outbound.wait(5))
+        timer.join()
+        self.assertEqual(outbound.size, 0)
+
+
+class TestFanOut(TestCase):
+
+    def setUp(self):
+        self.sessions = [SimpleNamespace(encoder=FrameEncoder(), name=i) for i in range(3)]
+        self.written = []
+        self.dropped = []
+
+    def write(self, session, buffers):
+        self.written.append((session.name, b''.join(buffers)))
+        return session.name != 1
+
+    def drop(self, session):
+        # drop must be called without locks, it notifies other clients
+        self.assertFalse(any(s.encoder.lock.locked() for s in self.sessions))
+        self.dropped.append(session.name)
+
+    def test_send(self):
+        fanout = FanOut(self.write, self.drop, logging.getLogger('test'))
+        fanout.send(self.sessions, Response(OK))
+        self.assertEqual([name for name, _ in self.written], [0, 1, 2])
+        self.assertEqual(len({frame for _, frame in self.written}), 1)
+        self.assertEqual(self.dropped, [1])
+        self.assertEqual(fanout.get_stats()['recipients'], 3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from unittest import TestCase, main
+
+from server_session import Session, SessionRegistry, RoomIndex
+
+
+class Client:
+    """ Socket of tests """
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+
+def new_session(fd):
+    return Session(Client(fd), ('127.0.0.1', fd), None, None, None)
+
+
+class TestSessionRegistry(TestCase):
+
+    def setUp(self):
+        self.sessions = SessionRegistry()
+        self.first, self.second = new_session(1), new_session(2)
+        self.sessions.add(self.first)
+        self.sessions.add(self.second)
+
+    def test_indexes(self):
+        self.assertEqual(len(self.sessions), 2)
+        self.assertIs(self.sessions.get(self.first.client), self.first)
+        self.assertIs(self.sessions.get_fd(2), self.second)
+        self.assertIn(self.first, self.sessions)
+
+        self.assertTrue(self.sessions.bind_user(self.first, 'user_1'))
+        self.assertEqual(self.first.username, 'user_1')
+        self.assertIs(self.sessions.get_user('user_1'), self.first)
+
+    def test_bind_busy_user(self):
+        self.assertTrue(self.sessions.bind_user(self.first, 'user_1'))
+        self.assertFalse(self.sessions.bind_user(self.second, 'user_1'))
+        self.assertIsNone(self.second.username)
+        self.assertIs(self.sessions.get_user('user_1'), self.first)
+
+    def test_remove(self):
+        self.sessions.bind_user(self.first, 'user_1')
+        self.assertTrue(self.sessions.remove(self.first))
+        self.assertFalse(self.sessions.remove(self.first))
+        self.assertNotIn(self.first, self.sessions)
+        self.assertIsNone(self.sessions.get_fd(1))
+        self.assertIsNone(self.sessions.get_user('user_1'))
+        self.assertEqual(list(self.sessions), [self.second])
+
+        # name is free after disconnect
+        self.assertTrue(self.sessions.bind_user(self.second, 'user_1'))
+
+    def test_others(self):
+        third = new_session(3)
+        self.sessions.add(third)
+        self.first.authorized = third.authorized = True
+        self.assertEqual(self.sessions.others(self.first), [third])
+
+
+class TestRoomIndex(TestCase):
+
+    def setUp(self):
+        self.rooms = RoomIndex()
+        self.first, self.second = new_session(1), new_session(2)
+
+    def test_join(self):
+        self.assertEqual(self.rooms.join(self.first, '@room'), 'ROOM')
+        self.rooms.join(self.second, 'Room')
+        self.assertIn('@ROOM', self.rooms)
+        self.assertEqual(set(self.rooms.members('@room')), {self.first, self.second})
+        self.assertEqual(self.first.rooms, {'ROOM'})
+        self.assertEqual(self.rooms.members('other'), [])
+
+    def test_leave(self):
+        self.rooms.join(self.first, 'room')
+        self.rooms.join(self.second, 'room')
+        self.assertTrue(self.rooms.leave(self.first, '@room'))
+        self.assertFalse(self.rooms.leave(self.first, 'room'))
+        self.assertEqual(self.rooms.members('room'), [self.second])
+
+        # empty room is removed
+        self.rooms.leave(self.second, 'room')
+        self.assertNotIn('room', self.rooms)
+        self.assertEqual(len(self.rooms), 0)
+
+    def test_leave_all(self):
+        self.rooms.join(self.first, 'room_1')
+        self.rooms.join(self.first, 'room_2')
+        self.rooms.join(self.second, 'room_2')
+        self.rooms.leave_all(self.first)
+        self.assertEqual(self.first.rooms, set())
+        self.assertNotIn('room_1', self.rooms)
+        self.assertEqual(self.rooms.members('room_2'), [self.second])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+import logging
+from base64 import b64encode
+from socket import socket, create_connection
+from threading import Event
+from time import sleep
+from unittest import TestCase, main
+
+from jim.classes.package import Request, Response
+from jim.codes import OK
+from jim.constants import RequestAction
+from jim.functions import TEXT_ENCODER, send_data, get_data
+from server_socket_async import ServerAsync
+
+TIMEOUT = 5
+
+
+class Server:
+    """ Server of tests, answers OK to requests of clients """
+
+    STATS_INTERVAL = 60
+
+    def __init__(self, port):
+        self.bind_addr = '127.0.0.1'
+        self.port = port
+        self.logger = logging.getLogger('test')
+        self.clients = []
+        self.requests = []
+        self.disconnected = Event()
+
+    def connect(self, client, addr, decoder, outbound):
+        self.clients.append(client)
+        return True
+
+    def handle(self, client, request):
+        self.requests.append(request.action)
+        client.write(TEXT_ENCODER.frame(Response(OK)))
+
+    def disconnect(self, client):
+        client.close()
+        self.disconnected.set()
+
+    def log_stats(self):
+        pass
+
+
+def text_frame(payload):
+    """ Function returns text frame of raw payload """
+
+    payload = b64encode(payload)
+    return f'{len(payload)}.'.encode() + payload
+
+
+def free_port():
+    with socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestServerAsync(TestCase):
+
+    def setUp(self):
+        self.server = Server(free_port())
+        self.engine = ServerAsync(self.server)
+        self.engine.start_background()
+        self.addCleanup(self.engine.stop)
+        for _ in range(TIMEOUT * 100):
+            if self.engine.listener is not None:
+                break
+            sleep(0.01)
+
+    def connect(self):
+        client = create_connection(('127.0.0.1', self.server.port), TIMEOUT)
+        self.addCleanup(client.close)
+        return client
+
+    def test_request(self):
+        client = self.connect()
+        send_data(client, Request(RequestAction.PRESENCE, 'user'))
+        send_data(client, Request(RequestAction.QUIT))
+        self.assertEqual(get_data(client).code, OK)
+        self.assertEqual(get_data(client).code, OK)
+        self.assertEqual(self.server.requests, [RequestAction.PRESENCE, RequestAction.QUIT])
+
+    def test_malformed_frame(self):
+        client = self.connect()
+        client.sendall(text_frame(b'{"a": 1}'))
+        self.assertTrue(self.server.disconnected.wait(TIMEOUT))
+        self.assertEqual(client.recv(1024), b'')
+
+        # other clients are served
+        other = self.connect()
+        send_data(other, Request(RequestAction.PRESENCE, 'user'))
+        self.assertEqual(get_data(other).code, OK)
+
+    def test_write_from_thread(self):
+        client = self.connect()
+        send_data(client, Request(RequestAction.PRESENCE, 'user'))
+        get_data(client)
+        # server writes to connection from worker thread
+        self.server.clients[0].write(TEXT_ENCODER.frame(Response(OK)))
+        self.assertEqual(get_data(client).code, OK)
+
+    def test_write_order(self):
+        client = self.connect()
+        send_data(client, Request(RequestAction.PRESENCE, 'user'))
+        get_data(client)
+        connection = self.server.clients[0]
+        written = Event()
+
+        def write_in_loop():
+            written.wait(TIMEOUT)
+            connection.write(TEXT_ENCODER.frame(Response(OK, 'second')))
+
+        # loop writes after data queued by worker thread
+        connection.loop.call_soon_threadsafe(write_in_loop)
+        frame = TEXT_ENCODER.frame(Response(OK, 'first'))
+        self.assertGreaterEqual(connection.write(frame), sum(len(b) for b in frame))
+        written.set()
+        self.assertEqual(get_data(client).message, 'first')
+        self.assertEqual(get_data(client).message, 'second')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from unittest import TestCase, main
+
+from server_upload import UploadSpool
+
+
+class TestUploadSpool(TestCase):
+
+    def setUp(self):
+        self.spool = UploadSpool(max_size=10, memory=4)
+        self.addCleanup(self.spool.close)
+
+    def test_memory(self):
+        self.assertTrue(self.spool.write(b'ab'))
+        self.assertTrue(self.spool.write(b'cd'))
+        self.assertFalse(self.spool.spilled)
+        self.assertEqual(len(self.spool), 4)
+        self.assertEqual(self.spool.getvalue(), b'abcd')
+
+    def test_spill(self):
+        self.spool.write(b'abc')
+        self.assertTrue(self.spool.write(b'def'))
+        self.assertTrue(self.spool.spilled)
+        self.assertEqual(self.spool.buffer, b'')
+        self.assertTrue(self.spool.write(b'g'))
+        self.assertEqual(self.spool.getvalue(), b'abcdefg')
+
+    def test_size_limit(self):
+        self.assertTrue(self.spool.write(b'0123456789'))
+        self.assertFalse(self.spool.write(b'a'))
+        self.assertEqual(len(self.spool), 10)
+
+        spool = UploadSpool(max_size=3)
+        self.assertFalse(spool.write(b'abcd'))
+        self.assertEqual(len(spool), 0)
+
+    def test_close(self):
+        self.spool.write(b'abcdef')
+        file = self.spool.file
+        self.spool.close()
+        self.assertTrue(file.closed)
+        self.assertIsNone(self.spool.buffer)
+        self.assertFalse(self.spool.write(b'a'))
+        self.spool.close()
+
+
+if __name__ == '__main__':
+    main()
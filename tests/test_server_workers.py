@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.append(os.path.join(os.getcwd(), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+import logging
+from concurrent.futures import Future
+from threading import Event
+from time import sleep
+from unittest import TestCase, main
+
+from server_workers import WorkerPool
+
+TIMEOUT = 5
+
+
+class TestWorkerPool(TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(logging.getLogger('test'), workers=4)
+        self.addCleanup(self.pool.shutdown)
+        self.done = {}
+
+    def task(self, key, value, delay=0):
+        sleep(delay)
+        self.done.setdefault(key, []).append(value)
+
+    def wait(self, key):
+        for _ in range(TIMEOUT * 100):
+            if not self.pool.busy(key):
+                return
+            sleep(0.01)
+        self.fail(f'tasks of {key} are not finished')
+
+    def test_order_of_key(self):
+        for i in range(20):
+            # first tasks are slower, they must be finished first anyway
+            self.assertTrue(self.pool.submit('a', self.task, 'a', i, (20 - i) / 1000))
+            self.assertTrue(self.pool.submit('b', self.task, 'b', i))
+        self.wait('a')
+        self.wait('b')
+        self.assertEqual(self.done['a'], list(range(20)))
+        self.assertEqual(self.done['b'], list(range(20)))
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_keys_in_parallel(self):
+        event = Event()
+        self.pool.submit('a', event.wait, TIMEOUT)
+        self.pool.submit('b', event.set)
+        self.wait('a')
+        self.assertTrue(event.is_set())
+
+    def test_future_result(self):
+        future = Future()
+        self.pool.submit('a', lambda: future)
+        self.pool.submit('a', self.task, 'a', 1)
+        sleep(0.05)
+        # next task waits for future of previous task
+        self.assertNotIn('a', self.done)
+        self.assertTrue(self.pool.busy('a'))
+        future.set_result(None)
+        self.wait('a')
+        self.assertEqual(self.done['a'], [1])
+
+    def test_error_of_task(self):
+        self.pool.submit('a', lambda: 1 / 0)
+        self.pool.submit('a', self.task, 'a', 1)
+        self.wait('a')
+        self.assertEqual(self.done['a'], [1])
+
+    def test_overload(self):
+        pool = WorkerPool(logging.getLogger('test'), workers=1, max_pending=2)
+        self.addCleanup(pool.shutdown)
+        event = Event()
+        self.assertTrue(pool.submit('a', event.wait, TIMEOUT))
+        self.assertTrue(pool.submit('b', event.wait, TIMEOUT))
+        self.assertFalse(pool.submit('c', event.wait, TIMEOUT))
+        event.set()
+
+    def test_then(self):
+        future = Future()
+        done = self.pool.then(future, lambda f, x: f.result() + x, 1)
+        future.set_result(1)
+        self.assertEqual(done.result(TIMEOUT), 2)
+
+
+if __name__ == '__main__':
+    main()
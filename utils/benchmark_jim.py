@@ -0,0 +1,201 @@
+""" Benchmarks of jim protocol: codecs, Msg parsing and frames over sockets
+    Reports ops/s, bytes/s and peak allocated bytes per frame,
+    results can be saved as baseline and compared on the same machine
+
+    python utils/benchmark_jim.py --save      # store baseline
+    python utils/benchmark_jim.py             # compare with baseline """
+
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+from socket import socketpair
+from threading import Thread
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+
+from jim.codes import ANSWER, COLLECTION, LETTER
+from jim.constants import RequestAction
+from jim.classes.package import Request, Response
+from jim.classes.request_body import Msg, ChatRow, Collection
+from jim.codecs import CODECS, TEXT_CODEC
+from jim.functions import send_data, send_many, get_data, \
+                          FrameEncoder, FrameDecoder
+
+BASELINE = os.path.join(ROOT, 'utils', 'jim_baseline.json')
+MIN_TIME = 0.5
+ALLOC_OPS = 50
+
+
+def history_rows(size):
+    """ Function returns chat rows with about size bytes of text """
+
+    text = 'x' * 120
+    return [ChatRow(i, 1546300800 + i, 'sender', 'recipient', text)
+            for i in range(size // len(text))]
+
+
+PAYLOADS = {
+    'line': lambda: Request(RequestAction.MESSAGE,
+                            Msg(b'Hello, how are you?', 'sender', '@ALL')),
+    'letter_1k': lambda: Response(LETTER, Msg(bytes(range(256)) * 4, 'sender',
+                                              'recipient', 1546300800.0, 1)),
+    'answer': lambda: Response(ANSWER, [f'user_{i}' for i in range(50)]),
+    'history_64k': lambda: Response(COLLECTION,
+                                    Collection(history_rows(64 * 1024))),
+}
+
+
+def measure(func, size, batch=1):
+    """ Function runs func repeatedly, returns ops/s, bytes/s and
+        peak allocated bytes per frame, func handles batch frames per call """
+
+    func()
+    count, elapsed = 0, 0.0
+    start = perf_counter()
+    while elapsed < MIN_TIME:
+        func()
+        count += 1
+        elapsed = perf_counter() - start
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(ALLOC_OPS):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    ops = count * batch / elapsed
+    return {'ops': ops, 'bytes': ops * size, 'alloc': peak // batch}
+
+
+def bench_codecs():
+    """ Encode + decode round trips of packages for each codec """
+
+    for codec in CODECS.values():
+        for name, payload in PAYLOADS.items():
+            package = payload()
+            size = len(codec.encode(package))
+            yield f'roundtrip/{codec.name}/{name}', \
+                lambda: codec.decode(codec.encode(package)), size, 1
+
+
+def bench_msg_parsing():
+    """ Parsing of received Msg: formatted string and structured body """
+
+    msg = Msg('SGVsbG8sIGhvdyBhcmUgeW91Pw==', 'sender', '@ALL', 1546300800.0, 1)
+    formatted, body = str(msg), msg.get_dict()
+    yield 'msg/formatted', lambda: Msg.from_body(formatted), len(formatted), 1
+    yield 'msg/structured', lambda: Msg.from_body(body), len(formatted), 1
+
+
+class Stream:
+    """ Pair of sockets with thread sending packages
+        Size is length of frame without compression """
+
+    def __init__(self, package, encoder):
+        self.sender, self.receiver = socketpair()
+        self.package = package
+        self.encoder = encoder
+        self.size = sum(len(b) for b in encoder.frame(package))
+
+    def send(self, count):
+        """ Method sends count frames by one write in thread """
+
+        thread = Thread(target=send_many,
+                        args=(self.sender, [self.package] * count, self.encoder))
+        thread.start()
+        return thread
+
+    def send_each(self, count):
+        """ Method sends count frames by send_data in thread """
+
+        def send():
+            for _ in range(count):
+                send_data(self.sender, self.package, self.encoder)
+        thread = Thread(target=send)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.sender.close()
+        self.receiver.close()
+
+
+def bench_sockets(batch=32):
+    """ Frames over socketpair: send_data/get_data and buffered decoder """
+
+    for name, payload in PAYLOADS.items():
+        stream = Stream(payload(), FrameEncoder())
+
+        def send_get():
+            thread = stream.send_each(batch)
+            for _ in range(batch):
+                get_data(stream.receiver)
+            thread.join()
+        yield f'socket/get_data/{name}', send_get, stream.size, batch
+        stream.close()
+
+        for codec in CODECS.values():
+            stream = Stream(payload(), FrameEncoder(codec))
+            if codec.binary:
+                stream.encoder.enable_compression()
+            decoder = FrameDecoder(stream.receiver, codec=codec)
+            if codec.binary:
+                decoder.enable_compression()
+            packages = iter(decoder)
+
+            def send_decode():
+                thread = stream.send(batch)
+                for _ in range(batch):
+                    next(packages)
+                thread.join()
+            yield f'socket/decoder/{codec.name}/{name}', send_decode, stream.size, batch
+            stream.close()
+
+
+BENCHMARKS = (bench_codecs, bench_msg_parsing, bench_sockets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of jim protocol')
+    parser.add_argument('-b', '--baseline', default=BASELINE, type=str,
+                        help='Baseline file')
+    parser.add_argument('-s', '--save', action='store_true',
+                        help='Save results as baseline')
+    parser.add_argument('-k', '--filter', default='', type=str,
+                        help='Run benchmarks with substring in name')
+    args = parser.parse_args()
+
+    baseline = {}
+    if not args.save and os.path.isfile(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    print(f'text codec: {TEXT_CODEC.name}')
+    print(f'{"benchmark":40} {"ops/s":>10} {"MB/s":>8} {"alloc B":>9} {"vs base":>8}')
+    results = {}
+    for bench in BENCHMARKS:
+        for name, func, size, batch in bench():
+            if args.filter not in name:
+                continue
+            result = results[name] = measure(func, size, batch)
+            ratio = ''
+            if name in baseline:
+                ratio = f'{result["ops"] / baseline[name]["ops"]:7.2f}x'
+            print(f'{name:40} {result["ops"]:10.0f} {result["bytes"] / 2 ** 20:8.1f} '
+                  f'{result["alloc"]:9} {ratio:>8}')
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f'Baseline saved: {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+""" Load generator of chat server: login storm and steady-state messages
+    Starts simulated users on Client of client application without UI,
+    logins arrive at given rate, then direct and '@ALL' messages are sent
+    at given total rate. Reports p50/p95/p99 of login and delivery latency,
+    throughput of clients and requests handled by server per second
+
+    python utils/load_clients.py -n 500 --login-rate 100 --msg-rate 200 -d 30 """
+
+import argparse
+import logging
+import os
+import random
+import sys
+from threading import Thread, Lock
+from time import perf_counter, sleep
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'client'))
+
+from client_core import Client
+from client_crypt import ClientCrypt
+from jim.codes import OK, LETTER
+
+ALL = '@ALL'
+PASSWORD = 'load_password'
+STATS_TIMEOUT = 5
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """ Function returns percentiles of values by nearest rank """
+
+    if not values:
+        return [0.0 for _ in points]
+    values = sorted(values)
+    return [values[min(len(values) - 1, int(len(values) * p / 100))] for p in points]
+
+
+class MemoryStorage:
+    """ Storage of simulated user, messages aren't kept and
+        chat keys are kept in memory """
+
+    __slots__ = ('keys',)
+
+    def __init__(self):
+        self.keys = {}
+
+    def add_message(self, *args):
+        pass
+
+    def get_key(self, contact):
+        return self.keys.get(contact)
+
+    def add_chat_key(self, contact, key):
+        self.keys[contact] = key
+
+
+class Stats:
+    """ Class of latency samples of load run """
+
+    __slots__ = ('logins', 'failed', 'deliveries', 'sent', 'lock')
+
+    def __init__(self):
+        self.logins = []
+        self.failed = 0
+        self.deliveries = {ALL: [], 'direct': []}
+        self.sent = {ALL: 0, 'direct': 0}
+        self.lock = Lock()
+
+    def delivered(self, kind, latency):
+        with self.lock:
+            self.deliveries[kind].append(latency)
+
+
+class SimUser:
+    """ Class of simulated user, measures delivery latency of received letters
+        Text of letter is time of sending by perf_counter of this process """
+
+    __slots__ = ('client', 'stats')
+
+    def __init__(self, name, addr, port, stats):
+        self.client = Client(addr, port)
+        self.client.set_user(name, PASSWORD, MemoryStorage())
+        self.client.subscribe(int(LETTER), self.on_letter)
+        self.stats = stats
+
+    @property
+    def name(self):
+        return self.client.username
+
+    def login(self):
+        start = perf_counter()
+        response = self.client.connect()
+        if response.code != OK:
+            with self.stats.lock:
+                self.stats.failed += 1
+            self.client.close()
+            return False
+        with self.stats.lock:
+            self.stats.logins.append(perf_counter() - start)
+        return True
+
+    def on_letter(self, body):
+        msg = self.client.parse_recv_message(body)
+        kind = ALL if msg.to == ALL else 'direct'
+        self.stats.delivered(kind, perf_counter() - float(msg.text))
+
+    def send(self, to):
+        self.client.send_msg(repr(perf_counter()), to)
+
+
+def pair(user, contact):
+    """ Function sets shared chat secret of users without RSA handshake """
+
+    encryptor = ClientCrypt.gen_secret(user.name, contact.name)
+    user.client.set_encryptor(contact.name, encryptor)
+    contact.client.set_encryptor(user.name, ClientCrypt(encryptor.secret))
+
+
+def login_storm(users, rate):
+    """ Function logs in users at rate per second, returns logged in users """
+
+    threads = []
+    interval = 1 / rate if rate else 0
+    start = perf_counter()
+    for i, user in enumerate(users):
+        delay = start + i * interval - perf_counter()
+        if delay > 0:
+            sleep(delay)
+        thread = Thread(target=user.login, daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return [u for u in users if u.client.connected]
+
+
+def steady_state(users, rate, duration, all_ratio):
+    """ Function sends messages at total rate for duration seconds """
+
+    sent = {ALL: 0, 'direct': 0}
+    count = int(rate * duration)
+    start = perf_counter()
+    for i in range(count):
+        delay = start + i / rate - perf_counter()
+        if delay > 0:
+            sleep(delay)
+        sender = random.choice(users)
+        if random.random() < all_ratio or len(users) < 2:
+            sender.send(ALL)
+            sent[ALL] += 1
+        else:
+            contact = random.choice(users)
+            while contact is sender:
+                contact = random.choice(users)
+            if sender.client.get_encryptor(contact.name) is None:
+                pair(sender, contact)
+            sender.send(contact.name)
+            sent['direct'] += 1
+    return sent, perf_counter() - start
+
+
+def server_requests(user):
+    """ Function returns count of requests handled by server,
+        None if server doesn't report statistics """
+
+    try:
+        stats = user.client.get_stats_req().result(STATS_TIMEOUT)
+        return stats['server']['requests']
+    except Exception:
+        return None
+
+
+def report(stats, login_time, send_time, drain_time, online, handled=None):
+    def row(name, values):
+        p50, p95, p99 = (v * 1000 for v in percentiles(values))
+        print(f'{name:18} {len(values):8} {p50:9.2f} {p95:9.2f} {p99:9.2f}')
+
+    print(f'{"latency, ms":18} {"count":>8} {"p50":>9} {"p95":>9} {"p99":>9}')
+    row('login', stats.logins)
+    row('deliver @ALL', stats.deliveries[ALL])
+    row('deliver direct', stats.deliveries['direct'])
+
+    logins = len(stats.logins)
+    sent = sum(stats.sent.values())
+    delivered = sum(len(v) for v in stats.deliveries.values())
+    expected = stats.sent[ALL] * (online - 1) + stats.sent['direct']
+    print(f'logins: {logins} ok, {stats.failed} failed, '
+          f'{logins / login_time if login_time else 0:.1f}/s')
+    print(f'messages: {sent} sent, {sent / send_time if send_time else 0:.1f}/s')
+    print(f'deliveries: {delivered} of {expected}, '
+          f'{delivered / drain_time if drain_time else 0:.1f}/s')
+    if handled is None:
+        print('server: requests handled are not reported')
+    else:
+        print(f'server: {handled} requests handled, '
+              f'{handled / drain_time if drain_time else 0:.1f}/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load generator of chat server')
+    parser.add_argument('-a', '--addr', default='127.0.0.1', type=str,
+                        help='Address of server')
+    parser.add_argument('-p', '--port', default=7777, type=int,
+                        help='Port of server [default=7777]')
+    parser.add_argument('-n', '--users', default=100, type=int,
+                        help='Count of simulated users')
+    parser.add_argument('--prefix', default='load', type=str,
+                        help='Prefix of usernames')
+    parser.add_argument('--login-rate', default=50.0, type=float,
+                        help='Logins per second, 0 - all at once')
+    parser.add_argument('--msg-rate', default=50.0, type=float,
+                        help='Messages per second of all users')
+    parser.add_argument('--all-ratio', default=0.1, type=float,
+                        help="Part of messages to '@ALL'")
+    parser.add_argument('-d', '--duration', default=10.0, type=float,
+                        help='Duration of steady state, seconds')
+    parser.add_argument('--drain', default=5.0, type=float,
+                        help='Max time to wait for deliveries, seconds')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    stats = Stats()
+    users = [SimUser(f'{args.prefix}{i}', args.addr, args.port, stats)
+             for i in range(args.users)]
+
+    start = perf_counter()
+    online = login_storm(users, args.login_rate)
+    login_time = perf_counter() - start
+    print(f'{len(online)} of {len(users)} users online in {login_time:.2f} s')
+
+    send_time = 0.0
+    drain_time = 0.0
+    handled = None
+    if online and args.msg_rate > 0:
+        before = server_requests(online[0])
+        start = perf_counter()
+        stats.sent, send_time = steady_state(online, args.msg_rate,
+                                             args.duration, args.all_ratio)
+        expected = stats.sent[ALL] * (len(online) - 1) + stats.sent['direct']
+        deadline = perf_counter() + args.drain
+        while perf_counter() < deadline and \
+                sum(len(v) for v in stats.deliveries.values()) < expected:
+            sleep(0.05)
+        drain_time = perf_counter() - start
+        after = server_requests(online[0])
+        if before is not None and after is not None:
+            handled = after - before
+
+    report(stats, login_time, send_time, drain_time, len(online), handled)
+    for user in online:
+        user.client.close()
+
+
+if __name__ == '__main__':
+    main()